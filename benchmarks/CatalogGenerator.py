@@ -0,0 +1,138 @@
+"""
+Generates synthetic settings catalogs for the benchmarks: a Settings.xml with one or more settings and the .ini files
+they reference, with any number of keys spread over nested sections.
+Usage: python CatalogGenerator.py <folder> <keys> [--depth n] [--settings n]
+"""
+import os, argparse
+
+KEY_TYPES = ["IntRange", "FloatRange", "Droplist", "Checkbox"]
+CHOICES = ["Highest", "High", "Normal", "Low", "Lowest", "Off"]
+# The number of keys in every section
+KEYS_PER_SECTION = 8
+# The number of keys in the .ini files that aren't exposed in the XML, for every exposed key
+HIDDEN_KEYS_PER_KEY = 2
+
+"""
+@param index: the number of the key
+@return: the type of the key, the types are used in turn
+"""
+def getKeyType(index):
+	return KEY_TYPES[index % len(KEY_TYPES)]
+
+"""
+@param keyType: the type of a key
+@return: the value of the key in the generated .ini file
+"""
+def getDefaultValue(keyType):
+	if keyType == "IntRange":
+		return "50"
+	if keyType == "FloatRange":
+		return "0.5"
+	if keyType == "Droplist":
+		return "Normal"
+	return "true"
+
+"""
+Lays out the keys of a setting in sections. The top level sections each hold a chain of nested sections as deep as
+asked for, with the same number of keys on every level.
+@param keys: the number of keys
+@param depth: how deep the sections are nested
+@return: a list of top level sections, each a list of levels, each a list of (ini section, key name, key type)
+"""
+def layoutKeys(keys, depth):
+	sections = []
+	index = 0
+	while index < keys:
+		levels = []
+		for level in range(depth):
+			if index >= keys:
+				break
+			iniSection = "Root/BenchmarkSection%d/Level%dSection" % (len(sections), level)
+			levels.append([(iniSection, "Key%d" % i, getKeyType(i)) for i in range(index, min(index + KEYS_PER_SECTION, keys))])
+			index += KEYS_PER_SECTION
+		sections.append(levels)
+	return sections
+
+"""
+@param levels: the levels of a top level section, see layoutKeys
+@param sectionIndex: the number of the top level section
+@param level: the level to write
+@param indent: the indentation of the section
+@return: the XML of the section and the sections nested in it
+"""
+def getSectionXML(levels, sectionIndex, level, indent):
+	lines = [indent+"<Section description=\"Section %d level %d\">" % (sectionIndex, level)]
+	for iniSection, name, keyType in levels[level]:
+		description = "%s %s" % (name, keyType)
+		if keyType == "IntRange":
+			lines.append(indent+"\t<Key name=\"%s\" section=\"%s\" type=\"IntRange\" description=\"%s\" min=\"0\" max=\"100\"/>" % (name, iniSection, description))
+		elif keyType == "FloatRange":
+			lines.append(indent+"\t<Key name=\"%s\" section=\"%s\" type=\"FloatRange\" description=\"%s\" min=\"0.0\" max=\"1.0\"/>" % (name, iniSection, description))
+		elif keyType == "Droplist":
+			lines.append(indent+"\t<Key name=\"%s\" section=\"%s\" type=\"Droplist\" description=\"%s\">" % (name, iniSection, description))
+			for choice in CHOICES:
+				lines.append(indent+"\t\t<Choice value=\"%s\"/>" % choice)
+			lines.append(indent+"\t</Key>")
+		else:
+			lines.append(indent+"\t<Key name=\"%s\" section=\"%s\" type=\"Checkbox\" description=\"%s\"/>" % (name, iniSection, description))
+	if level + 1 < len(levels):
+		lines.extend(getSectionXML(levels, sectionIndex, level + 1, indent+"\t"))
+	lines.append(indent+"</Section>")
+	return lines
+
+"""
+@param sections: the layout of the keys, see layoutKeys
+@return: the content of the .ini file, with a comment above every key the way Simplygon writes them
+"""
+def getIniText(sections):
+	lines = []
+	for levels in sections:
+		for keys in levels:
+			lines.append("[%s]" % keys[0][0])
+			lines.append("")
+			for iniSection, name, keyType in keys:
+				lines.append(";The value of %s, a %s." % (name, keyType))
+				lines.append("%s = %s" % (name, getDefaultValue(keyType)))
+				lines.append("")
+				for hidden in range(HIDDEN_KEYS_PER_KEY):
+					lines.append(";A key that isn't exposed in the XML.")
+					lines.append("%sHidden%d = %d" % (name, hidden, hidden))
+					lines.append("")
+			lines.append("")
+	return "\n".join(lines)
+
+"""
+Writes a synthetic catalog.
+@param folder: the folder to write Settings.xml and the .ini files to, created if it doesn't exist
+@param keys: the number of keys in every setting
+@param depth: how deep the sections are nested
+@param settings: the number of settings
+@return: the path of the Settings.xml
+"""
+def generateCatalog(folder, keys, depth=4, settings=1):
+	if not os.path.isdir(folder):
+		os.makedirs(folder)
+	sections = layoutKeys(keys, depth)
+	lines = ["<Settings>"]
+	for settingIndex in range(settings):
+		iniFile = "Benchmark%d.ini" % settingIndex
+		with open(os.path.join(folder, iniFile), "wb") as outFile:
+			outFile.write(getIniText(sections))
+		lines.append("\t<Setting file=\"%s\" name=\"Benchmark %d\">" % (iniFile, settingIndex))
+		for sectionIndex, levels in enumerate(sections):
+			lines.extend(getSectionXML(levels, sectionIndex, 0, "\t\t"))
+		lines.append("\t</Setting>")
+	lines.append("</Settings>")
+	xmlFile = os.path.join(folder, "Settings.xml").replace("\\", "/")
+	with open(xmlFile, "wb") as outFile:
+		outFile.write("\n".join(lines))
+	return xmlFile
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Generates a synthetic settings catalog.")
+	parser.add_argument("folder", help="the folder to write the catalog to")
+	parser.add_argument("keys", type=int, help="the number of keys in every setting")
+	parser.add_argument("--depth", type=int, default=4, help="how deep the sections are nested")
+	parser.add_argument("--settings", type=int, default=1, help="the number of settings")
+	args = parser.parse_args()
+	print generateCatalog(args.folder, args.keys, args.depth, args.settings)
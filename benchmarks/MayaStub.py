@@ -0,0 +1,174 @@
+"""
+Recording stand-in for maya.cmds, maya.mel and maya.utils, so the Python side of the tool can be run and timed outside
+Maya. Every command is counted. Controls are kept as dictionaries of their flags, so edits can be queried back, and
+everything that isn't modelled returns a new control name like Maya's UI commands do.
+"""
+import sys, types, itertools
+
+# Short flags that are used by the scripts, mapped to the long names the controls are stored with
+FLAG_ALIASES = {"v": "value", "en": "enable", "l": "label", "vis": "visible", "cl": "collapse", "ann": "annotation"}
+
+"""
+The state of the fake Maya session.
+"""
+class Recorder:
+	def __init__(self):
+		self.calls = {}
+		self.controls = {}
+		self.optionVars = {}
+		self.selection = []
+		self.colorSets = []
+		self.deferred = []
+		self.melCommands = []
+		self.counter = itertools.count()
+
+	"""
+	@param name: the name of a command
+	"""
+	def record(self, name):
+		self.calls[name] = self.calls.get(name, 0) + 1
+
+	"""
+	@return: the total number of commands issued
+	"""
+	def getCallCount(self):
+		return sum(self.calls.values())
+
+	"""
+	Forgets the counted commands, but keeps the controls and the scene.
+	"""
+	def resetCalls(self):
+		self.calls.clear()
+		del self.melCommands[:]
+
+recorder = Recorder()
+
+"""
+@param flags: the flags of a command
+@return: the flags with the short names replaced by the long ones
+"""
+def normalizeFlags(flags):
+	return dict((FLAG_ALIASES.get(name, name), value) for name, value in flags.iteritems())
+
+"""
+Creates a generic UI command. Creating returns a new control name, edit updates the stored flags and query returns them.
+@param name: the name of the command
+@return: the command function
+"""
+def makeCommand(name):
+	def command(*args, **flags):
+		recorder.record(name)
+		flags = normalizeFlags(flags)
+		if flags.pop("exists", False) or flags.pop("ex", False):
+			return len(args) > 0 and args[0] in recorder.controls
+		query = flags.pop("query", False) or flags.pop("q", False)
+		edit = flags.pop("edit", False) or flags.pop("e", False)
+		if query:
+			control = recorder.controls.get(args[0], {})
+			for flag in flags:
+				if flag in ["itemListLong", "ill"]:
+					return [c for c, f in recorder.controls.iteritems() if f.get("parent") == args[0] and f.get("_type") == "menuItem"] or None
+				return control.get(flag)
+			return None
+		if edit:
+			recorder.controls.setdefault(args[0], {}).update(flags)
+			return None
+		control = "%s%d" % (name, next(recorder.counter))
+		flags["_type"] = name
+		if name == "menuItem":
+			# Like Maya, the first item of an option menu is selected
+			parent = recorder.controls.get(flags.get("parent"))
+			if parent != None and parent.get("value") == None:
+				parent["value"] = flags.get("label")
+		recorder.controls[control] = flags
+		return control
+	return command
+
+"""
+The fake maya.cmds, commands that aren't defined explicitly are generic UI commands.
+"""
+class CommandsModule(types.ModuleType):
+	def __getattr__(self, name):
+		if name.startswith("__"):
+			raise AttributeError(name)
+		command = makeCommand(name)
+		setattr(self, name, command)
+		return command
+
+def deleteUI(*names, **flags):
+	recorder.record("deleteUI")
+	deleted = []
+	for name in names:
+		deleted.extend(name if isinstance(name, (list, tuple)) else [name])
+	# Like Maya, the controls in a deleted layout are deleted with it
+	children = {}
+	for control, controlFlags in recorder.controls.iteritems():
+		children.setdefault(controlFlags.get("parent"), []).append(control)
+	while deleted:
+		control = deleted.pop()
+		recorder.controls.pop(control, None)
+		deleted.extend(children.pop(control, []))
+
+def optionVar(*args, **flags):
+	recorder.record("optionVar")
+	if "exists" in flags:
+		return flags["exists"] in recorder.optionVars
+	if "q" in flags:
+		return recorder.optionVars.get(flags["q"])
+	for flag in ["sv", "iv", "fv"]:
+		if flag in flags:
+			recorder.optionVars[flags[flag][0]] = flags[flag][1]
+
+def ls(*args, **flags):
+	recorder.record("ls")
+	if flags.get("head"):
+		return recorder.selection[:flags["head"]]
+	return list(recorder.selection)
+
+def polyColorSet(*args, **flags):
+	recorder.record("polyColorSet")
+	return list(recorder.colorSets)
+
+def evalDeferred(function, **flags):
+	recorder.record("evalDeferred")
+	recorder.deferred.append((function, (), {}))
+
+def fileDialog2(*args, **flags):
+	recorder.record("fileDialog2")
+	return None
+
+def melEval(command):
+	recorder.record("mel.eval")
+	recorder.melCommands.append(command)
+	return []
+
+def executeDeferred(function, *args, **kwargs):
+	recorder.deferred.append((function, args, kwargs))
+
+"""
+Runs everything that has been deferred, the way Maya does when it's idle.
+"""
+def runDeferred():
+	while recorder.deferred:
+		function, args, kwargs = recorder.deferred.pop(0)
+		function(*args, **kwargs)
+
+"""
+Installs the fake maya modules, so that the scripts import them instead of the real ones.
+"""
+def install():
+	maya = types.ModuleType("maya")
+	cmds = CommandsModule("maya.cmds")
+	mel = types.ModuleType("maya.mel")
+	utils = types.ModuleType("maya.utils")
+	for function in [deleteUI, optionVar, ls, polyColorSet, evalDeferred, fileDialog2]:
+		setattr(cmds, function.__name__, function)
+	mel.eval = melEval
+	utils.executeDeferred = executeDeferred
+	maya.cmds = cmds
+	maya.mel = mel
+	maya.utils = utils
+	sys.modules["maya"] = maya
+	sys.modules["maya.cmds"] = cmds
+	sys.modules["maya.mel"] = mel
+	sys.modules["maya.utils"] = utils
@@ -0,0 +1,298 @@
+"""
+Times the Python side of the tool outside Maya, against the recording stand-in for maya.cmds in MayaStub.py and synthetic
+catalogs from CatalogGenerator.py, and compares the results with a stored baseline.
+Every catalog size is run in its own process, so the peak memory is measured per size and no caches are shared.
+Besides catalogs with one setting of a growing number of keys, libraries with a large number of settings are measured.
+Usage:
+  python RunBenchmarks.py [--sizes 10,100,1000,10000] [--libraries 1000] [--depth 4] [--repeat 3] [--baseline file] [--save-baseline] [--tolerance 0.25]
+The exit code is 1 if any benchmark regressed compared to the baseline.
+"""
+import sys, os, time, json, argparse, tempfile, shutil, subprocess, StringIO
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+SCRIPTS_DIR = os.path.join(os.path.dirname(BENCHMARK_DIR), "scripts")
+DEFAULT_SIZES = [10, 100, 1000, 10000]
+# The number of settings in the measured libraries, and the number of keys in every setting of a library
+DEFAULT_LIBRARIES = [1000]
+LIBRARY_KEYS = 100
+DEFAULT_BASELINE = os.path.join(BENCHMARK_DIR, "baseline.json")
+# How much slower or bigger than the baseline a result may be before it counts as a regression, as a fraction
+DEFAULT_TOLERANCE = 0.25
+# The absolute slowdown in seconds that is always allowed on top of the tolerance, so the shorter a benchmark is the larger
+# the fraction it may vary by. Runs of a few milliseconds easily take twice as long because of the scheduler or a
+# garbage collection.
+NOISE_TIME = 0.01
+# The best of fewer runs than this is too noisy to compare with or to store as a baseline
+MIN_COMPARED_REPEAT = 3
+SETTING_NAME = "Benchmark 0"
+# One key in this many is changed before the config is written
+DIRTY_KEY_INTERVAL = 10
+# A query that matches a setting name and a key path in every setting
+SEARCH_QUERY = "benchmark level0section/key1"
+# The key that is changed in the .ini file of the shown setting before the settings are reloaded
+EDITED_KEY = "Key0Hidden0"
+
+"""
+Runs a benchmark a number of times.
+@param function: the function to time, called with the value returned by setup
+@param setup: a function that prepares a fresh run and returns the argument to pass, not timed
+@param repeat: the number of runs
+@return: a dictionary with the best wall time and the number of maya commands issued in a run
+"""
+def measure(function, setup, repeat):
+	import MayaStub
+	best = None
+	calls = 0
+	for _ in range(repeat):
+		argument = setup()
+		MayaStub.recorder.resetCalls()
+		start = time.time()
+		function(argument)
+		elapsed = time.time() - start
+		calls = MayaStub.recorder.getCallCount()
+		if best == None or elapsed < best:
+			best = elapsed
+	return {"time": best, "cmdsCalls": calls}
+
+"""
+Changes a value in an .ini file, the way an update from version control would.
+@param iniFile: the file to change
+"""
+def editIni(iniFile):
+	with open(iniFile, "rb") as inFile:
+		text = inFile.read()
+	if EDITED_KEY+" = 0" in text:
+		text = text.replace(EDITED_KEY+" = 0", EDITED_KEY+" = 1", 1)
+	else:
+		text = text.replace(EDITED_KEY+" = 1", EDITED_KEY+" = 0", 1)
+	with open(iniFile, "wb") as outFile:
+		outFile.write(text)
+	# The size stays the same, so make sure the modification time changes on file systems with a coarse resolution
+	mtime = os.path.getmtime(iniFile) + 1
+	os.utime(iniFile, (mtime, mtime))
+
+"""
+Runs all benchmarks for one catalog size, in this process.
+@param keys: the number of keys in every setting of the catalog
+@param depth: how deep the sections are nested
+@param repeat: the number of runs of every benchmark
+@param settings: the number of settings in the catalog
+@return: a dictionary with the results
+"""
+def runSize(keys, depth, repeat, settings=1):
+	sys.path.insert(0, SCRIPTS_DIR)
+	import MayaStub
+	MayaStub.install()
+	import maya.cmds as cmds
+	from CatalogGenerator import generateCatalog
+	tempDir = tempfile.mkdtemp(prefix="SimplygonBenchmark")
+	try:
+		os.environ["SIMPLYGON_BATCH_CACHE"] = os.path.join(tempDir, "cache")
+		os.environ.pop("SIMPLYGON_TRACE", None)
+		xmlFile = generateCatalog(os.path.join(tempDir, "catalog"), keys, depth, settings)
+		import SettingsCacheModule, SettingsCatalogModule
+		from OptimizationManagerModule import OptimizationSettingsManager
+		results = {}
+
+		def clearCaches():
+			SettingsCacheModule.xmlCache.invalidate()
+			SettingsCacheModule.configCache.invalidate()
+			catalogPath = SettingsCatalogModule.getCatalogPath(xmlFile)
+			if os.path.isfile(catalogPath):
+				os.remove(catalogPath)
+
+		results["init (cold)"] = measure(lambda _: OptimizationSettingsManager(xmlFile), clearCaches, repeat)
+		results["init (warm)"] = measure(lambda _: OptimizationSettingsManager(xmlFile), lambda: None, repeat)
+
+		def newManager():
+			manager = OptimizationSettingsManager(xmlFile)
+			return (manager, cmds.columnLayout())
+		results["settingChanged"] = measure(lambda (manager, container): manager.settingChanged(container, SETTING_NAME), newManager, repeat)
+
+		def shownManager():
+			manager, container = newManager()
+			manager.settingChanged(container, SETTING_NAME)
+			return manager
+		results["setDefaultValues"] = measure(lambda manager: manager.setDefaultValues(), shownManager, repeat)
+
+		def dirtyManager():
+			manager = shownManager()
+			for key in manager.getSettingData(SETTING_NAME).getKeys()[::DIRTY_KEY_INTERVAL]:
+				values = key.getSweepValues(3)
+				key.setValue(values[-1] if values[-1] != key.getValue() else values[0])
+			return manager
+		results["writeTempConfig"] = measure(lambda manager: manager.writeTempConfig(StringIO.StringIO()), dirtyManager, repeat)
+
+		def editedManager():
+			manager = dirtyManager()
+			editIni(manager.getSettingsFile(SETTING_NAME))
+			return manager
+		def reloadSettings(manager):
+			container = manager.panels[SETTING_NAME][0]
+			manager.reloadSettings()
+			manager.settingChanged(container, SETTING_NAME)
+		results["reloadSettings"] = measure(reloadSettings, editedManager, repeat)
+
+		def searchingManager():
+			manager = OptimizationSettingsManager(xmlFile)
+			# Only the query is timed, not loading the index
+			manager.catalog.getSearchIndex().getText()
+			return manager
+		results["searchSettings"] = measure(lambda manager: manager.searchSettings(SEARCH_QUERY), searchingManager, repeat)
+
+		MayaStub.recorder.optionVars["SimplygonSettingsFileXML"] = xmlFile
+		MayaStub.recorder.optionVars["SimplygonResultCache"] = 0
+		# The watcher thread would poll the files while the other benchmarks run
+		MayaStub.recorder.optionVars["SimplygonWatchSettings"] = 0
+		MayaStub.recorder.colorSets = ["weights"]
+		import SimplygonBatchProcessor
+
+		def openWindow():
+			SimplygonBatchProcessor.openSimplygonBatchProcessor()
+			MayaStub.runDeferred()
+			MayaStub.recorder.selection = ["pSphere1"] if not MayaStub.recorder.selection else []
+		def changeSelection(_):
+			SimplygonBatchProcessor.selectionChanged()
+			MayaStub.runDeferred()
+		results["selectionChanged"] = measure(changeSelection, openWindow, repeat)
+	finally:
+		shutil.rmtree(tempDir, ignore_errors=True)
+	sys.path.insert(0, SCRIPTS_DIR)
+	from SimplygonWorker import getPeakMemory
+	return {"keys": keys, "settings": settings, "depth": depth, "benchmarks": results, "peakMemory": getPeakMemory()}
+
+"""
+@param result: the results of one catalog size
+@return: the (keys, settings) the size is identified by, baselines from before libraries were measured have one setting
+"""
+def getSizeKey(result):
+	return (result["keys"], result.get("settings", 1))
+
+"""
+Runs every catalog size in its own process.
+@param sizes: a list of (keys, settings) tuples
+@return: a list of the results of every size
+"""
+def runAll(sizes, depth, repeat):
+	results = []
+	for keys, settings in sizes:
+		resultFile = tempfile.mktemp(suffix=".json")
+		try:
+			with open(os.devnull, "wb") as devnull:
+				# The scripts print a fair bit, which would only get in the way of the report
+				subprocess.check_call([sys.executable, os.path.abspath(__file__), "--single", str(keys), "--settings", str(settings),
+					"--depth", str(depth), "--repeat", str(repeat), "--result", resultFile], stdout=devnull)
+			with open(resultFile, "rb") as inFile:
+				results.append(json.load(inFile))
+		finally:
+			if os.path.isfile(resultFile):
+				os.remove(resultFile)
+		printResult(results[-1])
+	return results
+
+"""
+@param result: the results of one catalog size
+@return: a readable name of the size
+"""
+def getSizeName(result):
+	keys, settings = getSizeKey(result)
+	if settings == 1:
+		return "%d keys" % keys
+	return "%d settings of %d keys" % (settings, keys)
+
+"""
+Prints the results of one catalog size as a table.
+"""
+def printResult(result):
+	print "%s, depth %d, peak memory %.1f MB" % (getSizeName(result), result["depth"], (result["peakMemory"] or 0) / (1024.0*1024.0))
+	for name, benchmark in sorted(result["benchmarks"].iteritems()):
+		print "  %-20s %10.2f ms %10d cmds calls" % (name, benchmark["time"]*1000, benchmark["cmdsCalls"])
+	sys.stdout.flush()
+
+"""
+Compares results with a baseline. Runs slower or bigger than the baseline by more than the tolerance, and any increase
+in the number of maya commands, are regressions. A time may also be NOISE_TIME slower than the tolerance allows. Sizes
+and benchmarks that aren't in the baseline are skipped.
+@param results: the results, as returned by runAll
+@param baseline: the baseline results
+@param tolerance: how much worse a time or the memory may get, as a fraction
+@return: a list of readable descriptions of the regressions
+"""
+def compareResults(results, baseline, tolerance):
+	regressions = []
+	baselineSizes = dict((getSizeKey(result), result) for result in baseline)
+	for result in results:
+		reference = baselineSizes.get(getSizeKey(result))
+		if reference == None:
+			continue
+		for name, benchmark in sorted(result["benchmarks"].iteritems()):
+			referenceBenchmark = reference["benchmarks"].get(name)
+			if referenceBenchmark == None:
+				continue
+			if benchmark["time"] > referenceBenchmark["time"]*(1 + tolerance) + NOISE_TIME:
+				regressions.append("%s, %s: %.2f ms, the baseline is %.2f ms" % (getSizeName(result), name, benchmark["time"]*1000, referenceBenchmark["time"]*1000))
+			if benchmark["cmdsCalls"] > referenceBenchmark["cmdsCalls"]:
+				regressions.append("%s, %s: %d cmds calls, the baseline is %d" % (getSizeName(result), name, benchmark["cmdsCalls"], referenceBenchmark["cmdsCalls"]))
+		if result["peakMemory"] and reference["peakMemory"] and result["peakMemory"] > reference["peakMemory"]*(1 + tolerance):
+			regressions.append("%s: peak memory %d bytes, the baseline is %d" % (getSizeName(result), result["peakMemory"], reference["peakMemory"]))
+	return regressions
+
+"""
+@return: the parsed command line arguments
+"""
+def parseArguments(argv):
+	parser = argparse.ArgumentParser(description="Times the settings manager and the dock window against synthetic catalogs outside Maya.")
+	parser.add_argument("--sizes", default=",".join(str(size) for size in DEFAULT_SIZES), help="comma separated list of the number of keys in the catalogs")
+	parser.add_argument("--libraries", default=",".join(str(size) for size in DEFAULT_LIBRARIES), help="comma separated list of the number of settings in the libraries, %d keys each, empty to skip them" % LIBRARY_KEYS)
+	parser.add_argument("--depth", type=int, default=4, help="how deep the sections are nested")
+	parser.add_argument("--repeat", type=int, default=3, help="the number of runs of every benchmark, the best time is kept, at least %d" % MIN_COMPARED_REPEAT)
+	parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="the baseline to compare with")
+	parser.add_argument("--save-baseline", dest="saveBaseline", action="store_true", help="store the results as the new baseline instead of comparing")
+	parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="how much worse than the baseline a result may be, as a fraction")
+	parser.add_argument("--output", default=None, help="a JSON file to write the results to")
+	# Used internally to run one size in a separate process
+	parser.add_argument("--single", type=int, default=None, help=argparse.SUPPRESS)
+	parser.add_argument("--settings", type=int, default=1, help=argparse.SUPPRESS)
+	parser.add_argument("--result", default=None, help=argparse.SUPPRESS)
+	return parser.parse_args(argv)
+
+"""
+Main function of the benchmarks.
+@param argv: the command line arguments
+@return: the exit code of the process
+"""
+def main(argv):
+	args = parseArguments(argv)
+	if args.single != None:
+		result = runSize(args.single, args.depth, args.repeat, args.settings)
+		with open(args.result, "wb") as outFile:
+			json.dump(result, outFile)
+		return 0
+	if args.repeat < MIN_COMPARED_REPEAT:
+		print "Running every benchmark %d times, fewer runs are too noisy to compare" % MIN_COMPARED_REPEAT
+		args.repeat = MIN_COMPARED_REPEAT
+	sizes = [(int(size), 1) for size in args.sizes.split(",") if size]
+	sizes += [(LIBRARY_KEYS, int(settings)) for settings in args.libraries.split(",") if settings]
+	results = runAll(sizes, args.depth, args.repeat)
+	if args.output != None:
+		with open(args.output, "wb") as outFile:
+			json.dump(results, outFile, indent=1, sort_keys=True)
+	if args.saveBaseline:
+		with open(args.baseline, "wb") as outFile:
+			json.dump(results, outFile, indent=1, sort_keys=True)
+		print "Stored the baseline in "+args.baseline
+		return 0
+	if not os.path.isfile(args.baseline):
+		print "There is no baseline to compare with, store one with --save-baseline"
+		return 0
+	with open(args.baseline, "rb") as inFile:
+		regressions = compareResults(results, json.load(inFile), args.tolerance)
+	for regression in regressions:
+		print "Regression! "+regression
+	if not regressions:
+		print "No regressions compared to "+args.baseline
+	return 1 if regressions else 0
+
+if __name__ == "__main__":
+	sys.path.insert(0, BENCHMARK_DIR)
+	sys.exit(main(sys.argv[1:]))
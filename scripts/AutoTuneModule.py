@@ -0,0 +1,155 @@
+import re
+
+REDUCTION_KEY = "ReductionRatio"
+# The most optimization runs spent on a single LOD
+DEFAULT_MAX_RUNS = 6
+# How far from the target a triangle count may be to count as a hit, as a fraction of the target
+DEFAULT_TOLERANCE = 0.01
+LOD_SECTION_PATTERN = re.compile(r"LOD(\d+)Section$")
+LOD_NODE_PATTERN = re.compile(r"LOD(\d+)")
+
+"""
+@param section: a section in a settings file
+@return: the index of the LOD the section configures, or None if it doesn't configure a LOD
+"""
+def getLodSectionIndex(section):
+	match = LOD_SECTION_PATTERN.search(section)
+	if match == None:
+		return None
+	return int(match.group(1))
+
+"""
+Groups the top level nodes produced by Simplygon by LOD. The LOD of a node is taken from the last LOD<n> in its name;
+the numbers are only used for ordering, so it doesn't matter whether the first LOD is called LOD0 or LOD1.
+@param nodes: the top level LOD nodes
+@return: a list of node lists, one for every LOD in order. All nodes are in one group if none of them has a LOD number.
+"""
+def groupLodNodes(nodes):
+	groups = {}
+	for node in nodes:
+		numbers = LOD_NODE_PATTERN.findall(node.rsplit("|", 1)[-1])
+		if not numbers:
+			return [list(nodes)]
+		groups.setdefault(int(numbers[-1]), []).append(node)
+	return [groups[number] for number in sorted(groups)]
+
+"""
+Searches the ReductionRatio of one or more LODs for the value that produces a triangle budget, with as few optimization
+runs as possible. The first guess assumes the triangle count is proportional to the ratio. From there on a secant step
+is taken between the two closest measurements, falling back to bisection whenever the step would leave the range that
+is known to contain the target. The range starts out as the min and max declared for the key in the XML.
+Measurements are memoized on the full set of overrides, so LODs that share runs don't pay for them twice.
+"""
+class ReductionTuner:
+	"""
+	@param measure: a function that takes a dictionary of (section, key) -> value overrides, optimizes with them and
+	returns a list of the triangle counts of every LOD, in order
+	@param maxRuns: the most runs to spend on a single LOD
+	@param tolerance: how far from the target a triangle count may be to stop early, as a fraction of the target
+	"""
+	def __init__(self, measure, maxRuns=DEFAULT_MAX_RUNS, tolerance=DEFAULT_TOLERANCE):
+		self.measure = measure
+		self.maxRuns = maxRuns
+		self.tolerance = tolerance
+		self.measurements = {}
+		self.runs = 0
+
+	"""
+	@param overrides: a dictionary of (section, key) -> value
+	@return: the triangle counts of every LOD produced with the overrides
+	"""
+	def getTriangles(self, overrides):
+		memoKey = frozenset(overrides.iteritems())
+		triangles = self.measurements.get(memoKey)
+		if triangles == None:
+			self.runs += 1
+			triangles = self.measure(overrides)
+			self.measurements[memoKey] = triangles
+		return triangles
+
+	"""
+	Tunes the LODs one at a time, in order, so the later LODs of a cascaded chain are tuned on top of the winners of
+	the earlier ones.
+	@param keys: a dictionary of LOD index -> the key modifier of the ReductionRatio of the LOD
+	@param targets: a dictionary of LOD index -> triangle budget
+	@param overrides: the overrides to tune on top of, (section, key) -> value
+	@return: the overrides with the winning ratios merged in
+	"""
+	def tune(self, keys, targets, overrides):
+		overrides = dict(overrides)
+		for lodIndex in sorted(targets):
+			modifier = keys[lodIndex]
+			value, triangles = self.search(modifier, lodIndex, targets[lodIndex], overrides)
+			print "LOD%d: %s = %s gives %d triangles, the budget is %d" % (lodIndex, modifier.getKeyName(), value, triangles, targets[lodIndex])
+			overrides[(modifier.getKeySection(), modifier.getKeyName())] = value
+		return overrides
+
+	"""
+	Searches the ratio of one LOD.
+	@param modifier: the IntRangeData or FloatRangeData of the ReductionRatio of the LOD
+	@param lodIndex: the position of the LOD in the list returned by measure
+	@param target: the triangle budget of the LOD
+	@param overrides: the overrides of the other keys
+	@return: a (value, triangles) tuple of the largest ratio that is within the budget, or of the closest one if none is
+	"""
+	def search(self, modifier, lodIndex, target, overrides):
+		key = (modifier.getKeySection(), modifier.getKeyName())
+		integral = isinstance(modifier.min, int)
+		samples = {}
+
+		def snap(ratio):
+			if integral:
+				ratio = int(round(ratio))
+			return min(max(ratio, modifier.min), modifier.max)
+
+		def evaluate(ratio):
+			candidate = dict(overrides)
+			candidate[key] = modifier.normalizeValue(str(ratio))
+			if candidate[key] == modifier.defaultValue:
+				# Produces the same config as leaving the key out, which might already have been measured
+				del candidate[key]
+			triangles = self.getTriangles(candidate)
+			if lodIndex >= len(triangles):
+				raise ValueError("The optimization produced %d LODs, LOD%d can't be tuned" % (len(triangles), lodIndex))
+			samples[ratio] = triangles[lodIndex]
+
+		low = modifier.min
+		high = modifier.max
+		ratio = snap(float(overrides.get(key) or modifier.getValue() or modifier.max))
+		evaluate(ratio)
+		for _ in range(self.maxRuns - 1):
+			triangles = samples[ratio]
+			if abs(triangles - target) <= self.tolerance*target:
+				break
+			# Narrow the range that is known to contain the target
+			if triangles <= target:
+				low = max(low, ratio)
+			else:
+				high = min(high, ratio)
+			if low >= high:
+				# The budget can't be reached within the range
+				break
+			closest = sorted(samples, key=lambda x: abs(samples[x] - target))
+			if len(closest) < 2 or samples[closest[0]] == samples[closest[1]]:
+				# Assume the triangle count is proportional to the ratio
+				guess = ratio * float(target) / max(triangles, 1)
+			else:
+				x0, x1 = closest[0], closest[1]
+				guess = x0 + (target - samples[x0]) * (x1 - x0) / float(samples[x1] - samples[x0])
+			# Try the end of the range before bisecting towards it, the budget might be out of reach
+			if guess <= low:
+				guess = low if low not in samples else (low + high) / 2.0
+			elif guess >= high:
+				guess = high if high not in samples else (low + high) / 2.0
+			ratio = snap(guess)
+			if ratio in samples:
+				ratio = snap((low + high) / 2.0)
+				if ratio in samples:
+					break
+			evaluate(ratio)
+		within = [x for x in samples if samples[x] <= target*(1 + self.tolerance)]
+		if within:
+			best = max(within)
+		else:
+			best = min(samples, key=lambda x: abs(samples[x] - target))
+		return (modifier.normalizeValue(str(best)), samples[best])
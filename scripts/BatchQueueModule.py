@@ -0,0 +1,363 @@
+import os, subprocess, threading, time, inspect, json, shlex
+
+JOB_PENDING = "pending"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+JOB_CANCELLED = "cancelled"
+
+# Workers report their progress by printing lines starting with this token, followed by a percentage and a message
+PROGRESS_TOKEN = "PROGRESS"
+
+WORKER_SCRIPT = os.path.dirname(os.path.abspath(inspect.getfile(inspect.currentframe())))+"/SimplygonWorker.py"
+
+"""
+@return: the path to the mayapy interpreter of the running Maya installation, or just mayapy if it can't be found
+"""
+def getMayapy():
+	mayaLocation = os.environ.get("MAYA_LOCATION")
+	if mayaLocation != None:
+		for name in ["mayapy", "mayapy.exe"]:
+			path = os.path.join(mayaLocation, "bin", name)
+			if os.path.isfile(path):
+				return path.replace("\\", "/")
+	return "mayapy"
+
+"""
+@return: the default worker command. Every argument is formatted with the fields of the job it processes.
+"""
+def getDefaultWorkerCommand():
+	return [getMayapy(), WORKER_SCRIPT, "{scene}", "{settingsFile}", "{output}", "--objects", "{objects}", "--colorSet", "{colorSet}", "--weightMultiplier", "{weightMultiplier}", "--stats", "{stats}"]
+
+"""
+@param command: a worker command as a single string, paths with spaces in quotes. None for the default worker
+@return: the command as a list of arguments
+"""
+def splitCommand(command):
+	if command == None:
+		return None
+	if os.name != "nt":
+		return shlex.split(command)
+	# Backslashes are path separators on Windows, not escapes, but then shlex leaves the quotes in the arguments
+	args = shlex.split(command, posix=False)
+	return [arg[1:-1] if len(arg) > 1 and arg[0] == arg[-1] and arg[0] in "\"'" else arg for arg in args]
+
+"""
+@return: the number of processors on this machine, used as the default size of the worker pool
+"""
+def getProcessorCount():
+	try:
+		import multiprocessing
+		return multiprocessing.cpu_count()
+	except (ImportError, NotImplementedError):
+		return 1
+
+"""
+Parses a progress line printed by a worker.
+@param line: a line of worker output
+@return: a (percentage, message) tuple, or None if the line isn't a progress report
+"""
+def parseProgress(line):
+	parts = line.split(None, 2)
+	if len(parts) < 2 or parts[0] != PROGRESS_TOKEN:
+		return None
+	try:
+		percentage = int(parts[1])
+	except ValueError:
+		return None
+	message = ""
+	if len(parts) > 2:
+		message = parts[2]
+	return (percentage, message)
+
+"""
+Reads the statistics a worker has written for a job.
+@param path: the stats file
+@return: a dictionary of the statistics, or None if the file is missing or broken
+"""
+def readStats(path):
+	try:
+		with open(path, "r") as inFile:
+			return json.load(inFile)
+	except (IOError, ValueError):
+		return None
+
+"""
+A single unit of work in the batch queue. Describes a scene (or an exported selection) that should be optimized with
+a setting and a set of overrides.
+"""
+class BatchJob:
+	def __init__(self, name, scene, settingName, overrides=None, objects=None, colorSet=None, weightMultiplier=1, output=None, importResult=False, statsFile=None, units=None, settingsFile=None):
+		self.name = name
+		self.scene = scene.replace("\\", "/")
+		self.settingName = settingName
+		# A dictionary of (section, key) -> value that is merged into the config of the setting
+		self.overrides = overrides or {}
+		self.objects = objects or []
+		self.colorSet = colorSet
+		self.weightMultiplier = weightMultiplier
+		self.output = output
+		if self.output == None:
+			base, ext = os.path.splitext(self.scene)
+			self.output = base+"_LOD"+(ext or ".mb")
+		# True if the output should be imported back into the interactive session when the job is done
+		self.importResult = importResult
+		# If set the worker writes the size of the LODs and the time and memory it used to this JSON file
+		self.statsFile = statsFile
+		self.stats = None
+		# The full paths of the nodes in the interactive session the job optimizes, the LODs are moved next to them when
+		# they are imported
+		self.units = units or []
+		# The config to optimize with, if None the merged config of the setting and the overrides is written when the job starts
+		self.settingsFile = settingsFile
+		self.status = JOB_PENDING
+		self.returnCode = None
+		self.startTime = None
+		self.endTime = None
+		self.log = []
+		self.progress = 0
+		self.progressMessage = ""
+		self.process = None
+
+	"""
+	@return: the wall time in seconds this job has been running, or None if it hasn't started
+	"""
+	def getElapsedTime(self):
+		if self.startTime == None:
+			return None
+		if self.endTime == None:
+			return time.time() - self.startTime
+		return self.endTime - self.startTime
+
+	"""
+	@return: the fields that can be used in a worker command
+	"""
+	def getCommandFields(self):
+		return {"name": self.name,
+			"scene": self.scene,
+			"settingsFile": self.settingsFile,
+			"output": self.output,
+			"objects": ",".join(self.objects),
+			"colorSet": self.colorSet or "",
+			"weightMultiplier": str(self.weightMultiplier),
+			"stats": self.statsFile or ""}
+
+	"""
+	@return: a one line description of the state of this job
+	"""
+	def getStatusLine(self):
+		line = self.name+": "+self.status
+		elapsed = self.getElapsedTime()
+		if elapsed != None:
+			line += " (%.1fs)" % elapsed
+		return line
+
+"""
+Runs a queue of batch jobs through a pool of headless worker processes. The queue is dispatched from a background
+thread so that the interactive session stays responsive. All callbacks are called from that thread, so anything that
+touches the user interface must be marshalled back to the main thread (for example with maya.utils.executeDeferred).
+"""
+class BatchQueue:
+	"""
+	@param settingsManager: the OptimizationSettingsManager used to write the merged config of every job
+	@param workers: the maximum number of worker processes to run at the same time
+	@param command: the worker command, either a list of arguments that are formatted with the job fields or a
+	function that takes a job and returns the list of arguments
+	"""
+	def __init__(self, settingsManager, workers=None, command=None):
+		self.settingsManager = settingsManager
+		self.workers = workers or getProcessorCount()
+		self.command = command or getDefaultWorkerCommand()
+		self.jobs = []
+		self.onJobChanged = None
+		self.onOutput = None
+		self.onFinished = None
+		self.thread = None
+		self.cancelled = False
+		self.lock = threading.Lock()
+
+	"""
+	Adds a job to the queue. Jobs can be added while the queue is running.
+	@param job: the BatchJob to add
+	@return: the added job
+	"""
+	def addJob(self, job):
+		with self.lock:
+			self.jobs.append(job)
+		return job
+
+	"""
+	@return: true if the queue is currently being processed
+	"""
+	def isRunning(self):
+		return self.thread != None and self.thread.isAlive()
+
+	"""
+	Starts processing the queue in a background thread.
+	@param onJobChanged: called with the job every time a job changes status
+	@param onOutput: called with the job and a line every time a worker prints something
+	@param onFinished: called with the queue when all jobs have been processed
+	"""
+	def start(self, onJobChanged=None, onOutput=None, onFinished=None):
+		if self.isRunning():
+			return
+		self.onJobChanged = onJobChanged
+		self.onOutput = onOutput
+		self.onFinished = onFinished
+		self.cancelled = False
+		self.thread = threading.Thread(target=self.dispatch, name="SimplygonBatchQueue")
+		self.thread.daemon = True
+		self.thread.start()
+
+	"""
+	Blocks until the queue has been processed.
+	"""
+	def wait(self):
+		while self.isRunning():
+			self.thread.join(0.1)
+
+	"""
+	Cancels all pending jobs and terminates the running worker processes.
+	"""
+	def cancel(self):
+		cancelledJobs = []
+		with self.lock:
+			self.cancelled = True
+			for job in self.jobs:
+				if job.status == JOB_PENDING:
+					# The status changes under the lock so the dispatcher can't launch the job, but the listener is only
+					# notified once the lock is released, it may call back into the queue
+					job.status = JOB_CANCELLED
+					job.endTime = time.time()
+					cancelledJobs.append(job)
+				elif job.status == JOB_RUNNING and job.process != None:
+					try:
+						job.process.terminate()
+					except OSError:
+						pass
+		for job in cancelledJobs:
+			self.setStatus(job, JOB_CANCELLED)
+
+	"""
+	@return: a list of jobs matching the status
+	"""
+	def getJobs(self, status):
+		with self.lock:
+			return [job for job in self.jobs if job.status == status]
+
+	"""
+	@return: a multi line summary of the status and timing of all jobs
+	"""
+	def getSummary(self):
+		with self.lock:
+			lines = [job.getStatusLine() for job in self.jobs]
+		return "\n".join(lines)
+
+	"""
+	Changes the status of a job and notifies the listener.
+	"""
+	def setStatus(self, job, status):
+		job.status = status
+		if self.onJobChanged != None:
+			self.onJobChanged(job)
+
+	"""
+	Main loop of the dispatcher thread. Keeps the worker pool filled until all jobs are done.
+	"""
+	def dispatch(self):
+		running = []
+		while True:
+			# Reap the finished workers
+			for job in running[:]:
+				if job.process.poll() != None:
+					running.remove(job)
+					self.finishJob(job)
+			with self.lock:
+				pending = [job for job in self.jobs if job.status == JOB_PENDING]
+			if not pending and not running:
+				break
+			for job in pending[:max(0, self.workers - len(running))]:
+				if self.launchJob(job):
+					running.append(job)
+			time.sleep(0.05)
+		if self.onFinished != None:
+			self.onFinished(self)
+
+	"""
+	Writes the merged config of a job, unless it has one already, and starts a worker process for it.
+	@return: true if the worker was started
+	"""
+	def launchJob(self, job):
+		# Jobs added after the queue was cancelled are cancelled as well, otherwise they would stay pending forever
+		if self.cancelled:
+			self.cancelJob(job)
+			return False
+		job.startTime = time.time()
+		try:
+			if job.settingsFile == None:
+				job.settingsFile = self.settingsManager.writeSettingsFile(job.settingName, job.overrides)
+			args = self.getCommandArgs(job)
+			with self.lock:
+				if not self.cancelled:
+					job.process = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+			if job.process == None:
+				self.cancelJob(job)
+				return False
+		except (OSError, IOError, KeyError) as e:
+			job.log.append(str(e))
+			job.endTime = time.time()
+			self.setStatus(job, JOB_FAILED)
+			return False
+		self.setStatus(job, JOB_RUNNING)
+		reader = threading.Thread(target=self.readOutput, args=(job, job.process.stdout))
+		reader.daemon = True
+		reader.start()
+		job.reader = reader
+		return True
+
+	"""
+	Cancels a pending job that won't be launched.
+	"""
+	def cancelJob(self, job):
+		job.endTime = time.time()
+		self.setStatus(job, JOB_CANCELLED)
+
+	"""
+	@return: the worker command for a job as a list of arguments
+	"""
+	def getCommandArgs(self, job):
+		if callable(self.command):
+			return self.command(job)
+		fields = job.getCommandFields()
+		return [arg.format(**fields) for arg in self.command]
+
+	"""
+	Reads the output of a worker process line by line so that the pipe never fills up.
+	"""
+	def readOutput(self, job, stream):
+		for line in iter(stream.readline, ""):
+			line = line.rstrip()
+			job.log.append(line)
+			progress = parseProgress(line)
+			if progress != None:
+				job.progress, job.progressMessage = progress
+			if self.onOutput != None:
+				self.onOutput(job, line)
+		stream.close()
+
+	"""
+	Collects the result of a worker process that has exited.
+	"""
+	def finishJob(self, job):
+		job.reader.join()
+		job.returnCode = job.process.returncode
+		job.endTime = time.time()
+		job.process = None
+		if job.statsFile != None and job.returnCode == 0:
+			job.stats = readStats(job.statsFile)
+		if self.cancelled:
+			self.setStatus(job, JOB_CANCELLED)
+		elif job.returnCode == 0:
+			self.setStatus(job, JOB_DONE)
+		else:
+			self.setStatus(job, JOB_FAILED)
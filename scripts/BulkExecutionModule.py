@@ -0,0 +1,112 @@
+try:
+	import maya.cmds as cmds
+except ImportError:
+	# Without Maya there is nothing to suspend, the block is only timed
+	cmds = None
+import time
+
+# The number of bulk blocks that are currently open, only the outermost one changes the state of Maya
+_depth = 0
+
+"""
+Runs a block of many small Maya edits as one operation: the edits are grouped into a single undo chunk, the viewport
+isn't redrawn until the block is done and, for runs over many assets, the evaluation manager is switched off so it
+doesn't rebuild its graph after every change. Everything is restored when the block ends, also when it raises.
+Blocks can be nested, in which case only the outermost one suspends and restores anything.
+Usage:
+	with BulkExecution("Import LODs", report=True):
+		...
+"""
+class BulkExecution:
+	"""
+	@param name: the name of the undo chunk, also used when reporting the time
+	@param suspendRefresh: true to stop the viewport from redrawing during the block
+	@param suspendEvaluation: true to switch off the evaluation manager during the block
+	@param report: true to print how long the block took
+	@param enabled: false to run the block as it is, which is useful to compare the timing with
+	"""
+	def __init__(self, name, suspendRefresh=True, suspendEvaluation=False, report=False, enabled=True):
+		self.name = name
+		self.suspendRefresh = suspendRefresh
+		self.suspendEvaluation = suspendEvaluation
+		self.report = report
+		self.enabled = enabled and cmds != None
+		self.outermost = False
+		self.chunkOpen = False
+		self.refreshSuspended = False
+		self.evaluationMode = None
+		self.startTime = None
+		self.elapsed = None
+
+	def __enter__(self):
+		global _depth
+		self.startTime = time.time()
+		if not self.enabled:
+			return self
+		self.outermost = _depth == 0
+		_depth += 1
+		if not self.outermost:
+			return self
+		try:
+			cmds.undoInfo(openChunk=True, chunkName=self.name)
+			self.chunkOpen = True
+			if self.suspendRefresh:
+				cmds.refresh(suspend=True)
+				self.refreshSuspended = True
+			if self.suspendEvaluation:
+				self.evaluationMode = self.switchEvaluation("off")
+		except Exception:
+			self.restore()
+			raise
+		return self
+
+	def __exit__(self, excType, excValue, traceback):
+		self.restore()
+		self.elapsed = time.time() - self.startTime
+		if self.report:
+			state = "" if self.enabled else " (bulk execution off)"
+			if excType != None:
+				state += " and failed"
+			print "%s took %.2f seconds%s" % (self.name, self.elapsed, state)
+		# Never swallow the exception
+		return False
+
+	"""
+	Puts back everything that was suspended. Every step is restored even if an earlier one fails.
+	"""
+	def restore(self):
+		global _depth
+		if not self.enabled or _depth == 0:
+			return
+		_depth -= 1
+		if not self.outermost:
+			return
+		self.outermost = False
+		if self.evaluationMode != None:
+			try:
+				self.switchEvaluation(self.evaluationMode)
+			except RuntimeError as e:
+				print "Warning! Couldn't restore the evaluation mode: "+str(e)
+			self.evaluationMode = None
+		if self.refreshSuspended:
+			try:
+				cmds.refresh(suspend=False)
+			except RuntimeError as e:
+				print "Warning! Couldn't resume the viewport refresh: "+str(e)
+			self.refreshSuspended = False
+		if self.chunkOpen:
+			cmds.undoInfo(closeChunk=True)
+			self.chunkOpen = False
+
+	"""
+	Switches the evaluation manager to another mode.
+	@param mode: the mode to switch to, off, serial or parallel
+	@return: the previous mode, None if this Maya version doesn't have an evaluation manager
+	"""
+	def switchEvaluation(self, mode):
+		if not hasattr(cmds, "evaluationManager"):
+			return None
+		previous = (cmds.evaluationManager(query=True, mode=True) or [None])[0]
+		if previous != None and previous != mode:
+			cmds.evaluationManager(mode=mode)
+		return previous
@@ -0,0 +1,244 @@
+import maya.cmds as cmds
+from MeshDataModule import getMeshFn1, getVertexColorBytes
+try:
+	import numpy
+except ImportError:
+	# The analysis falls back to plain Python, which works but is a lot slower on big meshes
+	numpy = None
+
+# The color the mesh API returns for vertices that haven't been painted
+UNSET_COLOR = (-1.0, -1.0, -1.0, -1.0)
+# The color that gives a vertex the normal weight
+NEUTRAL_COLOR = (0.5, 0.5, 0.5, 1.0)
+HISTOGRAM_BINS = 10
+# Vertices darker than this are counted as black
+BLACK_INTENSITY = 1.0/255
+
+"""
+@param intensity: the intensity of a vertex color, 0 to 1
+@param multiplier: the user weights multiplier
+@return: the weight Simplygon derives from the intensity: 1 for the neutral grey, the multiplier for white and one over
+the multiplier for black
+"""
+def getWeight(intensity, multiplier):
+	return float(multiplier) ** ((intensity - 0.5) * 2)
+
+"""
+@param shape: the full path of a mesh shape
+@return: an OpenMaya MFnMesh of the shape
+"""
+def getMeshFn(shape):
+	import maya.api.OpenMaya as om
+	selection = om.MSelectionList()
+	selection.add(shape)
+	return om.MFnMesh(selection.getDagPath(0))
+
+"""
+The coverage and distribution of a user weights color set over a number of meshes.
+"""
+class ColorSetReport:
+	def __init__(self, colorSet, multiplier, bins=HISTOGRAM_BINS):
+		self.colorSet = colorSet
+		self.multiplier = multiplier
+		# Meshes that don't have the color set at all, all of their vertices are counted as unpainted
+		self.missing = []
+		self.vertices = 0
+		self.unpainted = 0
+		# Painted vertices with colors outside of 0 to 1, or that aren't numbers
+		self.degenerate = 0
+		self.black = 0
+		# The number of painted vertices in every intensity bin from 0 to 1
+		self.histogram = [0]*bins
+		self.intensitySum = 0.0
+		self.minIntensity = None
+		self.maxIntensity = None
+
+	"""
+	@return: the number of vertices with a usable weight
+	"""
+	def getPainted(self):
+		return self.vertices - self.unpainted - self.degenerate
+
+	"""
+	Adds the intensities of the usable painted vertices of a mesh.
+	@param count: the number of vertices
+	@param total: the sum of their intensities
+	@param low: the lowest intensity
+	@param high: the highest intensity
+	@param histogram: the number of vertices in every bin
+	"""
+	def addIntensities(self, count, total, low, high, histogram):
+		if count == 0:
+			return
+		self.intensitySum += total
+		self.minIntensity = low if self.minIntensity == None else min(self.minIntensity, low)
+		self.maxIntensity = high if self.maxIntensity == None else max(self.maxIntensity, high)
+		self.histogram = [a + b for a, b in zip(self.histogram, histogram)]
+
+	"""
+	@return: true if any vertex would be read as black without being painted black
+	"""
+	def hasProblems(self):
+		return self.unpainted > 0 or self.degenerate > 0
+
+	"""
+	@return: the report as readable text
+	"""
+	def getText(self):
+		lines = ["User weights in "+self.colorSet+": %d vertices" % self.vertices]
+		if self.vertices == 0:
+			return "\n".join(lines)
+		percentage = lambda count: 100.0 * count / self.vertices
+		lines.append("  Unpainted: %d (%.1f%%), read as black" % (self.unpainted, percentage(self.unpainted)))
+		if self.missing:
+			lines.append("  Meshes without the color set: "+", ".join(self.missing))
+		lines.append("  Degenerate: %d (%.1f%%)" % (self.degenerate, percentage(self.degenerate)))
+		lines.append("  Black: %d (%.1f%%)" % (self.black, percentage(self.black)))
+		painted = self.getPainted()
+		if painted > 0:
+			mean = self.intensitySum / painted
+			lines.append("  Intensity: min %.3f, mean %.3f, max %.3f" % (self.minIntensity, mean, self.maxIntensity))
+			lines.append("  Weight with multiplier %s: min %.3f, at the mean intensity %.3f, max %.3f, unpainted %.3f" % (self.multiplier,
+				getWeight(self.minIntensity, self.multiplier), getWeight(mean, self.multiplier),
+				getWeight(self.maxIntensity, self.multiplier), getWeight(0, self.multiplier)))
+			bins = len(self.histogram)
+			for i, count in enumerate(self.histogram):
+				lines.append("  %.2f-%.2f: %s %d" % (float(i)/bins, float(i+1)/bins, "#"*int(round(40.0*count/painted)), count))
+		return "\n".join(lines)
+
+"""
+Reads the colors of a color set in one call through the mesh API. With numpy the colors are copied out of the mesh in
+one block, see MeshDataModule.
+@param shape: the full path of the mesh shape
+@param colorSet: the name of the color set
+@return: a numpy array of RGBA rows if numpy is available, otherwise a list of RGBA tuples. Unpainted vertices are UNSET_COLOR.
+"""
+def readVertexColors(shape, colorSet):
+	if numpy != None:
+		colors = numpy.frombuffer(getVertexColorBytes(getMeshFn1(shape), colorSet, UNSET_COLOR), dtype=numpy.float32)
+		return colors.reshape(-1, 4).astype(numpy.float64)
+	import maya.api.OpenMaya as om
+	return [tuple(color) for color in getMeshFn(shape).getVertexColors(colorSet, om.MColor(UNSET_COLOR))]
+
+"""
+Analyzes the colors of one mesh with numpy.
+"""
+def analyzeColorsNumpy(colors, report):
+	unset = (colors == -1.0).all(axis=1)
+	rgb = colors[~unset, :3]
+	with numpy.errstate(invalid="ignore"):
+		valid = ((rgb >= 0.0) & (rgb <= 1.0)).all(axis=1)
+	intensity = rgb[valid].mean(axis=1)
+	report.vertices += len(colors)
+	report.unpainted += int(unset.sum())
+	report.degenerate += int((~valid).sum())
+	report.black += int((intensity < BLACK_INTENSITY).sum())
+	if len(intensity) > 0:
+		histogram = numpy.histogram(intensity, len(report.histogram), range=(0.0, 1.0))[0]
+		report.addIntensities(len(intensity), float(intensity.sum()), float(intensity.min()), float(intensity.max()), histogram.tolist())
+
+"""
+Analyzes the colors of one mesh without numpy.
+"""
+def analyzeColorsPython(colors, report):
+	bins = len(report.histogram)
+	histogram = [0]*bins
+	total = 0.0
+	count = 0
+	low = None
+	high = None
+	for color in colors:
+		if tuple(color) == UNSET_COLOR:
+			report.unpainted += 1
+			continue
+		r, g, b = color[0], color[1], color[2]
+		# Written so that NaN fails the test
+		if not (0.0 <= r <= 1.0 and 0.0 <= g <= 1.0 and 0.0 <= b <= 1.0):
+			report.degenerate += 1
+			continue
+		intensity = (r + g + b) / 3.0
+		if intensity < BLACK_INTENSITY:
+			report.black += 1
+		histogram[min(int(intensity * bins), bins - 1)] += 1
+		total += intensity
+		count += 1
+		low = intensity if low == None else min(low, intensity)
+		high = intensity if high == None else max(high, intensity)
+	report.vertices += len(colors)
+	report.addIntensities(count, total, low, high, histogram)
+
+"""
+Checks how well a color set used as user weights covers a number of meshes. The colors are read in bulk through the
+mesh API and analyzed with numpy when it's available.
+@param nodes: the nodes to check, all meshes in or below them are included
+@param colorSet: the color set used as user weights
+@param multiplier: the user weights multiplier
+@param bins: the number of bins in the intensity histogram
+@return: a ColorSetReport
+"""
+def analyzeColorSet(nodes, colorSet, multiplier=1, bins=HISTOGRAM_BINS):
+	report = ColorSetReport(colorSet, multiplier, bins)
+	for shape in sorted(set(cmds.ls(nodes, dag=True, type="mesh", noIntermediate=True, long=True) or [])):
+		mesh = getMeshFn(shape)
+		if colorSet not in (mesh.getColorSetNames() or []):
+			report.missing.append(shape)
+			report.vertices += mesh.numVertices
+			report.unpainted += mesh.numVertices
+			continue
+		colors = readVertexColors(shape, colorSet)
+		if numpy != None:
+			analyzeColorsNumpy(colors, report)
+		else:
+			analyzeColorsPython(colors, report)
+	return report
+
+"""
+@param shape: the full path of a mesh shape
+@param vertexIds: the sorted indices of a number of vertices
+@return: the vertices as a list of components, with runs of consecutive vertices in one component
+"""
+def getVertexComponents(shape, vertexIds):
+	if len(vertexIds) == 0:
+		return []
+	if numpy != None:
+		vertexIds = numpy.asarray(vertexIds)
+		breaks = numpy.flatnonzero(numpy.diff(vertexIds) != 1)
+		starts = numpy.concatenate([vertexIds[:1], vertexIds[breaks + 1]]).tolist()
+		ends = numpy.concatenate([vertexIds[breaks], vertexIds[-1:]]).tolist()
+	else:
+		starts = [vertexId for i, vertexId in enumerate(vertexIds) if i == 0 or vertexIds[i - 1] != vertexId - 1]
+		ends = [vertexId for i, vertexId in enumerate(vertexIds) if i + 1 == len(vertexIds) or vertexIds[i + 1] != vertexId + 1]
+	return [shape+".vtx[%d:%d]" % run for run in zip(starts, ends)]
+
+"""
+Gives the unpainted vertices of a color set the neutral grey, with one command per mesh. Meshes that don't have the
+color set get it created. The colors are set with polyColorPerVertex, so the fill can be undone.
+@param nodes: the nodes to fill, all meshes in or below them are included
+@param colorSet: the color set used as user weights
+@param color: the RGBA color to fill with
+@return: the number of vertices that were filled
+"""
+def fillUnpainted(nodes, colorSet, color=NEUTRAL_COLOR):
+	filled = 0
+	for shape in sorted(set(cmds.ls(nodes, dag=True, type="mesh", noIntermediate=True, long=True) or [])):
+		mesh = getMeshFn(shape)
+		if colorSet not in (mesh.getColorSetNames() or []):
+			cmds.polyColorSet(shape, create=True, colorSet=colorSet, clamped=False, representation="RGBA")
+			vertexIds = range(mesh.numVertices)
+		else:
+			colors = readVertexColors(shape, colorSet)
+			if numpy != None:
+				vertexIds = numpy.flatnonzero((colors == -1.0).all(axis=1)).tolist()
+			else:
+				vertexIds = [i for i, c in enumerate(colors) if c == UNSET_COLOR]
+		if not vertexIds:
+			continue
+		previous = (cmds.polyColorSet(shape, query=True, currentColorSet=True) or [None])[0]
+		cmds.polyColorSet(shape, currentColorSet=True, colorSet=colorSet)
+		try:
+			cmds.polyColorPerVertex(getVertexComponents(shape, vertexIds), rgb=color[:3], alpha=color[3])
+		finally:
+			if previous and previous != colorSet:
+				cmds.polyColorSet(shape, currentColorSet=True, colorSet=previous)
+		filled += len(vertexIds)
+	return filled
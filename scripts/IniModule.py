@@ -0,0 +1,292 @@
+from ConfigParser import NoSectionError, NoOptionError
+from array import array
+
+"""
+Finds the end of the value on a key line, the same way RawConfigParser does it: an inline comment is a ';' that
+follows a whitespace character.
+@param data: the content of the file
+@param start: the offset of the first character of the value
+@param end: the offset of the end of the line
+@return: the offset of the end of the value, trailing whitespace excluded
+"""
+def findValueEnd(data, start, end):
+	pos = data.find(";", start, end)
+	while pos != -1:
+		if pos > start and data[pos-1].isspace():
+			end = pos
+			break
+		pos = data.find(";", pos+1, end)
+	while end > start and data[end-1].isspace():
+		end -= 1
+	return end
+
+"""
+@return: true if the line starting at the offset is an old style "rem" comment
+"""
+def isRemark(data, start, end):
+	return data[start:start+3].lower() == "rem" and (start+3 >= end or data[start+3].isspace())
+
+"""
+@param keyPath: a key written as section/name, for example Root/LODCollectionSection/LOD0Section/ReductionRatio
+@return: a (section, name) tuple
+"""
+def parseKeyPath(keyPath):
+	parts = keyPath.replace("\\", "/").rsplit("/", 1)
+	if len(parts) != 2 or len(parts[0]) == 0 or len(parts[1]) == 0:
+		raise ValueError("Not a section/name key path: "+keyPath)
+	return (parts[0], parts[1])
+
+"""
+@param key: a (section, name) tuple
+@return: the key written as section/name
+"""
+def getKeyPath(key):
+	return key[0]+"/"+key[1]
+
+"""
+The sections and keys of an .ini file with the offsets of their values. Presets share most of their section and key
+names, so the names are interned, and the offsets of every section are packed into an array of ints. The lookup tables
+are only built for the sections that are actually read, most of a catalog is never looked at in a session.
+The index is shared by every copy of a document and is never changed once built.
+"""
+class IniIndex(object):
+	__slots__ = ("sections", "names", "offsets", "sectionLookup", "keyLookups")
+
+	"""
+	@param sections: the names of the sections in the order they appear in the file
+	@param names: a tuple with the names of the keys of every section
+	@param offsets: an array with the start and end offset of the value of every key of every section
+	"""
+	def __init__(self, sections, names, offsets):
+		self.sections = sections
+		self.names = names
+		self.offsets = offsets
+		# section -> the positions of the section in the file, sections can be declared more than once
+		self.sectionLookup = None
+		# section -> {lower case key -> (key, valueStart, valueEnd)}
+		self.keyLookups = {}
+
+	"""
+	@return: the index as plain data that can be marshalled
+	"""
+	def getData(self):
+		return (self.sections, self.names, [offsets.tostring() for offsets in self.offsets])
+
+	"""
+	@param data: plain data as returned by getData
+	@return: the IniIndex
+	"""
+	@staticmethod
+	def fromData(data):
+		sections, names, offsets = data
+		return IniIndex(sections, names, [array("i", sectionOffsets) for sectionOffsets in offsets])
+
+	"""
+	@return: a dictionary of section -> the positions of the section in the file
+	"""
+	def getSectionLookup(self):
+		if self.sectionLookup == None:
+			lookup = {}
+			for position, section in enumerate(self.sections):
+				lookup.setdefault(section, []).append(position)
+			self.sectionLookup = lookup
+		return self.sectionLookup
+
+	"""
+	@param section: the name of a section
+	@param position: the position of the declaration of the section to list, the first one if None
+	@return: a list of (key, valueStart, valueEnd) tuples of all keys in the declaration of the section
+	"""
+	def getKeys(self, section, position=None):
+		if position == None:
+			position = self.getSectionLookup()[section][0]
+		offsets = self.offsets[position]
+		return [(name, offsets[2*keyIndex], offsets[2*keyIndex+1]) for keyIndex, name in enumerate(self.names[position])]
+
+	"""
+	@param section: the name of a section
+	@return: a dictionary of lower case key -> (key, valueStart, valueEnd), None if there is no such section. Keys that
+	are declared more than once get the last value, like with RawConfigParser.
+	"""
+	def getKeyLookup(self, section):
+		keys = self.keyLookups.get(section)
+		if keys == None:
+			positions = self.getSectionLookup().get(section)
+			if positions == None:
+				return None
+			keys = {}
+			for position in positions:
+				for key in self.getKeys(section, position):
+					keys[key[0].lower()] = key
+			self.keyLookups[section] = keys
+		return keys
+
+"""
+Indexes the sections and keys of an .ini file in one pass.
+@param data: the content of the file
+@return: an IniIndex of the content
+"""
+def indexIni(data):
+	sections = []
+	names = []
+	offsets = []
+	keys = None
+	pos = 0
+	length = len(data)
+	while pos < length:
+		lineEnd = data.find("\n", pos)
+		if lineEnd == -1:
+			lineEnd = length
+		first = data[pos:pos+1]
+		if first == "[":
+			close = data.find("]", pos, lineEnd)
+			if close != -1:
+				if keys != None:
+					names.append(tuple(keys))
+				keys = []
+				sections.append(intern(data[pos+1:close]))
+				offsets.append(array("i"))
+		elif keys != None and not first.isspace() and first not in ";#" and not isRemark(data, pos, lineEnd):
+			# Continuation lines (starting with whitespace) are not supported, the Simplygon presets don't use them
+			separator = data.find("=", pos, lineEnd)
+			colon = data.find(":", pos, lineEnd)
+			if colon != -1 and (separator == -1 or colon < separator):
+				separator = colon
+			if separator != -1:
+				valueStart = separator+1
+				while valueStart < lineEnd and data[valueStart] in " \t":
+					valueStart += 1
+				keys.append(intern(data[pos:separator].strip()))
+				offsets[-1].append(valueStart)
+				offsets[-1].append(findValueEnd(data, valueStart, lineEnd))
+		pos = lineEnd+1
+	if keys != None:
+		names.append(tuple(keys))
+	return IniIndex(sections, names, offsets)
+
+"""
+An .ini file that keeps the original content, comments included. Sections and keys are indexed with the offsets of
+their values, so lookups are a dictionary access and a slice. Changed values are kept aside and spliced into the
+original content when the file is written, everything else is written back byte for byte.
+The interface mirrors the parts of ConfigParser.RawConfigParser that are used by the tool. Like RawConfigParser,
+section names are case sensitive and key names are not.
+"""
+class IniDocument:
+	"""
+	@param data: the content of the .ini file
+	@param index: the IniIndex of the content as returned by indexIni, created if not provided
+	"""
+	def __init__(self, data, index=None):
+		self.data = data
+		if index == None:
+			index = indexIni(data)
+		self.index = index
+		# valueStart -> (valueEnd, new value)
+		self.changes = {}
+
+	"""
+	@return: a copy of the document that can be changed without affecting this one. The content and the index are shared.
+	"""
+	def copy(self):
+		copy = IniDocument(self.data, self.index)
+		copy.changes = dict(self.changes)
+		return copy
+
+	"""
+	@return: a list of the names of all sections, in the order they appear in the file
+	"""
+	def sections(self):
+		return list(self.index.sections)
+
+	"""
+	@return: true if the section exists
+	"""
+	def has_section(self, section):
+		return section in self.index.getSectionLookup()
+
+	"""
+	@return: true if the key exists in the section
+	"""
+	def has_option(self, section, name):
+		keys = self.index.getKeyLookup(section)
+		return keys != None and name.lower() in keys
+
+	"""
+	@return: the (key, valueStart, valueEnd) index entry of a key
+	"""
+	def getEntry(self, section, name):
+		keys = self.index.getKeyLookup(section)
+		if keys == None:
+			raise NoSectionError(section)
+		entry = keys.get(name.lower())
+		if entry == None:
+			raise NoOptionError(name, section)
+		return entry
+
+	"""
+	@return: the value of a key
+	"""
+	def get(self, section, name):
+		key, start, end = self.getEntry(section, name)
+		change = self.changes.get(start)
+		if change != None:
+			return change[1]
+		return self.data[start:end]
+
+	"""
+	Changes the value of an existing key. New keys can't be added.
+	"""
+	def set(self, section, name, value):
+		key, start, end = self.getEntry(section, name)
+		if value == self.data[start:end]:
+			self.changes.pop(start, None)
+		else:
+			self.changes[start] = (end, str(value))
+
+	"""
+	@return: a list of (key, value) tuples of all keys in the section
+	"""
+	def items(self, section):
+		if not self.has_section(section):
+			raise NoSectionError(section)
+		return [(key, self.get(section, key)) for key, start, end in self.index.getKeys(section)]
+
+	"""
+	@return: true if any value has been changed
+	"""
+	def isModified(self):
+		return len(self.changes) > 0
+
+	"""
+	@return: the content of the file with all changes spliced in
+	"""
+	def getText(self):
+		if not self.changes:
+			return self.data
+		parts = []
+		pos = 0
+		for start in sorted(self.changes):
+			end, value = self.changes[start]
+			parts.append(self.data[pos:start])
+			parts.append(value)
+			pos = end
+		parts.append(self.data[pos:])
+		return "".join(parts)
+
+	"""
+	Writes the file with all changes spliced in.
+	@param outFile: the file to write to
+	"""
+	def write(self, outFile):
+		outFile.write(self.getText())
+
+"""
+@param path: the .ini file to read
+@return: an IniDocument of the file, empty if the file can't be read
+"""
+def readIni(path):
+	try:
+		with open(path, "rb") as inFile:
+			return IniDocument(inFile.read())
+	except IOError:
+		return IniDocument("")
@@ -0,0 +1,237 @@
+import os, time, json, threading, atexit
+
+# Environment variable that turns tracing on: 1 to write the traces to the local cache, or the folder to write them to
+TRACE_VARIABLE = "SIMPLYGON_TRACE"
+TRACE_DIR = "traces"
+
+"""
+The timing of a block of code, recorded as a complete event in the trace when the block ends. The counters that changed
+while the block ran are added to the event, so every span shows how many Maya commands it issued, how many bytes it
+wrote and so on. Only the counts of the thread the block runs on are included, so work done by the batch queue or
+watcher threads at the same time isn't attributed to the block.
+"""
+class Span:
+	def __init__(self, tracer, name, args):
+		self.tracer = tracer
+		self.name = name
+		self.args = args
+		self.start = None
+		self.counters = None
+
+	def __enter__(self):
+		self.counters = dict(self.tracer.getThreadCounters())
+		self.start = time.time()
+		return self
+
+	def __exit__(self, excType, excValue, traceback):
+		end = time.time()
+		args = dict(self.args)
+		for name, value in self.tracer.getThreadCounters().items():
+			if value != self.counters.get(name, 0):
+				args[name] = value - self.counters.get(name, 0)
+		if excType != None:
+			args["error"] = excType.__name__
+		self.tracer.addEvent({"name": self.name, "ph": "X", "ts": self.tracer.getTimestamp(self.start),
+			"dur": int((end - self.start)*1000000), "args": args})
+		return False
+
+"""
+Stands in for a span when tracing is off, so instrumented code costs next to nothing.
+"""
+class NullSpan:
+	def __enter__(self):
+		return self
+
+	def __exit__(self, excType, excValue, traceback):
+		return False
+
+NULL_SPAN = NullSpan()
+
+"""
+Stands in for maya.cmds in an instrumented module and counts every command that goes through it, both in total and per
+command.
+"""
+class CountingCommands:
+	def __init__(self, tracer, commands):
+		self.tracer = tracer
+		self.commands = commands
+
+	def __getattr__(self, name):
+		command = getattr(self.commands, name)
+		if not callable(command):
+			return command
+		tracer = self.tracer
+		def countedCommand(*args, **flags):
+			tracer.count("cmds calls")
+			tracer.count("cmds."+name)
+			return command(*args, **flags)
+		return countedCommand
+
+"""
+Records nested timing spans and counters for a session and writes them as a trace in the Chrome trace event format,
+which can be opened in chrome://tracing or Perfetto. Nothing is recorded until the tracer is enabled.
+The trace is written in the array form of the format, which the viewers read without the closing bracket, so every save
+only appends the events recorded since the last one and then forgets them. A long session neither rewrites its whole
+trace nor keeps it in memory.
+"""
+class Tracer:
+	def __init__(self):
+		self.enabled = False
+		self.path = None
+		# The events recorded since the trace was last saved
+		self.events = []
+		# True once the start of the trace has been written to the file
+		self.started = False
+		self.counters = {}
+		# The counters of every thread, only touched by the thread itself, see getThreadCounters
+		self.threadState = threading.local()
+		self.startTime = time.time()
+		self.lock = threading.Lock()
+		# Saves can come from the main thread and from the exit handler
+		self.saveLock = threading.Lock()
+		# Modules whose maya.cmds has been replaced, module -> the original commands
+		self.instrumentedModules = {}
+
+	"""
+	Starts recording. The trace of the session is written to a file named after the start time and the process.
+	@param folder: the folder to write the trace to, the local cache if None
+	"""
+	def enable(self, folder=None):
+		if self.enabled:
+			return
+		if folder == None:
+			# The cache module is instrumented itself, so it can't be imported up front
+			from SettingsCacheModule import getCacheDir
+			folder = getCacheDir(TRACE_DIR)
+		elif not os.path.isdir(folder):
+			os.makedirs(folder)
+		self.path = os.path.join(folder, "simplygonTrace_%s_%d.json" % (time.strftime("%Y%m%d_%H%M%S"), os.getpid())).replace("\\", "/")
+		self.events = []
+		self.started = False
+		self.counters = {}
+		self.startTime = time.time()
+		self.enabled = True
+
+	"""
+	Enables tracing if it has been turned on through the environment variable.
+	"""
+	def enableFromEnvironment(self):
+		value = os.environ.get(TRACE_VARIABLE)
+		if value == None or value in ["", "0"]:
+			return
+		self.enable(None if value == "1" else value)
+
+	"""
+	Stops recording and puts back the original maya.cmds in the instrumented modules. The trace is written first.
+	"""
+	def disable(self):
+		if not self.enabled:
+			return
+		self.save()
+		self.restoreCommands()
+		self.enabled = False
+
+	"""
+	@param name: the name of the span
+	@param args: values to show with the span in the trace
+	@return: a context manager that records the span, for use in a with statement
+	"""
+	def span(self, name, **args):
+		if not self.enabled:
+			return NULL_SPAN
+		return Span(self, name, args)
+
+	"""
+	Adds to a counter.
+	@param name: the name of the counter
+	@param amount: the amount to add
+	"""
+	def count(self, name, amount=1):
+		if not self.enabled:
+			return
+		with self.lock:
+			self.counters[name] = self.counters.get(name, 0) + amount
+		counters = self.getThreadCounters()
+		counters[name] = counters.get(name, 0) + amount
+
+	"""
+	@return: a dictionary of counter name -> the amount counted on the calling thread since it started
+	"""
+	def getThreadCounters(self):
+		counters = getattr(self.threadState, "counters", None)
+		if counters == None:
+			counters = self.threadState.counters = {}
+		return counters
+
+	"""
+	@param seconds: a time as returned by time.time
+	@return: the time as microseconds since the start of the session
+	"""
+	def getTimestamp(self, seconds):
+		return int((seconds - self.startTime)*1000000)
+
+	"""
+	Adds an event to the trace, with the process and thread filled in.
+	@param event: a trace event
+	"""
+	def addEvent(self, event):
+		event["pid"] = os.getpid()
+		event["tid"] = threading.current_thread().ident
+		with self.lock:
+			self.events.append(event)
+
+	"""
+	Replaces maya.cmds in a number of modules with a proxy that counts the commands issued through it.
+	@param modules: the modules to instrument, modules without a cmds attribute are skipped
+	"""
+	def instrumentCommands(self, modules):
+		if not self.enabled:
+			return
+		for module in modules:
+			commands = getattr(module, "cmds", None)
+			if commands != None and not isinstance(commands, CountingCommands):
+				self.instrumentedModules[module] = commands
+				module.cmds = CountingCommands(self, commands)
+
+	"""
+	Puts back the original maya.cmds in the instrumented modules.
+	"""
+	def restoreCommands(self):
+		for module, commands in self.instrumentedModules.items():
+			module.cmds = commands
+		self.instrumentedModules.clear()
+
+	"""
+	@return: the events recorded since the last save, which are forgotten, followed by a counter event with the totals of
+	the counters so far
+	"""
+	def takeEvents(self):
+		with self.lock:
+			events = self.events
+			self.events = []
+			counters = dict(self.counters)
+		events.append({"name": "counters", "ph": "C", "ts": self.getTimestamp(time.time()), "pid": os.getpid(), "tid": 0, "args": counters})
+		return events
+
+	"""
+	Appends the events recorded since the last save to the trace of the session. Safe to call any number of times.
+	@return: the path of the written trace, None if tracing is off
+	"""
+	def save(self):
+		if not self.enabled:
+			return None
+		with self.saveLock:
+			data = ",\n".join(json.dumps(event) for event in self.takeEvents())
+			with open(self.path, "ab" if self.started else "wb") as outFile:
+				outFile.write((",\n" if self.started else "[\n")+data)
+			self.started = True
+		return self.path
+
+# The tracer of the process. It's only created the first time the module is loaded so that the recorded session survives
+# the reloads done by the shelf command.
+try:
+	tracer
+except NameError:
+	tracer = Tracer()
+	tracer.enableFromEnvironment()
+	atexit.register(lambda: tracer.save())
@@ -0,0 +1,363 @@
+import json, os, shutil, socket, tempfile, threading, time, uuid
+from SettingsCacheModule import writeFileAtomic
+from BatchQueueModule import BatchQueue, BatchJob, JOB_DONE, JOB_FAILED, JOB_CANCELLED, getProcessorCount
+from IniModule import parseKeyPath, getKeyPath
+
+SPOOL_PENDING = "pending"
+SPOOL_CLAIMED = "claimed"
+SPOOL_DONE = "done"
+SPOOL_FAILED = "failed"
+SPOOL_FOLDERS = [SPOOL_PENDING, SPOOL_CLAIMED, SPOOL_DONE, SPOOL_FAILED]
+JOB_EXTENSION = ".json"
+# Touched by every worker to read the time of the file server, so machines with skewed clocks agree on what is stale
+CLOCK_FILE = ".clock"
+# How often a worker touches the jobs it has claimed
+HEARTBEAT_INTERVAL = 30
+# A claimed job that hasn't been touched for this long belongs to a worker that has died, and is put back in the spool
+STALE_CLAIM_AGE = 10*60
+# A job that has failed this many times is moved to the failed folder
+MAX_ATTEMPTS = 3
+# The number of lines of worker output kept in the manifest of a job
+MANIFEST_LOG_LINES = 50
+
+"""
+@return: a name for this worker process that is unique across the machines sharing a spool
+"""
+def getWorkerName():
+	return "%s-%d" % (socket.gethostname(), os.getpid())
+
+"""
+A spool of optimization jobs in a shared folder, so that several machines can share the work without a server. Every
+job is a JSON file that moves between four folders:
+- pending: waiting to be processed
+- claimed: being processed. A worker claims a job by renaming it into this folder, which only one worker can do.
+The worker touches the file regularly, so jobs of workers that have died can be told apart and put back.
+- done: the job file with a manifest of the result and timing added
+- failed: the same for jobs that have failed MAX_ATTEMPTS times
+"""
+class JobSpool:
+	"""
+	@param folder: the spool folder, the sub folders are created if they don't exist
+	"""
+	def __init__(self, folder):
+		self.folder = folder.replace("\\", "/")
+		for name in SPOOL_FOLDERS:
+			path = self.getPath(name)
+			if not os.path.isdir(path):
+				try:
+					os.makedirs(path)
+				except OSError:
+					if not os.path.isdir(path):
+						raise
+
+	"""
+	@param state: one of the spool folders
+	@param jobId: the id of a job, or None for the folder itself
+	@return: the path of the folder, or of the job file in it
+	"""
+	def getPath(self, state, jobId=None):
+		if jobId == None:
+			return self.folder+"/"+state
+		return self.folder+"/"+state+"/"+jobId+JOB_EXTENSION
+
+	"""
+	@param state: one of the spool folders
+	@return: the ids of the jobs in the folder, oldest first
+	"""
+	def getJobIds(self, state):
+		try:
+			names = os.listdir(self.getPath(state))
+		except OSError:
+			return []
+		return sorted([name[:-len(JOB_EXTENSION)] for name in names if name.endswith(JOB_EXTENSION)])
+
+	"""
+	@return: the current time according to the file server, see CLOCK_FILE
+	"""
+	def getTime(self):
+		path = self.folder+"/"+CLOCK_FILE
+		try:
+			with open(path, "ab"):
+				pass
+			os.utime(path, None)
+			return os.stat(path).st_mtime
+		except (IOError, OSError):
+			return time.time()
+
+	"""
+	@param state: one of the spool folders
+	@param jobId: the id of the job
+	@return: the job as a dictionary, or None if it can't be read
+	"""
+	def readJob(self, state, jobId):
+		try:
+			with open(self.getPath(state, jobId), "rb") as inFile:
+				return json.load(inFile)
+		except (IOError, OSError, ValueError):
+			return None
+
+	"""
+	@param state: one of the spool folders
+	@param jobId: the id of the job
+	@param job: the job as a dictionary
+	"""
+	def writeJob(self, state, jobId, job):
+		writeFileAtomic(self.getPath(state, jobId), json.dumps(job, indent=1, sort_keys=True))
+
+	"""
+	Adds a job to the spool.
+	@param scene: the scene to optimize, must be reachable under the same path from all machines
+	@param settingName: the name of the setting to optimize with
+	@param overrides: a dictionary of (section, key) -> value to merge into the config
+	@param output: where to save the optimized scene, next to the scene with an _LOD suffix if None
+	@param objects: the objects in the scene to optimize, all meshes if empty
+	@param colorSet: the color set to use as user weights, None if user weights aren't used
+	@param weightMultiplier: the user weights multiplier
+	@return: the id of the job
+	"""
+	def submit(self, scene, settingName, overrides=None, output=None, objects=None, colorSet=None, weightMultiplier=1):
+		jobId = "%d-%s" % (int(time.time()*1000), uuid.uuid4().hex[:8])
+		job = {"id": jobId,
+			"name": os.path.basename(scene),
+			"scene": scene.replace("\\", "/"),
+			"setting": settingName,
+			"overrides": dict([(getKeyPath(key), value) for key, value in (overrides or {}).iteritems()]),
+			"output": output,
+			"objects": objects or [],
+			"colorSet": colorSet,
+			"weightMultiplier": weightMultiplier,
+			"attempts": 0,
+			"submitted": time.time()}
+		self.writeJob(SPOOL_PENDING, jobId, job)
+		return jobId
+
+	"""
+	Claims the oldest pending job.
+	@return: the id of the claimed job, or None if there are no pending jobs
+	"""
+	def claim(self):
+		for jobId in self.getJobIds(SPOOL_PENDING):
+			path = self.getPath(SPOOL_PENDING, jobId)
+			try:
+				# Touch it first, the rename keeps the time and an old claim would be recovered straight away
+				os.utime(path, None)
+				os.rename(path, self.getPath(SPOOL_CLAIMED, jobId))
+			except OSError:
+				# Another worker got there first
+				continue
+			return jobId
+		return None
+
+	"""
+	Marks a claimed job as alive.
+	@return: false if the claim has been lost, which happens if the job was considered stale
+	"""
+	def heartbeat(self, jobId):
+		try:
+			os.utime(self.getPath(SPOOL_CLAIMED, jobId), None)
+			return True
+		except OSError:
+			return False
+
+	"""
+	Moves a finished job from the claimed folder and stores it with its manifest. The result is dropped if the claim
+	has been lost, the job then belongs to the worker that recovered it.
+	@param jobId: the id of the job
+	@param job: the job as a dictionary
+	@param succeeded: true if the job was optimized
+	@param manifest: a dictionary describing the result and timing of the attempt
+	@return: the folder the job was moved to, or None if the claim was lost
+	"""
+	def finish(self, jobId, job, succeeded, manifest):
+		job = dict(job)
+		job["attempts"] = job.get("attempts", 0) + 1
+		job.setdefault("history", []).append(manifest)
+		if succeeded:
+			state = SPOOL_DONE
+		elif job["attempts"] >= MAX_ATTEMPTS:
+			state = SPOOL_FAILED
+		else:
+			state = SPOOL_PENDING
+		# Move the claim into the target folder first, under a name the other workers ignore, so only the worker that
+		# still holds the claim can store a result
+		finishing = self.getPath(state, jobId)+"."+getWorkerName()
+		try:
+			os.rename(self.getPath(SPOOL_CLAIMED, jobId), finishing)
+		except OSError:
+			print "Warning! The claim on "+jobId+" was lost while it was being processed, the result is dropped"
+			return None
+		writeFileAtomic(finishing, json.dumps(job, indent=1, sort_keys=True))
+		os.rename(finishing, self.getPath(state, jobId))
+		return state
+
+	"""
+	Puts the claimed jobs whose worker has stopped touching them back in the spool, or moves them to the failed folder
+	if they have used up their attempts.
+	@param maxAge: the time in seconds after which a claim is considered stale
+	@return: the ids of the recovered jobs
+	"""
+	def recoverStaleClaims(self, maxAge=STALE_CLAIM_AGE):
+		now = self.getTime()
+		recovered = []
+		for jobId in self.getJobIds(SPOOL_CLAIMED):
+			path = self.getPath(SPOOL_CLAIMED, jobId)
+			try:
+				if now - os.stat(path).st_mtime < maxAge:
+					continue
+				# Move it aside first, so only one worker recovers it
+				recovering = path+"."+getWorkerName()
+				os.rename(path, recovering)
+			except OSError:
+				continue
+			try:
+				with open(recovering, "rb") as inFile:
+					job = json.load(inFile)
+			except (IOError, ValueError):
+				os.rename(recovering, self.getPath(SPOOL_FAILED, jobId))
+				continue
+			job["attempts"] = job.get("attempts", 0) + 1
+			job.setdefault("history", []).append({"status": "stale", "recovered": now, "recoveredBy": getWorkerName()})
+			if job["attempts"] >= MAX_ATTEMPTS:
+				self.writeJob(SPOOL_FAILED, jobId, job)
+			else:
+				self.writeJob(SPOOL_PENDING, jobId, job)
+			os.remove(recovering)
+			recovered.append(jobId)
+		return recovered
+
+	"""
+	@return: a dictionary of spool folder -> number of jobs in it
+	"""
+	def getStatus(self):
+		return dict([(state, len(self.getJobIds(state))) for state in SPOOL_FOLDERS])
+
+"""
+Processes the jobs of a spool on this machine. A job is claimed as soon as a worker slot is free, so a slow job doesn't
+keep the other slots waiting, and is run through the batch queue with its config merged by the settings manager.
+"""
+class SpoolWorker:
+	"""
+	@param spool: the JobSpool to process
+	@param settingsManager: the OptimizationSettingsManager holding the settings the jobs refer to
+	@param workers: the maximum number of jobs to process at the same time
+	@param command: the worker command, see BatchQueue
+	"""
+	def __init__(self, spool, settingsManager, workers=None, command=None):
+		self.spool = spool
+		self.settingsManager = settingsManager
+		self.workers = workers or getProcessorCount()
+		self.command = command
+		self.processed = 0
+
+	"""
+	Processes jobs until the spool is empty, or forever if watching. The claims are touched while the jobs run.
+	@param watch: true if the worker should keep waiting for new jobs
+	@param pollInterval: the time in seconds between looking for new jobs once the spool has run dry
+	@param onJobChanged: called with the BatchJob every time a job changes status
+	@return: the number of jobs processed
+	"""
+	def run(self, watch=False, pollInterval=10, onJobChanged=None):
+		statsDir = tempfile.mkdtemp(prefix="SimplygonSpool")
+		queue = None
+		# Job id -> (job, BatchJob) of the claimed jobs that haven't been handed back to the spool yet
+		active = {}
+		lost = set()
+		lastHeartbeat = time.time()
+		nextClaim = 0
+		# Wakes the loop up as soon as a job changes status, so a free slot is filled straight away
+		changed = threading.Event()
+		def jobChanged(batchJob):
+			changed.set()
+			if onJobChanged != None:
+				onJobChanged(batchJob)
+		try:
+			while True:
+				# Hand the finished jobs back to the spool, which frees their slots
+				for jobId, (job, batchJob) in active.items():
+					if batchJob.status in (JOB_DONE, JOB_FAILED, JOB_CANCELLED):
+						del active[jobId]
+						if batchJob.status != JOB_CANCELLED and jobId not in lost:
+							if self.spool.finish(jobId, job, batchJob.status == JOB_DONE, self.getManifest(batchJob)) != None:
+								self.processed += 1
+						lost.discard(jobId)
+						nextClaim = 0
+				if len(active) < self.workers and time.time() >= nextClaim:
+					self.spool.recoverStaleClaims()
+					while len(active) < self.workers:
+						jobId = self.spool.claim()
+						if jobId == None:
+							nextClaim = time.time() + pollInterval
+							break
+						# A fresh queue once the old one is idle, so the finished jobs don't pile up in it when watching
+						if queue == None or not active:
+							queue = BatchQueue(self.settingsManager, self.workers, self.command)
+						added = self.addJob(queue, jobId, statsDir)
+						if added != None:
+							active[jobId] = added
+				if not active:
+					if not watch:
+						return self.processed
+					time.sleep(max(0, nextClaim - time.time()))
+					continue
+				# Jobs added just as the dispatcher ran out of work are left pending, the queue is started again for them
+				if not queue.isRunning():
+					queue.start(onJobChanged=jobChanged)
+				changed.wait(1.0)
+				changed.clear()
+				if time.time() - lastHeartbeat >= HEARTBEAT_INTERVAL:
+					lastHeartbeat = time.time()
+					for jobId in sorted(active):
+						if jobId not in lost and not self.spool.heartbeat(jobId):
+							print "Warning! The claim on "+jobId+" was lost, another worker has taken it over"
+							lost.add(jobId)
+		finally:
+			shutil.rmtree(statsDir, True)
+
+	"""
+	Adds a claimed job to the batch queue. A job that can't be read or has invalid overrides is handed back to the
+	spool as a failed attempt.
+	@param queue: the BatchQueue to add the job to
+	@param jobId: the id of the claimed job
+	@param statsDir: the folder the worker writes the statistics of the job to
+	@return: a (job, BatchJob) tuple, or None if the job can't be processed
+	"""
+	def addJob(self, queue, jobId, statsDir):
+		job = self.spool.readJob(SPOOL_CLAIMED, jobId)
+		if job == None:
+			self.spool.finish(jobId, {"id": jobId}, False, {"status": "unreadable", "worker": getWorkerName()})
+			return None
+		try:
+			overrides = dict([(parseKeyPath(keyPath), value) for keyPath, value in job.get("overrides", {}).iteritems()])
+		except ValueError as e:
+			self.spool.finish(jobId, job, False, {"status": "invalid", "error": str(e), "worker": getWorkerName()})
+			return None
+		statsFile = statsDir+"/"+jobId+".json"
+		if os.path.exists(statsFile):
+			# Left by an earlier attempt of the same job
+			os.remove(statsFile)
+		batchJob = BatchJob(job.get("name", jobId), job["scene"], job["setting"], overrides, job.get("objects"), job.get("colorSet"),
+			job.get("weightMultiplier", 1), job.get("output"), statsFile=statsFile)
+		outputDir = os.path.dirname(batchJob.output)
+		if len(outputDir) > 0 and not os.path.isdir(outputDir):
+			try:
+				os.makedirs(outputDir)
+			except OSError:
+				# Another worker might have created it in the meantime
+				pass
+		return (job, queue.addJob(batchJob))
+
+	"""
+	@param batchJob: a processed BatchJob
+	@return: a dictionary describing the result and timing of the job
+	"""
+	def getManifest(self, batchJob):
+		return {"status": batchJob.status,
+			"returnCode": batchJob.returnCode,
+			"worker": getWorkerName(),
+			"output": batchJob.output,
+			"settingsFile": batchJob.settingsFile,
+			"startTime": batchJob.startTime,
+			"endTime": batchJob.endTime,
+			"wallTime": batchJob.getElapsedTime(),
+			"stats": batchJob.stats,
+			"log": batchJob.log[-MANIFEST_LOG_LINES:]}
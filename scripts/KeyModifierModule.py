@@ -1,27 +1,375 @@
-import maya.cmds as cmds
+try:
+	import maya.cmds as cmds
+except ImportError:
+	# The settings can be loaded and merged without Maya, only the user interface needs it. See SimplygonHeadless.
+	cmds = None
 import xml.etree.ElementTree as etree
+import functools, itertools, weakref
+from InstrumentationModule import tracer
+
+# Maya can crash when the callback of a control is a member function, see SimplygonBatchProcessor. The controls of the
+# keys and sections call module level functions with an id instead, which is looked up here. The owners of the controls
+# aren't kept alive by the table, and it survives reloads of the module so the controls that exist keep working.
+try:
+	controlOwners
+except NameError:
+	controlOwners = weakref.WeakValueDictionary()
+	controlOwnerIds = itertools.count()
+
+"""
+@param owner: an object that creates controls, a key modifier or a section
+@return: the id the callbacks of its controls find it with, see getControlOwner
+"""
+def registerControlOwner(owner):
+	ownerId = next(controlOwnerIds)
+	controlOwners[ownerId] = owner
+	return ownerId
+
+"""
+@param ownerId: the id returned by registerControlOwner
+@return: the owner of the controls, None if it's gone
+"""
+def getControlOwner(ownerId):
+	return controlOwners.get(ownerId)
+
+"""
+Called when the user has changed the control of a key.
+@param ownerId: the id of the key modifier
+"""
+def keyControlChanged(ownerId, *_):
+	key = getControlOwner(ownerId)
+	if key != None:
+		key.onControlChanged()
+
+"""
+@param value: a string from the XML, or None
+@return: the interned string, so equal strings in a catalog share their memory. Unicode strings (names with
+non-ASCII characters) can't be interned and are returned as they are.
+"""
+def internValue(value):
+	if value == None or isinstance(value, unicode):
+		return value
+	return intern(value)
+
+"""
+The choices of a drop list. Catalogs repeat the same choices (Highest, High, Normal...) for a lot of keys, so every
+distinct list is stored once and shared by all keys that use it. It must not be changed.
+"""
+class ChoiceTable(object):
+	__slots__ = ("descriptions", "choices")
+
+	"""
+	@param pairs: a tuple of (description, value) pairs in the order they are declared
+	"""
+	def __init__(self, pairs):
+		self.descriptions = tuple(description for description, value in pairs)
+		# description -> value
+		self.choices = dict(pairs)
+
+"""
+The metadata of all keys of a catalog, in flat lists indexed by key id. Keys with the same name, section, type,
+description, range and choices get the same id, so a key that is exposed in hundreds of settings is only stored once.
+The key modifiers only hold their id and the values that change in a session.
+"""
+class KeyTable(object):
+	__slots__ = ("names", "sections", "types", "descriptions", "mins", "maxs", "choiceIds", "choicePairs", "choiceTables",
+		"keyIds", "choiceIdLookup")
+
+	"""
+	@param data: plain data as returned by getData, an empty table is created if None
+	"""
+	def __init__(self, data=None):
+		if data == None:
+			data = {"names": [], "sections": [], "types": [], "descriptions": [], "mins": [], "maxs": [], "choiceIds": [], "choices": []}
+		self.names = data["names"]
+		self.sections = data["sections"]
+		self.types = data["types"]
+		self.descriptions = data["descriptions"]
+		# The range of IntRange and FloatRange keys, None for other keys
+		self.mins = data["mins"]
+		self.maxs = data["maxs"]
+		# The position of the choices of Droplist keys in choicePairs, -1 for other keys
+		self.choiceIds = data["choiceIds"]
+		self.choicePairs = data["choices"]
+		# The ChoiceTables, created the first time a key uses them
+		self.choiceTables = [None]*len(self.choicePairs)
+		# Only used while the table is built, key metadata -> key id and choices -> choice id
+		self.keyIds = None
+		self.choiceIdLookup = None
+
+	"""
+	@return: the table as plain data that can be marshalled
+	"""
+	def getData(self):
+		return {"names": self.names,
+			"sections": self.sections,
+			"types": self.types,
+			"descriptions": self.descriptions,
+			"mins": self.mins,
+			"maxs": self.maxs,
+			"choiceIds": self.choiceIds,
+			"choices": self.choicePairs}
+
+	"""
+	@return: the number of distinct keys in the table
+	"""
+	def getKeyCount(self):
+		return len(self.names)
+
+	"""
+	Adds a key from the settings XML, unless an identical key has been added before.
+	@param xmlElement: the Key element
+	@return: the id of the key, None if the key has an unknown type or an invalid range
+	"""
+	def addKey(self, xmlElement):
+		if self.keyIds == None:
+			self.keyIds = dict((self.getKeyMetadata(keyId), keyId) for keyId in range(self.getKeyCount()))
+			self.choiceIdLookup = dict((pairs, choiceId) for choiceId, pairs in enumerate(self.choicePairs))
+		type = internValue(xmlElement.get("type"))
+		if type not in KEY_CLASSES:
+			return None
+		minimum = None
+		maximum = None
+		choiceId = -1
+		try:
+			if type == "IntRange":
+				minimum = getIntValue(xmlElement.get("min"))
+				maximum = getIntValue(xmlElement.get("max"))
+			elif type == "FloatRange":
+				minimum = float(xmlElement.get("min"))
+				maximum = float(xmlElement.get("max"))
+		except (TypeError, ValueError):
+			print "Warning! The key "+str(xmlElement.get("name"))+" in "+str(xmlElement.get("section"))+" has an invalid range and is left out"
+			return None
+		if type == "Droplist":
+			pairs = []
+			for choice in xmlElement.findall('Choice'):
+				value = internValue(choice.get("value"))
+				description = internValue(choice.get("description"))
+				if description == None:
+					description = value
+				pairs.append((description, value))
+			pairs = tuple(pairs)
+			choiceId = self.choiceIdLookup.get(pairs)
+			if choiceId == None:
+				choiceId = len(self.choicePairs)
+				self.choicePairs.append(pairs)
+				self.choiceTables.append(None)
+				self.choiceIdLookup[pairs] = choiceId
+		metadata = (internValue(xmlElement.get("name")), internValue(xmlElement.get("section")), type,
+			internValue(xmlElement.get("description")), minimum, maximum, choiceId)
+		keyId = self.keyIds.get(metadata)
+		if keyId == None:
+			keyId = self.getKeyCount()
+			for values, value in zip((self.names, self.sections, self.types, self.descriptions, self.mins, self.maxs, self.choiceIds), metadata):
+				values.append(value)
+			self.keyIds[metadata] = keyId
+		return keyId
+
+	"""
+	@return: a tuple of all metadata of a key, in the order it's passed to addKey
+	"""
+	def getKeyMetadata(self, keyId):
+		return (self.names[keyId], self.sections[keyId], self.types[keyId], self.descriptions[keyId], self.mins[keyId],
+			self.maxs[keyId], self.choiceIds[keyId])
+
+	"""
+	@return: a tuple of all metadata of a key with the choices instead of their id, which can be compared between tables
+	"""
+	def getKeySignature(self, keyId):
+		choiceId = self.choiceIds[keyId]
+		return self.getKeyMetadata(keyId)[:-1] + (self.choicePairs[choiceId] if choiceId >= 0 else None,)
+
+	"""
+	@return: the shared ChoiceTable of a Droplist key
+	"""
+	def getChoiceTable(self, keyId):
+		choiceId = self.choiceIds[keyId]
+		table = self.choiceTables[choiceId]
+		if table == None:
+			table = ChoiceTable(self.choicePairs[choiceId])
+			self.choiceTables[choiceId] = table
+		return table
+
+	"""
+	@return: a new key modifier of the right type for a key
+	"""
+	def createModifier(self, keyId):
+		return KEY_CLASSES[self.types[keyId]](self, keyId)
+
 """
-Parent class for components that can be used to modify a key in the settings file
+Parent class for components that can be used to modify a key in the settings file.
+The value of the key is kept in Python. The control writes to it from its change callback, so reading the value never
+has to query the user interface. The modifier also keeps track of whether the value differs from the one in the
+loaded config (dirty), so only the keys that have actually been changed need to be written.
+The metadata of the key is kept in a shared KeyTable, a modifier only holds the id of the key and its state.
 """
-class KeyModifier:
-	def __init__(self, xmlElement):
-		self.description = xmlElement.get("description")
-		#Points out which key/section of the config file this is modfying
-		self.keyName = xmlElement.get("name")
-		self.keySection = xmlElement.get("section")
+class KeyModifier(object):
+	__slots__ = ("table", "keyId", "control", "controlId", "value", "defaultValue", "dirty", "enabled", "listener", "__weakref__")
+
+	"""
+	@param table: the KeyTable of the catalog
+	@param keyId: the id of the key in the table
+	"""
+	def __init__(self, table, keyId):
+		self.table = table
+		self.keyId = keyId
+		# The control is only created when the section the key is in is expanded. Until then the value and the enabled
+		# state are only kept here.
+		self.control = None
+		# The id the change callback of the control finds the modifier with, see registerControlOwner
+		self.controlId = None
+		self.value = None
+		self.defaultValue = None
+		self.dirty = False
+		self.enabled = True
+		# Gets told when the key becomes dirty or clean, see setListener
+		self.listener = None
+
+	"""
+	@returns: the description of the key, shown next to the control
+	"""
+	@property
+	def description(self):
+		return self.table.descriptions[self.keyId]
+
+	"""
+	@returns: the lowest value of a range key, None for other keys
+	"""
+	@property
+	def min(self):
+		return self.table.mins[self.keyId]
+
+	"""
+	@returns: the highest value of a range key, None for other keys
+	"""
+	@property
+	def max(self):
+		return self.table.maxs[self.keyId]
 
 	"""
 	@returns: the name of the key in the configuration file this modifier is targeting
 	"""		
 	def getKeyName(self):
-		return self.keyName
+		return self.table.names[self.keyId]
 
 	"""
 	@returns: the section of the key in the configuration file this modifier is targeting
 	"""		
 	def getKeySection(self):
-		return self.keySection
+		return self.table.sections[self.keyId]
 		
+	"""
+	@returns: true if the control of this modifier has been created
+	"""		
+	def isBuilt(self):
+		return self.control != None
+
+	"""
+	Forgets the control of this modifier, should be called when the control has been deleted.
+	"""		
+	def releaseComponent(self):
+		self.control = None
+
+	"""
+	Pushes the value and enabled state that was set before the control existed to a newly created control.
+	"""		
+	def initComponent(self):
+		if self.value != None:
+			self.pushValue()
+		# Controls are enabled when they are created
+		if not self.enabled:
+			self.enabled = True
+			self.enable(False)
+
+	"""
+	@returns: the current value of the component
+	"""
+	def getValue(self):
+		return self.value
+
+	"""
+	Sets the value of the component. The key is marked as dirty if the value differs from the default value.
+	@param value: a string to set as value for this component
+	"""
+	def setValue(self, value):
+		tracer.count("key values set")
+		self.value = self.normalizeValue(value)
+		self.updateDirty()
+		if self.isBuilt():
+			tracer.count("key controls updated")
+			self.pushValue()
+
+	"""
+	Sets the value that was loaded from the config. The key is no longer dirty after this.
+	@param value: a string to set as value for this component
+	"""
+	def setDefaultValue(self, value):
+		self.defaultValue = self.normalizeValue(value)
+		self.setValue(value)
+
+	"""
+	@returns: true if the value has been changed from the value in the loaded config
+	"""
+	def isDirty(self):
+		return self.dirty
+
+	"""
+	@return: the change command for the control of this key, see keyControlChanged
+	"""
+	def getChangeCommand(self):
+		if self.controlId == None:
+			self.controlId = registerControlOwner(self)
+		return functools.partial(keyControlChanged, self.controlId)
+
+	"""
+	Called by the control when the user has changed it, through keyControlChanged. Reads the new value into the model.
+	"""
+	def onControlChanged(self, *_):
+		tracer.count("key controls changed")
+		self.value = self.normalizeValue(self.readControl())
+		self.updateDirty()
+
+	"""
+	Compares the value to the default value and tells the listener if the key became dirty or clean.
+	"""
+	def updateDirty(self):
+		dirty = self.value != self.defaultValue
+		if dirty != self.dirty:
+			self.dirty = dirty
+			if self.listener != None:
+				self.listener.keyDirtyChanged(self)
+
+	"""
+	@param listener: an object with a keyDirtyChanged(key) function that is called when the key becomes dirty or clean
+	"""
+	def setListener(self, listener):
+		self.listener = listener
+
+	"""
+	Can be overridden to convert a value to the form the component would return it in, so that values can be compared.
+	@param value: a string value
+	@returns: the normalized value
+	"""
+	def normalizeValue(self, value):
+		return value
+
+	"""
+	Can be overridden to describe the values the key can take, used by parameter sweeps.
+	@param steps: how many values to pick from a continuous range
+	@returns: a list of legal values as strings, empty if the key can't be swept
+	"""
+	def getSweepValues(self, steps):
+		return []
+
+	"""
+	Can be overridden to draw values from a continuous range, used by parameter sweeps.
+	@param generator: the random.Random to draw from
+	@returns: a random legal value as a string
+	"""
+	def getRandomValue(self, generator):
+		return generator.choice(self.getSweepValues(2))
+
 	"""
 	Must be defined in an implementing component. Should create the a component and place it in the parent container.
 	@param parentContainer: the container to put the component in
@@ -30,21 +378,21 @@ class KeyModifier:
 		pass
 		
 	"""
-	Must be defined in an implementing component and return the current value of the component	
-	@returns: the current value of the component
+	Must be defined in an implementing component and return the value the control is currently set to
+	@returns: the value of the control as a string
 	"""
-	def getValue(self):
+	def readControl(self):
 		pass
 
 	"""
-	Must be defined in an implementing component and allow for the setting of the value of the component
-	@param value: a string to set as value for this component
+	Must be defined in an implementing component and set the control to the current value
 	"""
-	def setValue(self, value):
+	def pushValue(self):
 		pass
 		
 	"""
-	Must be defined in an implementing component. Should enable/disable all controls
+	Must be defined in an implementing component. Should enable/disable all controls. Since this is called on every
+	selection change, implementations should only touch the controls when the state actually changes.
 	@param enabled: true if the component should be enabled.
 	"""
 	def enable(self, enabled):
@@ -54,18 +402,21 @@ class KeyModifier:
 Class that creates a drop list component to select the value for a key from.
 """		
 class DropListData(KeyModifier):
-	def __init__(self, xmlElement):
-		KeyModifier.__init__(self, xmlElement)
-		# We need both a dictionary and a description array to maintain item ordering while allowing for description and values.
-		self.choices = {}		
-		self.descriptions = []
-		for key in xmlElement.findall('Choice'):
-			val = key.get("value")
-			desc = key.get("description")
-			if desc == None:
-				desc = val
-			self.choices[desc] = val
-			self.descriptions.append(desc)
+	__slots__ = ()
+
+	"""
+	@returns: a dictionary of description -> value of all choices, shared with other keys and must not be changed
+	"""
+	@property
+	def choices(self):
+		return self.table.getChoiceTable(self.keyId).choices
+
+	"""
+	@returns: the descriptions of all choices in the order they are declared, to maintain the item ordering
+	"""
+	@property
+	def descriptions(self):
+		return self.table.getChoiceTable(self.keyId).descriptions
 			
 	"""
 	Creates the drop list with a description text as well.
@@ -74,73 +425,101 @@ class DropListData(KeyModifier):
 	def createComponent(self, parentContainer):
 		layout = cmds.rowLayout (parent= parentContainer, numberOfColumns = 2)
 		cmds.text(parent= layout, l=self.description, align="right", w=150)
-		self.selector = cmds.optionMenu(parent= layout, w=350)
+		self.control = cmds.optionMenu(parent= layout, w=350, changeCommand=self.getChangeCommand())
 		for desc in self.descriptions:
-			cmds.menuItem(parent=self.selector, label=desc)
+			cmds.menuItem(parent=self.control, label=desc)
+		self.initComponent()
 		return layout
 		
 	"""
 	@returns: the value (not the description) of current select item of the component
 	"""
-	def getValue(self):
-		selectedOption = cmds.optionMenu(self.selector, query=True, value=True)
+	def readControl(self):
+		selectedOption = cmds.optionMenu(self.control, query=True, value=True)
 		return self.choices[selectedOption]
 		
 	"""
-	Sets the selected item in the drop list. The incoming value should be the underlying value, not the description.
-	@param value: the value (not the description) of current select item of the component
+	Sets the selected item in the drop list. The value is the underlying value, not the description.
 	"""
-	def setValue(self, value):
+	def pushValue(self):
 		for k,v in self.choices.iteritems():
-			if v == value:
-				cmds.optionMenu(self.selector, edit=True, value=k)	
+			if v == self.value:
+				cmds.optionMenu(self.control, edit=True, value=k)	
+
+	"""
+	@returns: the values of all choices, in the order they are declared
+	"""
+	def getSweepValues(self, steps):
+		return [self.choices[desc] for desc in self.descriptions]
 	
 	"""
 	Enables/disables the drop list
 	@param enabled: true if the component should be enabled.
 	"""
 	def enable(self, enabled):
-		cmds.optionMenu(self.selector, edit=True, en=enabled)
+		if enabled == self.enabled:
+			return
+		self.enabled = enabled
+		if self.isBuilt():
+			cmds.optionMenu(self.control, edit=True, en=enabled)
 		
 		
 """
 Class for a boolean key value
 """
 class CheckBoxData(KeyModifier):
-	def __init__(self, xmlElement):
-		KeyModifier.__init__(self, xmlElement)
+	__slots__ = ()
 			
 	"""
 	Creates the check box
 	@param parentContainer: the container the component will be placed in
 	"""
 	def createComponent(self, parentContainer):
-		self.checkBox = cmds.checkBox(parent= parentContainer, w=500, l=self.description)
-		return self.checkBox
+		self.control = cmds.checkBox(parent= parentContainer, w=500, l=self.description, changeCommand=self.getChangeCommand())
+		self.initComponent()
+		return self.control
 		
+	"""
+	@param value: a string value
+	@returns: the value as a string boolean (false/true)
+	"""
+	def normalizeValue(self, value):
+		if value == None:
+			return None
+		if value == "true":
+			return "true"
+		return "false"
+
 	"""
 	@returns: the state of the checkbox as a string boolean (false/true)
 	"""
-	def getValue(self):
-		if cmds.checkBox(self.checkBox, query = True, value=True):
+	def readControl(self):
+		if cmds.checkBox(self.control, query = True, value=True):
 			return "true"
 		return "false"
+
 	"""
 	Sets the state of the checkbox
-	@param value: a string boolean (false/true)
 	"""
-	def setValue(self, value):
-		v = False
-		if value == "true":
-			v = True
-		cmds.checkBox(self.checkBox, edit = True, value=v)
+	def pushValue(self):
+		cmds.checkBox(self.control, edit = True, value=self.value == "true")
+
+	"""
+	@returns: both states of the checkbox
+	"""
+	def getSweepValues(self, steps):
+		return ["false", "true"]
 		
 	"""
 	Enables/disables the check box
 	@param enabled: true if the component should be enabled.
 	"""
 	def enable(self, enabled):
-		cmds.checkBox(self.checkBox, edit=True, en=enabled)
+		if enabled == self.enabled:
+			return
+		self.enabled = enabled
+		if self.isBuilt():
+			cmds.checkBox(self.control, edit=True, en=enabled)
 		
 """
 Small little helper function that converts a string to int (even if it's a float string)	
@@ -157,75 +536,131 @@ def getIntValue(str):
 Class for an integer range slider
 """
 class IntRangeData(KeyModifier):
-	def __init__(self, xmlElement):
-		KeyModifier.__init__(self, xmlElement)
-		self.min = getIntValue(xmlElement.get("min"))
-		self.max = getIntValue(xmlElement.get("max"))
-	
+	__slots__ = ()
 
 	"""
 	Creates the slider control
 	@param parentContainer: the container the component will be placed in
 	"""
 	def createComponent(self, parentContainer):
-		self.slider = cmds.intSliderGrp(parent= parentContainer, field=True, label=self.description, minValue=self.min, maxValue=self.max)
-		return self.slider
+		self.control = cmds.intSliderGrp(parent= parentContainer, field=True, label=self.description, minValue=self.min, maxValue=self.max,
+			changeCommand=self.getChangeCommand())
+		self.initComponent()
+		return self.control
 		
+	"""
+	@param value: a string that is an int or a float
+	@returns: the value as an int string
+	"""
+	def normalizeValue(self, value):
+		if value == None:
+			return None
+		return str(getIntValue(value))
+
 	"""
 	@returns: the state of the slider as a string
 	"""
-	def getValue(self):
-		return str(cmds.intSliderGrp(self.slider, query = True, value=True))
+	def readControl(self):
+		return str(cmds.intSliderGrp(self.control, query = True, value=True))
 		
 	"""
 	Sets the state of the slider
-	@param value: a string that is an int or a float
 	"""
-	def setValue(self, value):
-		cmds.intSliderGrp(self.slider, edit = True, value=getIntValue(value))
+	def pushValue(self):
+		cmds.intSliderGrp(self.control, edit = True, value=getIntValue(self.value))
+
+	"""
+	@returns: up to steps evenly spaced values from min to max
+	"""
+	def getSweepValues(self, steps):
+		if steps < 2 or self.max == self.min:
+			return [str(self.min)]
+		values = []
+		for step in range(steps):
+			value = str(self.min + int(round((self.max - self.min) * step / float(steps - 1))))
+			if value not in values:
+				values.append(value)
+		return values
+
+	"""
+	@returns: a random value from min to max
+	"""
+	def getRandomValue(self, generator):
+		return str(generator.randint(self.min, self.max))
 				
 	"""
 	Enables/disables the slider
 	@param enabled: true if the component should be enabled.
 	"""
 	def enable(self, enabled):
-		cmds.intSliderGrp(self.slider, edit=True, en=enabled)
+		if enabled == self.enabled:
+			return
+		self.enabled = enabled
+		if self.isBuilt():
+			cmds.intSliderGrp(self.control, edit=True, en=enabled)
 		
 		
 """
 Class for an float range slider
 """
 class FloatRangeData(KeyModifier):
-	def __init__(self, xmlElement):
-		KeyModifier.__init__(self, xmlElement)
-		self.min = float(xmlElement.get("min"))
-		self.max = float(xmlElement.get("max"))
-	
+	__slots__ = ()
+
 	"""
 	Creates the slider control
 	@param parentContainer: the container the component will be placed in
 	"""
 	def createComponent(self, parentContainer):
-		self.slider = cmds.floatSliderGrp(parent= parentContainer, field=True, label=self.description, minValue=self.min, maxValue=self.max)
-		return self.slider
+		self.control = cmds.floatSliderGrp(parent= parentContainer, field=True, label=self.description, minValue=self.min, maxValue=self.max,
+			changeCommand=self.getChangeCommand())
+		self.initComponent()
+		return self.control
 		
+	"""
+	@param value: a string that is an int or a float
+	@returns: the value as a float string
+	"""
+	def normalizeValue(self, value):
+		if value == None:
+			return None
+		return str(float(value))
+
 	"""
 	@returns: the state of the slider as a string
 	"""
-	def getValue(self):
-		return str(cmds.floatSliderGrp(self.slider, query = True, value=True))
+	def readControl(self):
+		return str(cmds.floatSliderGrp(self.control, query = True, value=True))
 		
 	"""
 	Sets the state of the slider
-	@param value: a string that is an int or a float
 	"""
-	def setValue(self, value):
-		cmds.floatSliderGrp(self.slider, edit = True, value=getIntValue(value))
+	def pushValue(self):
+		cmds.floatSliderGrp(self.control, edit = True, value=float(self.value))
+
+	"""
+	@returns: steps evenly spaced values from min to max
+	"""
+	def getSweepValues(self, steps):
+		if steps < 2:
+			return [str(self.min)]
+		return [str(self.min + (self.max - self.min) * step / float(steps - 1)) for step in range(steps)]
+
+	"""
+	@returns: a random value from min to max
+	"""
+	def getRandomValue(self, generator):
+		return str(generator.uniform(self.min, self.max))
 				
 	"""
 	Enables/disables the slider
 	@param enabled: true if the component should be enabled.
 	"""
 	def enable(self, enabled):
-		cmds.intSliderGrp(self.slider, edit=True, en=enabled)
-		
\ No newline at end of file
+		if enabled == self.enabled:
+			return
+		self.enabled = enabled
+		if self.isBuilt():
+			cmds.floatSliderGrp(self.control, edit=True, en=enabled)
+
+# The key modifier class of every key type in the settings XML
+KEY_CLASSES = {"Droplist": DropListData, "Checkbox": CheckBoxData, "IntRange": IntRangeData, "FloatRange": FloatRangeData}
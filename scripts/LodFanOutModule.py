@@ -0,0 +1,109 @@
+import maya.cmds as cmds
+from SelectionPlannerModule import matchLodRoots
+
+AUTO_LOD_SECTION = "Root/AutoLODSection"
+CASCADED_KEY = "CascadedLODChain"
+LOD_COLLECTION_SECTION = "Root/LODCollectionSection"
+LOD_COUNT_KEY = "LODCount"
+
+"""
+@param lodIndex: the number of a LOD
+@return: the section that holds the settings of the LOD
+"""
+def getLodSection(lodIndex):
+	return LOD_COLLECTION_SECTION+"/LOD%dSection" % lodIndex
+
+"""
+@param config: an IniDocument of a merged config
+@return: true if every LOD is made from the one before it, false if every LOD is made from the original
+"""
+def isCascaded(config):
+	if not config.has_option(AUTO_LOD_SECTION, CASCADED_KEY):
+		return True
+	return config.get(AUTO_LOD_SECTION, CASCADED_KEY).strip().lower() != "false"
+
+"""
+@param config: an IniDocument of a merged config
+@return: the number of LODs the config produces
+"""
+def getLodCount(config):
+	if not config.has_option(LOD_COLLECTION_SECTION, LOD_COUNT_KEY):
+		return 1
+	try:
+		return int(config.get(LOD_COLLECTION_SECTION, LOD_COUNT_KEY))
+	except ValueError:
+		return 1
+
+"""
+Makes a config that only produces one of the LODs of another config. The settings of the LOD are copied into the first
+LOD slot and the LOD count is set to one. The other LOD sections are left in the file, Simplygon ignores them.
+@param config: an IniDocument of a merged config, it isn't changed
+@param lodIndex: the LOD to keep
+@return: an IniDocument with the single LOD config
+"""
+def getSingleLodConfig(config, lodIndex):
+	single = config.copy()
+	single.set(LOD_COLLECTION_SECTION, LOD_COUNT_KEY, "1")
+	if lodIndex == 0:
+		return single
+	source = getLodSection(lodIndex)
+	target = getLodSection(0)
+	for section in config.sections():
+		if section != source and not section.startswith(source+"/"):
+			continue
+		targetSection = target+section[len(source):]
+		for key, value in config.items(section):
+			# The first LOD slot needs every key of the LOD, since keys can't be added to the file
+			if not single.has_option(targetSection, key):
+				raise KeyError("%s has no %s key to copy %s into" % (targetSection, key, section))
+			single.set(targetSection, key, value)
+	return single
+
+"""
+Splits a config into one config per LOD, so the LODs can be optimized at the same time. That is only possible when the
+LODs don't depend on each other, which is when the LOD chain isn't cascaded.
+@param config: an IniDocument of a merged config
+@return: a list with a single LOD config for every LOD, or None if the LODs have to be optimized in one run
+"""
+def getFanOutConfigs(config):
+	count = getLodCount(config)
+	if count < 2 or isCascaded(config):
+		return None
+	try:
+		return [getSingleLodConfig(config, lodIndex) for lodIndex in range(count)]
+	except KeyError as e:
+		print "Warning! The LODs can't be optimized separately, they are optimized in one run: "+str(e)
+		return None
+
+"""
+Groups the LODs that were optimized separately into one LOD group, with a child for every LOD in LOD order.
+@param lodNodes: a list with the full paths of the top level LOD nodes of every LOD, in LOD order
+@param name: the name of the LOD group
+@return: the full path of the LOD group
+"""
+def mergeLods(lodNodes, name):
+	group = cmds.group(empty=True, name=name)
+	for lodIndex, nodes in enumerate(lodNodes):
+		level = cmds.group(empty=True, parent=group, name="%s_LOD%d" % (name, lodIndex))
+		if nodes:
+			cmds.parent(nodes, level)
+	return (cmds.ls(group, long=True) or [group])[0]
+
+"""
+Splits the LODs of a number of objects that were optimized together by the object they were made from, see
+matchLodRoots. LODs that can't be matched to a single object are left out, with a warning.
+@param lodNodes: a list with the full paths of the top level LOD nodes of every LOD, in LOD order
+@param roots: the full paths of the objects that were optimized
+@return: a list of (root, lodNodes) tuples in the order of the roots, with the LOD nodes of the object in LOD order.
+Objects without any LODs are left out.
+"""
+def splitLodsByRoot(lodNodes, roots):
+	split = dict((root, [[] for nodes in lodNodes]) for root in roots)
+	for lodIndex, nodes in enumerate(lodNodes):
+		for node in nodes:
+			matches = matchLodRoots(node, roots)
+			if len(matches) != 1:
+				print "Warning! Couldn't tell which object "+node+" was made from, it's left where it was imported"
+				continue
+			split[matches[0]][lodIndex].append(node)
+	return [(root, split[root]) for root in roots if any(split[root])]
@@ -0,0 +1,125 @@
+import ctypes, array
+
+# The MScriptUtil pointer to copy into, the array typecode of a value and the number of values of an element, for every
+# kind of array that can be copied
+ARRAY_LAYOUTS = {
+	"MIntArray": ("asIntPtr", "i", 1),
+	"MFloatPointArray": ("asFloat4Ptr", "f", 4),
+	"MColorArray": ("asFloat4Ptr", "f", 4)}
+
+"""
+@param shape: the full path of a mesh shape
+@return: an API 1.0 MFnMesh of the shape
+"""
+def getMeshFn1(shape):
+	import maya.OpenMaya as om
+	selection = om.MSelectionList()
+	selection.add(shape)
+	dagPath = om.MDagPath()
+	selection.getDagPath(0, dagPath)
+	return om.MFnMesh(dagPath)
+
+"""
+@param pointer: a pointer handed out by MScriptUtil
+@param size: the number of bytes to read
+@return: a copy of the memory as a string
+"""
+def readPointer(pointer, size):
+	if size == 0:
+		return ""
+	return ctypes.string_at(int(pointer), size)
+
+"""
+Fills an MScriptUtil from a flat sequence of values. The values are handed over as a compact array, not as a list, so
+no Python object is kept for every value.
+@param util: the MScriptUtil to fill
+@param values: an array.array, a numpy array or a string of raw values of the typecode
+@param typecode: the array typecode of the values, "i" or "f"
+@return: the number of values
+"""
+def fillScriptUtil(util, values, typecode):
+	if isinstance(values, str):
+		values = array.array(typecode, values)
+	count = len(values)
+	util.createFromList(values, count)
+	return count
+
+"""
+Copies an API 1.0 array into a string in one call. The Python API 2.0 only hands out the elements of its arrays one by
+one, which costs a Python object or more for every vertex. The string can be hashed as it is or turned into a numpy
+array with numpy.frombuffer, the values are int32 for ints and float32 for points and colors, in the native byte order.
+@param mayaArray: an MIntArray, MFloatPointArray or MColorArray
+@return: the raw bytes of all elements, see ARRAY_LAYOUTS
+"""
+def getArrayBytes(mayaArray):
+	import maya.OpenMaya as om
+	pointerType, typecode, width = ARRAY_LAYOUTS[type(mayaArray).__name__]
+	count = mayaArray.length()*width
+	if count == 0:
+		return ""
+	# The buffer the array is copied into is reserved from a block of zero bytes
+	size = array.array(typecode).itemsize
+	util = om.MScriptUtil()
+	fillScriptUtil(util, "\0"*(count*size), typecode)
+	pointer = getattr(util, pointerType)()
+	mayaArray.get(pointer)
+	return readPointer(pointer, count*size)
+
+"""
+@param mesh: an API 1.0 MFnMesh
+@return: the raw bytes of the XYZW float32 object space positions of all vertices
+"""
+def getPointBytes(mesh):
+	import maya.OpenMaya as om
+	points = om.MFloatPointArray()
+	mesh.getPoints(points, om.MSpace.kObject)
+	return getArrayBytes(points)
+
+"""
+@param mesh: an API 1.0 MFnMesh
+@return: a (counts, connects) tuple of the raw int32 bytes of the number of vertices of every face and the vertices of
+all faces, face after face
+"""
+def getTopologyBytes(mesh):
+	import maya.OpenMaya as om
+	counts = om.MIntArray()
+	connects = om.MIntArray()
+	mesh.getVertices(counts, connects)
+	return (getArrayBytes(counts), getArrayBytes(connects))
+
+"""
+@param mesh: an API 1.0 MFnMesh
+@param colorSet: the name of the color set
+@param unsetColor: the RGBA color to return for vertices that haven't been painted
+@return: the raw bytes of the RGBA float32 color of every vertex
+"""
+def getVertexColorBytes(mesh, colorSet, unsetColor):
+	import maya.OpenMaya as om
+	colors = om.MColorArray()
+	mesh.getVertexColors(colors, colorSet, om.MColor(*unsetColor))
+	return getArrayBytes(colors)
+
+"""
+Sets the color of every vertex of a mesh with one write.
+@param mesh: an API 1.0 MFnMesh
+@param colorSet: the color set to write to, it must exist
+@param rgba: a flat float32 array.array or numpy array of RGBA values, four for every vertex
+"""
+def setVertexColorList(mesh, colorSet, rgba):
+	import maya.OpenMaya as om
+	count = len(rgba)/4
+	if count == 0:
+		return
+	colorUtil = om.MScriptUtil()
+	fillScriptUtil(colorUtil, rgba, "f")
+	idUtil = om.MScriptUtil()
+	fillScriptUtil(idUtil, array.array("i", xrange(count)), "i")
+	colors = om.MColorArray(colorUtil.asFloat4Ptr(), count)
+	vertexIds = om.MIntArray(idUtil.asIntPtr(), count)
+	previous = mesh.currentColorSetName()
+	mesh.setCurrentColorSetName(colorSet)
+	try:
+		mesh.setVertexColors(colors, vertexIds)
+	finally:
+		if previous and previous != colorSet:
+			mesh.setCurrentColorSetName(previous)
@@ -1,33 +1,58 @@
-import ConfigParser
-import maya.cmds as cmds
-import inspect, os
-import xml.etree.ElementTree as etree
+try:
+	import maya.cmds as cmds
+except ImportError:
+	# Only the panels need Maya
+	cmds = None
+import functools, inspect, os
+from collections import OrderedDict
 import KeyModifierModule
 reload(KeyModifierModule)
 from KeyModifierModule import *
+import SettingsCacheModule
+reload(SettingsCacheModule)
+from SettingsCacheModule import *
+import SettingsCatalogModule
+reload(SettingsCatalogModule)
+from SettingsCatalogModule import *
+import TempSettingsModule
+reload(TempSettingsModule)
+from TempSettingsModule import *
+from InstrumentationModule import tracer
+
+# The number of setting panels that are kept alive (hidden) after switching to another setting
+MAX_CACHED_PANELS = 5
 
 """
 Class that contains data about a section in the settings XML. It can also generate for the interface. 
+Sections can start collapsed, in which case the controls of the children are created the first time it's expanded.
 """
-class SectionData:
-	def __init__(self, xmlElement, indentLevel):
-		self.description = xmlElement.get("description")
+class SectionData(object):
+	__slots__ = ("description", "children", "indentLevel", "collapsed", "layout", "layoutId", "childrenBuilt", "__weakref__")
+
+	"""
+	@param sectionLayout: the layout of the section in the catalog, see SettingsCatalogModule.getSectionLayout
+	@param table: the KeyTable with the keys of the catalog
+	@param indentLevel: how deep the section is nested
+	"""
+	def __init__(self, sectionLayout, table, indentLevel):
+		self.description, collapsed, children = sectionLayout
 		self.children = []
 		self.indentLevel = indentLevel
-		# Read all the sub sections and sub keys in this section.
-		for child in xmlElement: 
-			if child.tag == 'Key':
-				type = child.get("type")
-				if type == "Droplist":
-					self.children.append(DropListData(child))	
-				elif type == "Checkbox":
-					self.children.append(CheckBoxData(child))	
-				elif type == "IntRange":
-					self.children.append(IntRangeData(child))	
-				elif type == "FloatRange":
-					self.children.append(FloatRangeData(child))	
-			elif child.tag == 'Section':
-				self.children.append(SectionData(child, indentLevel+1))
+		# Sub sections start collapsed unless the XML says otherwise
+		if collapsed == None:
+			self.collapsed = indentLevel >= 1
+		else:
+			self.collapsed = collapsed
+		self.layout = None
+		# The id the expand and collapse callbacks of the layout find the section with, see registerControlOwner
+		self.layoutId = None
+		self.childrenBuilt = False
+		# Create all the sub sections and sub keys in this section, keys are stored as their id in the key table
+		for child in children:
+			if isinstance(child, tuple):
+				self.children.append(SectionData(child, table, indentLevel+1))
+			else:
+				self.children.append(table.createModifier(child))
 				
 	"""
 	Creates the user interface for this section.
@@ -38,16 +63,55 @@ class SectionData:
 		font = "boldLabelFont"
 		if self.indentLevel >= 1:
 			font = "tinyBoldLabelFont"
-		layout = cmds.frameLayout(parent= parentContainer, l=self.description, collapsable=True, li=self.indentLevel*10, font=font)
-		for child in self.children:
-			#Add some air between the keys
-			if not isinstance(child, SectionData):
-				cmds.separator(parent= layout, height=1, style="none")
-			child.createComponent(layout)
+		# Any controls created for a previous layout are gone
+		self.releaseComponent()
+		if self.layoutId == None:
+			self.layoutId = registerControlOwner(self)
+		self.layout = cmds.frameLayout(parent= parentContainer, l=self.description, collapsable=True, li=self.indentLevel*10, font=font,
+			collapse=self.collapsed, expandCommand=functools.partial(sectionExpanded, self.layoutId),
+			collapseCommand=functools.partial(sectionCollapsed, self.layoutId))
+		if not self.collapsed:
+			self.createChildren()
+		return self.layout
+
+	"""
+	Creates the controls of all the children, if they haven't been created already.
+	"""
+	def createChildren(self):
+		if self.childrenBuilt:
+			return
+		self.childrenBuilt = True
+		with tracer.span("Build section", section=self.description):
+			for child in self.children:
+				#Add some air between the keys
+				if not isinstance(child, SectionData):
+					tracer.count("key controls built")
+					cmds.separator(parent= self.layout, height=1, style="none")
+				child.createComponent(self.layout)
 		#Add som air between the components
-		cmds.separator(parent= layout, height=1, style="none")
-		return layout
+		cmds.separator(parent= self.layout, height=1, style="none")
 
+	"""
+	Called when the section is expanded, through sectionExpanded. Creates the controls of the children the first time.
+	"""
+	def onExpand(self, *_):
+		self.collapsed = False
+		self.createChildren()
+
+	"""
+	Called when the section is collapsed, through sectionCollapsed. Remembers the state in case the panel is recreated.
+	"""
+	def onCollapse(self, *_):
+		self.collapsed = True
+
+	"""
+	Forgets the controls of this section and all its children, should be called when the controls have been deleted.
+	"""
+	def releaseComponent(self):
+		self.layout = None
+		self.childrenBuilt = False
+		for child in self.children:
+			child.releaseComponent()
 		
 	"""
 	Enables/disables this section
@@ -69,21 +133,47 @@ class SectionData:
 				keys.append(child)	
 		return keys
 			
+"""
+Called when the user expands a section.
+@param sectionId: the id of the SectionData, see registerControlOwner
+"""
+def sectionExpanded(sectionId, *_):
+	section = getControlOwner(sectionId)
+	if section != None:
+		section.onExpand()
+
+"""
+Called when the user collapses a section.
+@param sectionId: the id of the SectionData, see registerControlOwner
+"""
+def sectionCollapsed(sectionId, *_):
+	section = getControlOwner(sectionId)
+	if section != None:
+		section.onCollapse()
+
 """
  Data container class that keeps track of the setting files and the exposed sections.
+ The sections are kept as their compact layout from the catalog until they are needed, since most settings are never
+ selected in a session.
 """		
-class SettingData:
-	def __init__(self, xmlElement, basePath):
-		self.file = xmlElement.get("file")
-		self.name = xmlElement.get("name")
-		if not os.path.isabs(self.file):
-			self.file = basePath+"/"+self.file
-		if not os.path.isfile(self.file):
+class SettingData(object):
+	__slots__ = ("file", "name", "sectionLayouts", "table", "sections", "keys", "keyIndex", "keyPositions", "dirtyKeys")
+
+	def __init__(self, name, file, sectionLayouts, table, fileExists=True):
+		self.file = file
+		self.name = name
+		if not fileExists:
 			print "Warning: The file "+self.file+" referenced in "+self.name+" could not be found."
 		print self.file
-		self.sections = []
-		for section in xmlElement.findall('Section'):
-			self.sections.append(SectionData(section,0))
+		self.sectionLayouts = sectionLayouts
+		self.table = table
+		self.sections = None
+		# A flat list of all key modifiers and an index of (section, key) -> [key modifiers], built with the sections
+		self.keys = None
+		self.keyIndex = None
+		self.keyPositions = None
+		# The keys that currently differ from the loaded config, key modifier -> position in the key list
+		self.dirtyKeys = {}
 
 	"""
 	@return: the file attribute of this setting data
@@ -92,10 +182,59 @@ class SettingData:
 		return self.file
 
 	"""
-	@return: a list of all sections in this setting data
+	@return: a list of all sections in this setting data, created the first time they are requested
 	"""		
 	def getSections(self):
+		if self.sections == None:
+			self.sections = [SectionData(sectionLayout, self.table, 0) for sectionLayout in self.sectionLayouts]
+			self.indexKeys()
 		return self.sections;
+
+	"""
+	Builds the flat list and the index of the keys in all sections, so the section tree doesn't have to be walked.
+	"""		
+	def indexKeys(self):
+		self.keys = []
+		self.keyIndex = {}
+		self.keyPositions = {}
+		for section in self.sections:
+			for key in section.getKeys():
+				key.setListener(self)
+				self.keyIndex.setdefault((key.getKeySection(), key.getKeyName()), []).append(key)
+				self.keyPositions[key] = len(self.keys)
+				self.keys.append(key)
+
+	"""
+	@return: a flat list of the key modifiers in all sections, in the order they are declared
+	"""		
+	def getKeys(self):
+		self.getSections()
+		return self.keys
+
+	"""
+	@param section: the section of the key in the config file
+	@param name: the name of the key in the config file
+	@return: a list of the key modifiers for the key, empty if the key isn't exposed
+	"""		
+	def getKeyModifiers(self, section, name):
+		self.getSections()
+		return self.keyIndex.get((section, name), [])
+
+	"""
+	@return: the key modifiers that differ from the loaded config, in the order they are declared
+	"""		
+	def getDirtyKeys(self):
+		return sorted(self.dirtyKeys, key=self.dirtyKeys.get)
+
+	"""
+	Called by the key modifiers when they become dirty or clean.
+	@param key: the key modifier that changed
+	"""		
+	def keyDirtyChanged(self, key):
+		if key.isDirty():
+			self.dirtyKeys[key] = self.keyPositions[key]
+		else:
+			self.dirtyKeys.pop(key, None)
 		
 		
 """
@@ -103,17 +242,72 @@ Class that managing the setting files, exposing variables and creating a setting
 """	
 class OptimizationSettingsManager:
 	def __init__(self, xmlFile):
-		tree = etree.parse(xmlFile)
-		root = tree.getroot()
+		self.xmlFile = xmlFile
+		with tracer.span("Load settings", xml=os.path.basename(xmlFile)):
+			self.catalog = loadCatalog(xmlFile)
 		self.settingDatas = {}
 		self.currentContainer = None
 		self.currentConfig = None
 		self.currentSetting = ""
-		basePath = os.path.dirname(xmlFile).replace("\\", "/")
-		for settingData in root.findall('Setting'):
-			if settingData.get("name") in self.settingDatas:
-				print "Warning! The setting data "+settingData.get("name")+" is declared several times. Have you been sloppy-pasting?"
-			self.settingDatas[settingData.get("name")] = SettingData(settingData, basePath)
+		# Panels of recently used settings, setting name -> (parent container, panel container, config)
+		self.panels = OrderedDict()
+		# The values the user had changed in settings that have been reloaded, setting name -> overrides. They are put
+		# back when the panel of the setting is built.
+		self.pendingOverrides = {}
+		for name, file, sectionLayouts in self.catalog.settings:
+			if name in self.settingDatas:
+				print "Warning! The setting data "+name+" is declared several times. Have you been sloppy-pasting?"
+			self.settingDatas[name] = self.createSettingData(name, file, sectionLayouts)
+
+	"""
+	@return: a new SettingData for a setting in the catalog
+	"""
+	def createSettingData(self, name, file, sectionLayouts):
+		return SettingData(name, file, sectionLayouts, self.catalog.keyTable, self.catalog.settingsFileExists(file))
+
+	"""
+	@return: a dictionary of file -> (mtime, size) of the settings XML and all .ini files, as they were when loaded
+	"""
+	def getWatchedFiles(self):
+		return self.catalog.getFileStamps()
+
+	"""
+	Reloads the settings XML and the .ini files if any of them has changed on disk. Only the changed files are parsed
+	again, and only the settings that were added, removed or changed are replaced. The other settings keep their panels
+	and the values the user has set. The panels of the replaced settings are deleted, the values the user had changed in
+	them are put back the next time the panel is built, for the keys that still exist.
+	@return: a set of the names of the settings that have been added, removed or changed, None if no file has changed
+	"""
+	def reloadSettings(self):
+		if self.catalog.isCurrent():
+			return None
+		previous = self.catalog
+		with tracer.span("Reload settings", xml=os.path.basename(self.xmlFile)):
+			self.catalog = loadCatalog(self.xmlFile, previous)
+			changed = getChangedSettings(previous, self.catalog)
+			settings = dict((name, (file, sectionLayouts)) for name, file, sectionLayouts in self.catalog.settings)
+			for name in changed:
+				if name in self.settingDatas and self.settingDatas[name].dirtyKeys:
+					self.pendingOverrides[name] = self.getOverrides(name)
+				self.settingDatas.pop(name, None)
+				panel = self.panels.pop(name, None)
+				if panel != None:
+					if cmds.columnLayout(panel[1], exists=True):
+						cmds.deleteUI(panel[1])
+					if panel[1] == self.currentContainer:
+						self.currentContainer = None
+				if name in settings:
+					self.settingDatas[name] = self.createSettingData(name, *settings[name])
+				else:
+					self.pendingOverrides.pop(name, None)
+			# Settings that haven't been shown only hold their layout, move them over to the new key table so the old
+			# one can be freed
+			for name, (file, sectionLayouts) in settings.iteritems():
+				settingData = self.settingDatas[name]
+				if name not in changed and settingData.sections == None:
+					settingData.sectionLayouts = sectionLayouts
+					settingData.table = self.catalog.keyTable
+		return changed
 
 	"""
 	@return: a list of the names of all the available settings files
@@ -123,6 +317,29 @@ class OptimizationSettingsManager:
 		for key in self.settingDatas:
 			settingNames.append(key)
 		return settingNames
+
+	"""
+	Searches the settings by name, section and key description, key name, .ini section path and default value. The
+	search index is built the first time, and stored in the local cache for later sessions.
+	Usage:
+		settingsManager.searchSettings("bonereductionsection/reductionratio")
+		settingsManager.searchSettings("cascadedlodchain=false character")
+	@param query: words that must all be found in a setting, case insensitive
+	@param prefix: true to only match the start of terms and words, e.g. "bone" finds BoneReductionSection
+	@return: the names of the matching settings in the order they are declared, all settings if the query is empty
+	"""
+	def searchSettings(self, query, prefix=False):
+		settingIds = self.catalog.getSearchIndex().search(query, prefix)
+		if settingIds == None:
+			settingIds = range(len(self.catalog.settings))
+		names = []
+		found = set()
+		for settingId in settingIds:
+			name = self.catalog.settings[settingId][0]
+			if name not in found:
+				found.add(name)
+				names.append(name)
+		return names
 		
 	"""
 	@return: the setting data of the setting matching the input name
@@ -135,18 +352,29 @@ class OptimizationSettingsManager:
 	"""	
 	def getSections(self, settingName):
 		return self.settingDatas[settingName].getSections()
+
+	"""
+	@return: the setting data matching the name
+	"""	
+	def getSettingData(self, settingName):
+		return self.settingDatas[settingName]
 		
 	"""
 	Enables/disables all the components in the optimization panel
 	@param enabled: true if the component should be enables
 	"""
 	def enable(self, enabled):
+		# The setting may have been removed by a reload
+		if self.currentSetting not in self.settingDatas:
+			return
 		sections = self.getSections(self.currentSetting)
 		for section in sections:
 			section.enable(enabled)		
 			
 	"""
 	When the selected setting is changed this function should be called to update the whole optimization panel.
+	If the setting has been shown recently its panel is still around and is just made visible again, with the values
+	the user left it with. Otherwise:
 	Loads the configuration for the selected setting file.
 	Creates the components for the exposed keys and adds them to the container.
 	Sets default values for the keys.
@@ -154,65 +382,178 @@ class OptimizationSettingsManager:
 	@param selectedSettingName: the name of the newly selected setting.
 	"""
 	def settingChanged(self, container, selectedSettingName):
-		# Load the configuration file
-		self.currentConfig = self.loadConfigurationFile(self.getSettingsFile(selectedSettingName))
-
-		#Clear the current interface
-		if self.currentContainer != None:
-			cmds.deleteUI(self.currentContainer)
-	
-		# Create the components that are exposed through the xml
+		previousContainer = self.currentContainer
 		self.currentSetting = selectedSettingName
-		self.currentContainer = cmds.columnLayout (parent= container, adjustableColumn = True)
-		if selectedSettingName != None:
-			sections = self.getSections(selectedSettingName)
-			for section in sections:
-				section.createComponent(self.currentContainer)
-		
-		self.setDefaultValues()
+		panel = self.panels.pop(selectedSettingName, None)
+		if panel != None and panel[0] == container:
+			# Reuse the cached panel
+			self.currentContainer = panel[1]
+			self.currentConfig = panel[2]
+			cmds.columnLayout(self.currentContainer, edit=True, visible=True)
+		else:
+			if panel != None:
+				cmds.deleteUI(panel[1])
+			with tracer.span("Build panel", setting=selectedSettingName):
+				# Load the configuration file
+				self.currentConfig = self.loadConfigurationFile(self.getSettingsFile(selectedSettingName))
+
+				# Create the components that are exposed through the xml
+				self.currentContainer = cmds.columnLayout (parent= container, adjustableColumn = True)
+				if selectedSettingName != None:
+					sections = self.getSections(selectedSettingName)
+					for section in sections:
+						section.createComponent(self.currentContainer)
+				
+				self.setDefaultValues()
+				overrides = self.pendingOverrides.pop(selectedSettingName, None)
+				if overrides:
+					self.restoreOverrides(overrides)
+		self.panels[selectedSettingName] = (container, self.currentContainer, self.currentConfig)
+
+		#Hide the previous interface, it's shown once the new one is in place to avoid flickering
+		if previousContainer != None and previousContainer != self.currentContainer:
+			cmds.columnLayout(previousContainer, edit=True, visible=False)
+
+		#Throw away the least recently used panels
+		while len(self.panels) > MAX_CACHED_PANELS:
+			name, panel = self.panels.popitem(last=False)
+			cmds.deleteUI(panel[1])
+
+	"""
+	Deletes all the panels created by this manager.
+	"""
+	def clearPanels(self):
+		for container, panel, config in self.panels.itervalues():
+			if cmds.columnLayout(panel, exists=True):
+				cmds.deleteUI(panel)
+		self.panels.clear()
+		self.currentContainer = None
 	
 	"""
-	Loads the .ini file
+	Loads the .ini file. Parsed files are cached for as long as they don't change on disk.
 	@param configFile: the .ini file to load
-	@returns: a ConfigParser.RawConfigParser containing the .ini data
+	@returns: an IniDocument containing the .ini data
 	"""
 	def loadConfigurationFile(self, configFile):
-		config = ConfigParser.RawConfigParser()
-		config.read(configFile)
-		return config
+		return getConfig(configFile)
 
 	"""
 	Writes a config file into the provided path that contains the settings from the loaded .ini file with 
-	the settings overriden by the user merged in.
+	the settings overriden by the user merged in. Only the keys the user has changed are transferred, and the values
+	come from the key modifiers, so the user interface is never queried.
 	@param outFile: the file to write the config to
 	"""
 	def writeTempConfig(self, outFile):
-		#Before we write the file we must transfer the user specified values to the config.
-		sections = self.getSections(self.currentSetting)
-		for section in sections:
-			keys = section.getKeys()
-			for key in keys:
-				name = key.getKeyName()				
-				section = key.getKeySection()
-				if self.currentConfig.has_option(section, name):
-					value = key.getValue()
-					self.currentConfig.set(section, name,value)
-				else:
-					print "Warning! The key: "+section+"/"+name+" does not exist in the config file! Check the xml description for the settings file: "+self.currentSetting 		
-		self.currentConfig.write(outFile)
+		self.getCurrentMergedConfig().write(outFile)
+
+	"""
+	@return: an IniDocument of the loaded .ini file with the settings overriden by the user merged in
+	"""
+	def getCurrentMergedConfig(self):
+		with tracer.span("Merge config", setting=self.currentSetting):
+			config = copyConfig(self.currentConfig)
+			self.applyOverrides(config, self.getOverrides(), self.currentSetting)
+			return config
+
+	"""
+	Stores the loaded .ini file with the settings overriden by the user merged in, in the local cache.
+	@return: the path of the stored config
+	"""
+	def writeTempSettingsFile(self):
+		return getTempSettingsFile(self.getCurrentMergedConfig().getText())
+
+	"""
+	@param settingName: the setting to get the overrides of, the current setting if None
+	@return: a dictionary of (section, key) -> value with the values the user has changed in the optimization panel
+	"""
+	def getOverrides(self, settingName=None):
+		if settingName == None:
+			settingName = self.currentSetting
+		overrides = {}
+		for key in self.getSettingData(settingName).getDirtyKeys():
+			overrides[(key.getKeySection(), key.getKeyName())] = key.getValue()
+		return overrides
+
+	"""
+	Sets the value of an exposed key in the current setting, as if the user had changed it in the panel.
+	@param section: the section of the key in the config file
+	@param name: the name of the key in the config file
+	@param value: the new value as a string
+	@return: true if the key is exposed in the current setting
+	"""
+	def setOverride(self, section, name, value):
+		keys = self.getSettingData(self.currentSetting).getKeyModifiers(section, name)
+		for key in keys:
+			key.setValue(value)
+		return len(keys) > 0
+
+	"""
+	Puts back the values the user had changed in the current setting before it was reloaded. Values of keys that are no
+	longer exposed are dropped.
+	@param overrides: a dictionary of (section, key) -> value
+	"""
+	def restoreOverrides(self, overrides):
+		dropped = []
+		for (section, name), value in sorted(overrides.iteritems()):
+			if not self.setOverride(section, name, value):
+				dropped.append(section+"/"+name)
+		if dropped:
+			print "Warning! The setting "+self.currentSetting+" no longer exposes these keys, your changes to them are dropped: "+", ".join(dropped)
+
+	"""
+	Merges a set of overrides into a config.
+	@param config: the config to modify
+	@param overrides: a dictionary of (section, key) -> value to merge into the config
+	@param settingName: the name of the setting the config belongs to, used for warnings
+	"""
+	def applyOverrides(self, config, overrides, settingName):
+		for (section, name), value in overrides.iteritems():
+			if config.has_option(section, name):
+				config.set(section, name, value)
+			else:
+				print "Warning! The key: "+section+"/"+name+" does not exist in the config file! Check the overrides for the settings file: "+settingName
+
+	"""
+	Writes the config of a setting with a set of overrides merged in. Does not touch the user interface, which
+	makes it safe to call from a worker thread or outside of Maya.
+	@param settingName: the name of the setting to write the config for
+	@param overrides: a dictionary of (section, key) -> value to merge into the config
+	@param outFile: the file to write the config to
+	"""
+	def writeConfig(self, settingName, overrides, outFile):
+		self.getMergedConfig(settingName, overrides).write(outFile)
+
+	"""
+	@param settingName: the name of the setting to load the config for
+	@param overrides: a dictionary of (section, key) -> value to merge into the config
+	@return: an IniDocument of the config of the setting with the overrides merged in
+	"""
+	def getMergedConfig(self, settingName, overrides):
+		with tracer.span("Merge config", setting=settingName):
+			config = self.loadConfigurationFile(self.getSettingsFile(settingName))
+			self.applyOverrides(config, overrides, settingName)
+			return config
+
+	"""
+	Stores the config of a setting with a set of overrides merged in, in the local cache. Like writeConfig this is safe
+	to call outside of the main thread.
+	@param settingName: the name of the setting to write the config for
+	@param overrides: a dictionary of (section, key) -> value to merge into the config
+	@return: the path of the stored config
+	"""
+	def writeSettingsFile(self, settingName, overrides):
+		return getTempSettingsFile(self.getMergedConfig(settingName, overrides).getText())
 		
 	"""
 	Loops through all the keys in the current setting and sets the default values from the loaded config.
 	"""
 	def setDefaultValues(self):
-		sections = self.getSections(self.currentSetting)
-		for section in sections:
-			keys = section.getKeys()
-			for key in keys:
+		with tracer.span("Set default values"):
+			for key in self.getSettingData(self.currentSetting).getKeys():
 				name = key.getKeyName()				
 				section = key.getKeySection()
 				if self.currentConfig.has_option(section, name):
 					value = self.currentConfig.get(section, name)
-					key.setValue(value)
+					key.setDefaultValue(value)
 				else:
 					print "Warning! The key: "+section+"/"+name+" does not exist in the config file! Check the xml description for the settings file: "+self.currentSetting 
\ No newline at end of file
@@ -0,0 +1,212 @@
+import csv, json, os, random, itertools
+from BatchQueueModule import BatchQueue, BatchJob, JOB_DONE
+from IniModule import parseKeyPath, getKeyPath
+
+SWEEP_GRID = "grid"
+SWEEP_RANDOM = "random"
+SWEEP_LIST = "list"
+# The number of values picked from an IntRange or FloatRange key when a grid spec doesn't say
+DEFAULT_GRID_STEPS = 3
+DEFAULT_RANDOM_SAMPLES = 10
+# The statistics reported by the worker for every variant, in the order they appear in the table
+STAT_COLUMNS = ["triangles", "vertices", "wallTime", "optimizeTime", "peakMemory"]
+
+"""
+Loads a sweep spec from a JSON file. A spec is a dictionary with a mode and the keys to sweep, for example:
+{"mode": "grid", "keys": {"Root/LODCollectionSection/LOD0Section/ReductionRatio": 5}}
+{"mode": "grid", "keys": ["Root/LODCollectionSection/LOD0Section/ReductionRatio"]}
+{"mode": "random", "samples": 20, "seed": 1, "keys": ["Root/LODCollectionSection/LOD0Section/ReductionRatio"]}
+{"mode": "list", "variants": [{"Root/LODCollectionSection/LOD0Section/ReductionRatio": "50"}]}
+@param path: the JSON file
+@return: the spec
+"""
+def loadSweepSpec(path):
+	with open(path, "r") as inFile:
+		return json.load(inFile)
+
+"""
+Runs a setting with many variations of its exposed keys through the batch queue and collects the size of the LODs and
+the time and memory every variation took. The legal values of the keys are taken from the XML: the min and max of
+IntRange and FloatRange keys and the choices of Droplist keys. The configs are merged without touching the user
+interface, so a sweep can run while the user keeps working, or outside of the interactive session.
+"""
+class ParameterSweep:
+	"""
+	@param settingsManager: the OptimizationSettingsManager that holds the setting
+	@param settingName: the name of the setting to sweep
+	"""
+	def __init__(self, settingsManager, settingName):
+		self.settingsManager = settingsManager
+		self.settingName = settingName
+		self.settingData = settingsManager.getSettingData(settingName)
+		self.queue = None
+		# A list of (variant, job) tuples of the last run
+		self.runs = []
+
+	"""
+	@param keyPath: the key written as section/name
+	@return: the key modifier exposing the key
+	"""
+	def getKeyModifier(self, keyPath):
+		section, name = parseKeyPath(keyPath)
+		keys = self.settingData.getKeyModifiers(section, name)
+		if not keys:
+			raise KeyError("The key "+keyPath+" is not exposed in the setting "+self.settingName)
+		return keys[0]
+
+	"""
+	Creates a variant for every combination of the values of the keys.
+	@param keys: a dictionary of key path -> the number of values to pick from its range, or a list of values. None
+	picks DEFAULT_GRID_STEPS values, and so does a list of key paths instead of a dictionary.
+	@return: a list of variants, each a dictionary of (section, name) -> value
+	"""
+	def getGridVariants(self, keys):
+		if isinstance(keys, list):
+			keys = dict.fromkeys(keys)
+		elif not isinstance(keys, dict):
+			raise ValueError("The keys of a grid sweep must be a dictionary of key path -> steps or a list of key paths")
+		axes = []
+		for keyPath in sorted(keys):
+			steps = keys[keyPath]
+			modifier = self.getKeyModifier(keyPath)
+			if isinstance(steps, list):
+				values = [modifier.normalizeValue(str(value)) for value in steps]
+			else:
+				values = modifier.getSweepValues(steps or DEFAULT_GRID_STEPS)
+			if not values:
+				raise ValueError("The key "+keyPath+" has no values to sweep")
+			axes.append([(parseKeyPath(keyPath), value) for value in values])
+		return [dict(combination) for combination in itertools.product(*axes)]
+
+	"""
+	Draws random variants from the legal values of the keys.
+	@param keys: a list of key paths
+	@param samples: the number of variants
+	@param seed: the seed of the random generator, so a sweep can be repeated
+	@return: a list of variants, each a dictionary of (section, name) -> value
+	"""
+	def getRandomVariants(self, keys, samples, seed=None):
+		generator = random.Random(seed)
+		modifiers = [(parseKeyPath(keyPath), self.getKeyModifier(keyPath)) for keyPath in sorted(keys)]
+		return [dict([(key, modifier.getRandomValue(generator)) for key, modifier in modifiers]) for _ in range(samples)]
+
+	"""
+	@param variants: a list of dictionaries of key path -> value
+	@return: a list of variants, each a dictionary of (section, name) -> value
+	"""
+	def getListVariants(self, variants):
+		result = []
+		for variant in variants:
+			overrides = {}
+			for keyPath, value in variant.iteritems():
+				overrides[parseKeyPath(keyPath)] = self.getKeyModifier(keyPath).normalizeValue(str(value))
+			result.append(overrides)
+		return result
+
+	"""
+	@param spec: a sweep spec, see loadSweepSpec
+	@return: a list of variants, each a dictionary of (section, name) -> value
+	"""
+	def getVariants(self, spec):
+		mode = spec.get("mode", SWEEP_GRID)
+		if mode == SWEEP_GRID:
+			return self.getGridVariants(spec.get("keys", {}))
+		if mode == SWEEP_RANDOM:
+			return self.getRandomVariants(spec.get("keys", []), spec.get("samples", DEFAULT_RANDOM_SAMPLES), spec.get("seed"))
+		if mode == SWEEP_LIST:
+			return self.getListVariants(spec.get("variants", []))
+		raise ValueError("Unknown sweep mode: "+str(mode))
+
+	"""
+	Starts optimizing a scene with every variant in the background. The configs of the variants are merged and written
+	before the queue starts, on the calling thread.
+	@param variants: a list of variants, each a dictionary of (section, name) -> value
+	@param scene: the scene to optimize
+	@param outputDir: the folder the LODs and statistics of every variant are written to
+	@param objects: the objects in the scene to optimize, all meshes if empty
+	@param colorSet: the color set to use as user weights, None if user weights aren't used
+	@param weightMultiplier: the user weights multiplier
+	@param workers: the maximum number of variants to optimize at the same time
+	@param command: the worker command, see BatchQueue
+	@param onJobChanged: called from the dispatcher thread with the job every time a variant changes status
+	@param onFinished: called from the dispatcher thread with the queue when all variants have been processed
+	@return: the BatchQueue processing the variants
+	"""
+	def start(self, variants, scene, outputDir, objects=None, colorSet=None, weightMultiplier=1, workers=None, command=None, onJobChanged=None, onFinished=None):
+		if not os.path.isdir(outputDir):
+			os.makedirs(outputDir)
+		outputDir = outputDir.replace("\\", "/")
+		self.queue = BatchQueue(self.settingsManager, workers, command)
+		self.runs = []
+		for i, variant in enumerate(variants):
+			name = "variant%03d" % i
+			job = BatchJob(name, scene, self.settingName, variant, objects, colorSet, weightMultiplier,
+				output=outputDir+"/"+name+".mb", statsFile=outputDir+"/"+name+".json",
+				settingsFile=self.settingsManager.writeSettingsFile(self.settingName, variant))
+			self.runs.append((variant, self.queue.addJob(job)))
+		self.queue.start(onJobChanged=onJobChanged, onFinished=onFinished)
+		return self.queue
+
+	"""
+	Blocks until all variants have been processed.
+	"""
+	def wait(self):
+		if self.queue != None:
+			self.queue.wait()
+
+	"""
+	Optimizes a scene with every variant and waits for the result.
+	@return: the result table, see getResults
+	"""
+	def run(self, variants, scene, outputDir, objects=None, colorSet=None, weightMultiplier=1, workers=None, command=None):
+		self.start(variants, scene, outputDir, objects, colorSet, weightMultiplier, workers, command)
+		self.wait()
+		return self.getResults()
+
+	"""
+	@return: the key paths that are varied in the last run, sorted
+	"""
+	def getKeyColumns(self):
+		columns = set()
+		for variant, job in self.runs:
+			columns.update(variant)
+		return [getKeyPath(key) for key in sorted(columns)]
+
+	"""
+	@return: a list of rows, one per variant of the last run. Every row is a dictionary with the name, status and
+	output of the variant, the value of every swept key and the statistics reported by the worker.
+	"""
+	def getResults(self):
+		results = []
+		for variant, job in self.runs:
+			row = {"variant": job.name, "status": job.status, "output": job.output}
+			for key, value in variant.iteritems():
+				row[getKeyPath(key)] = value
+			stats = job.stats or {}
+			for column in STAT_COLUMNS:
+				row[column] = stats.get(column)
+			if row["wallTime"] == None and job.status == JOB_DONE:
+				row["wallTime"] = job.getElapsedTime()
+			results.append(row)
+		return results
+
+	"""
+	Writes the results of the last run as a CSV table.
+	@param path: the file to write
+	"""
+	def writeCSV(self, path):
+		columns = ["variant", "status"] + self.getKeyColumns() + STAT_COLUMNS + ["output"]
+		with open(path, "wb") as outFile:
+			writer = csv.DictWriter(outFile, columns)
+			writer.writeheader()
+			for row in self.getResults():
+				writer.writerow(row)
+
+	"""
+	Writes the results of the last run as JSON.
+	@param path: the file to write
+	"""
+	def writeJSON(self, path):
+		data = {"setting": self.settingName, "keys": self.getKeyColumns(), "results": self.getResults()}
+		with open(path, "w") as outFile:
+			json.dump(data, outFile, indent=1)
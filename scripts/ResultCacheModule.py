@@ -0,0 +1,159 @@
+import maya.cmds as cmds
+import array, hashlib, os
+from SettingsCacheModule import getCacheDir, evictFiles
+from MeshDataModule import getMeshFn1, getPointBytes, getTopologyBytes, getVertexColorBytes
+from InstrumentationModule import tracer
+
+RESULTS_DIR = "results"
+# Bump this whenever the way the keys are computed changes
+RESULT_CACHE_VERSION = 2
+# The stored LODs are evicted, least recently used first, when they take up more space than this
+MAX_RESULT_CACHE_SIZE = 2*1024*1024*1024
+RESULT_EXTENSION = ".mb"
+# The color hashed for vertices that haven't been painted
+UNSET_COLOR = (-1.0, -1.0, -1.0, -1.0)
+
+"""
+@param nodes: a list of nodes
+@return: the full paths of all non intermediate mesh shapes in or below the nodes, sorted
+"""
+def getMeshShapes(nodes):
+	shapes = cmds.ls(nodes, dag=True, type="mesh", noIntermediate=True, long=True) or []
+	return sorted(set(shapes))
+
+"""
+@return: the full paths of all transforms in the scene
+"""
+def getTransforms():
+	return set(cmds.ls(type="transform", long=True) or [])
+
+"""
+@param before: the transforms that existed before an operation, as returned by getTransforms
+@return: the top most transforms that have been created since
+"""
+def getNewTransforms(before):
+	created = getTransforms() - before
+	return sorted([node for node in created if node.rsplit("|", 1)[0] not in created])
+
+"""
+Counts the triangles and vertices of a number of meshes.
+@param nodes: the nodes to count, all meshes in or below them are included
+@return: a (triangles, vertices) tuple
+"""
+def getPolyCount(nodes):
+	triangles = 0
+	vertices = 0
+	for shape in getMeshShapes(nodes):
+		triangles += cmds.polyEvaluate(shape, triangle=True)
+		vertices += cmds.polyEvaluate(shape, vertex=True)
+	return (triangles, vertices)
+
+"""
+Hashes the geometry of a number of meshes: the names, world transforms, point positions and topology. The points,
+faces and colors are copied out of the mesh in one block each and hashed as raw bytes, see MeshDataModule.
+@param nodes: the nodes to hash, all meshes in or below them are included
+@param colorSet: if given the vertex colors of this color set are hashed as well
+@return: the hex digest of the hash
+"""
+def getMeshHash(nodes, colorSet=None):
+	import maya.api.OpenMaya as om
+	digest = hashlib.sha1()
+	for shape in getMeshShapes(nodes):
+		selection = om.MSelectionList()
+		selection.add(shape)
+		dagPath = selection.getDagPath(0)
+		meshData = getMeshFn1(shape)
+		digest.update(shape)
+		digest.update(array.array("d", list(dagPath.inclusiveMatrix())).tostring())
+		digest.update(getPointBytes(meshData))
+		for data in getTopologyBytes(meshData):
+			digest.update(data)
+		if colorSet != None and colorSet in (om.MFnMesh(dagPath).getColorSetNames() or []):
+			digest.update(getVertexColorBytes(meshData, colorSet, UNSET_COLOR))
+	return digest.hexdigest()
+
+"""
+@param nodes: the nodes that are optimized
+@param settingsData: the content of the merged settings file
+@param colorSet: the color set used as user weights, None if user weights aren't used
+@param weightMultiplier: the user weights multiplier
+@return: the key of the LODs produced from the nodes with the settings
+"""
+def getResultKey(nodes, settingsData, colorSet=None, weightMultiplier=1):
+	digest = hashlib.sha1()
+	digest.update(str(RESULT_CACHE_VERSION))
+	digest.update(getMeshHash(nodes, colorSet))
+	digest.update(hashlib.sha1(settingsData).hexdigest())
+	if colorSet != None:
+		digest.update(colorSet+"|"+str(weightMultiplier))
+	return digest.hexdigest()
+
+"""
+A cache of the LODs produced by Simplygon. The LODs are exported to files in the local cache, named after a hash of the
+meshes, the settings and the user weights that produced them, so an unchanged mesh with unchanged settings can be
+imported instead of being optimized again.
+"""
+class ResultCache:
+	"""
+	@param maxSize: the maximum number of bytes of stored LODs to keep
+	"""
+	def __init__(self, maxSize=MAX_RESULT_CACHE_SIZE):
+		self.maxSize = maxSize
+		self.folder = getCacheDir(RESULTS_DIR)
+		self.hits = 0
+		self.misses = 0
+
+	"""
+	@param key: the key of a result
+	@return: the path of the file the result is stored in
+	"""
+	def getPath(self, key):
+		return self.folder+"/"+key+RESULT_EXTENSION
+
+	"""
+	Imports the LODs stored for a key.
+	@param key: the key of the result
+	@return: the full paths of the imported top level nodes, sorted like getNewTransforms returns them, or None if there
+	is no result stored for the key
+	"""
+	def load(self, key):
+		path = self.getPath(key)
+		try:
+			# Touch the file to mark it as recently used
+			os.utime(path, None)
+		except OSError:
+			self.misses += 1
+			tracer.count("result cache misses")
+			return None
+		self.hits += 1
+		tracer.count("result cache hits")
+		with tracer.span("Import cached result"):
+			newNodes = cmds.file(path, i=True, returnNewNodes=True) or []
+			return sorted(cmds.ls(newNodes, assemblies=True, long=True) or [])
+
+	"""
+	Exports LODs to the cache.
+	@param key: the key of the result
+	@param nodes: the LOD nodes to store
+	"""
+	def store(self, key, nodes):
+		if not nodes:
+			return
+		path = self.getPath(key)
+		selection = cmds.ls(sl=True)
+		try:
+			cmds.select(nodes, replace=True)
+			with tracer.span("Store result"):
+				cmds.file(path, force=True, exportSelected=True, type="mayaBinary")
+		finally:
+			if selection:
+				cmds.select(selection, replace=True)
+			else:
+				cmds.select(clear=True)
+		evictFiles(self.folder, RESULT_EXTENSION, self.maxSize)
+
+	"""
+	@return: a dictionary with the number of hits and misses
+	"""
+	def getStats(self):
+		return {"hits": self.hits, "misses": self.misses}
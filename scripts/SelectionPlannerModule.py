@@ -0,0 +1,221 @@
+import maya.cmds as cmds
+import heapq
+from ResultCacheModule import getMeshShapes, getPolyCount
+
+SPLIT_OBJECTS = "Object"
+SPLIT_HIERARCHIES = "Hierarchy"
+# A string attribute that can be added to a node to optimize it, and everything below it, with another setting
+SETTING_ATTRIBUTE = "simplygonSetting"
+
+"""
+@param path: the full path of a node
+@return: the full path of the parent of the node, or an empty string if it's at the top of the hierarchy
+"""
+def getParentPath(path):
+	return path.rsplit("|", 1)[0]
+
+"""
+@param path: the full path of a node, possibly with namespaces
+@return: the name of the node without the path and the namespaces
+"""
+def getShortName(path):
+	return path.rsplit("|", 1)[-1].rsplit(":", 1)[-1]
+
+"""
+@param path: the full path of a node
+@return: the full path with the namespaces removed from every node in it
+"""
+def removeNamespaces(path):
+	return "|".join([name.rsplit(":", 1)[-1] for name in path.split("|")])
+
+"""
+@param paths: the full paths of a number of nodes
+@return: the nodes that aren't below any of the other nodes, in the same order
+"""
+def getTopNodes(paths):
+	selected = set(paths)
+	topNodes = []
+	for path in paths:
+		parent = getParentPath(path)
+		while parent and parent not in selected:
+			parent = getParentPath(parent)
+		if not parent:
+			topNodes.append(path)
+	return topNodes
+
+"""
+A part of the selection that is optimized as a whole: a single object in per object mode, or a selected node with
+everything below it in per hierarchy mode.
+"""
+class WorkUnit:
+	"""
+	@param root: the full path of the top node of the unit
+	@param settingName: the setting to optimize the unit with
+	@param colorSet: the color set to use as user weights, None if the unit doesn't use user weights
+	@param triangles: the number of triangles in the unit
+	"""
+	def __init__(self, root, settingName, colorSet, triangles):
+		self.root = root
+		self.settingName = settingName
+		self.colorSet = colorSet
+		self.triangles = triangles
+
+"""
+A number of work units that share a setting and a color set and are optimized by the same worker.
+"""
+class Chunk:
+	def __init__(self, settingName, colorSet):
+		self.settingName = settingName
+		self.colorSet = colorSet
+		self.units = []
+		self.triangles = 0
+
+	"""
+	@param unit: the WorkUnit to add
+	"""
+	def addUnit(self, unit):
+		self.units.append(unit)
+		self.triangles += unit.triangles
+
+	"""
+	@return: the full paths of the top nodes of all units
+	"""
+	def getRoots(self):
+		return [unit.root for unit in self.units]
+
+"""
+@param path: the full path of a node
+@param settingNames: the names of the available settings
+@return: the setting of the nearest node in the path that has the setting attribute, None if none has
+"""
+def getNodeSetting(path, settingNames):
+	while path:
+		if cmds.attributeQuery(SETTING_ATTRIBUTE, node=path, exists=True):
+			settingName = cmds.getAttr(path+"."+SETTING_ATTRIBUTE)
+			if settingName in settingNames:
+				return settingName
+			print "Warning! "+path+" asks for the setting "+str(settingName)+", which doesn't exist"
+		path = getParentPath(path)
+	return None
+
+"""
+@param shapes: the mesh shapes of a unit
+@param colorSet: the color set used as user weights, or None
+@return: the color set if any of the shapes has it, otherwise None
+"""
+def getUnitColorSet(shapes, colorSet):
+	if colorSet == None:
+		return None
+	for shape in shapes:
+		if colorSet in (cmds.polyColorSet(shape, query=True, allColorSets=True) or []):
+			return colorSet
+	return None
+
+"""
+Splits a selection into work units.
+@param nodes: the selected nodes
+@param split: SPLIT_OBJECTS for one unit per mesh transform, SPLIT_HIERARCHIES for one unit per selected node
+@param settingName: the setting to use for nodes that don't ask for another one through the setting attribute
+@param settingNames: the names of all available settings
+@param colorSet: the color set used as user weights, or None
+@return: a list of WorkUnits, units without meshes are left out
+"""
+def getWorkUnits(nodes, split, settingName, settingNames, colorSet=None):
+	nodes = cmds.ls(nodes, long=True) or []
+	if split == SPLIT_OBJECTS:
+		roots = []
+		found = set()
+		for shape in getMeshShapes(nodes):
+			parent = getParentPath(shape)
+			if parent not in found:
+				found.add(parent)
+				roots.append(parent)
+		rootShapes = dict((root, cmds.listRelatives(root, shapes=True, type="mesh", noIntermediate=True, fullPath=True) or []) for root in roots)
+	else:
+		# Nodes below other selected nodes are part of those units
+		roots = getTopNodes(nodes)
+		rootShapes = dict((root, getMeshShapes([root])) for root in roots)
+	units = []
+	for root in roots:
+		shapes = rootShapes[root]
+		if not shapes:
+			continue
+		unitSetting = getNodeSetting(root, settingNames) or settingName
+		units.append(WorkUnit(root, unitSetting, getUnitColorSet(shapes, colorSet), getPolyCount(shapes)[0]))
+	return units
+
+"""
+Groups work units that share a setting and a color set, and divides every group into chunks that are as equal in
+triangles as possible. A group gets a share of the workers that matches its share of the triangles, and the units are
+handed out largest first to the chunk with the fewest triangles so far (longest processing time first).
+@param units: the WorkUnits to plan
+@param workers: the number of workers that will process the chunks
+@return: a list of Chunks, largest first
+"""
+def planChunks(units, workers):
+	groups = {}
+	for unit in units:
+		groups.setdefault((unit.settingName, unit.colorSet), []).append(unit)
+	totalTriangles = max(sum(unit.triangles for unit in units), 1)
+	chunks = []
+	for (settingName, colorSet), groupUnits in sorted(groups.items()):
+		groupTriangles = sum(unit.triangles for unit in groupUnits)
+		count = max(1, min(len(groupUnits), int(round(workers * float(groupTriangles) / totalTriangles))))
+		heap = [(0, index, Chunk(settingName, colorSet)) for index in range(count)]
+		for unit in sorted(groupUnits, key=lambda unit: -unit.triangles):
+			triangles, index, chunk = heapq.heappop(heap)
+			chunk.addUnit(unit)
+			heapq.heappush(heap, (chunk.triangles, index, chunk))
+		chunks.extend([chunk for _, _, chunk in heap])
+	return sorted(chunks, key=lambda chunk: -chunk.triangles)
+
+"""
+Finds the units a LOD can have been made from. The LOD is matched on the path it had in the scene it was made in: it
+belongs to the unit it was created in, otherwise to the unit with the longest name that is the start of its own name,
+preferring units that were its siblings. Namespaces are ignored, the import adds one to every node.
+@param lodPath: the full path of the LOD in the scene it was made in
+@param roots: the full paths of the top nodes of the units that were optimized
+@return: the roots of the units the LOD matches best, more than one if it's ambiguous
+"""
+def matchLodRoots(lodPath, roots):
+	if len(roots) == 1:
+		return list(roots)
+	lodPath = removeNamespaces(lodPath)
+	paths = dict((root, removeNamespaces(root)) for root in roots)
+	inside = [root for root in roots if lodPath.startswith(paths[root]+"|")]
+	if inside:
+		return [max(inside, key=lambda root: len(paths[root]))]
+	name = getShortName(lodPath)
+	matches = [root for root in roots if name.startswith(getShortName(root))]
+	siblings = [root for root in matches if getParentPath(paths[root]) == getParentPath(lodPath)]
+	if siblings:
+		matches = siblings
+	if not matches:
+		return []
+	longest = max(len(getShortName(root)) for root in matches)
+	return [root for root in matches if len(getShortName(root)) == longest]
+
+"""
+Moves imported LODs next to the nodes they were made from, see matchLodRoots. LODs that can't be matched to a single
+unit are left where they were imported.
+@param lods: the full paths of the imported top level LOD nodes
+@param roots: the full paths of the top nodes of the units that were optimized
+@return: a dictionary of unit root -> the full paths of its LODs
+"""
+def reattachLods(lods, roots):
+	attached = {}
+	for lod in lods:
+		matches = matchLodRoots(lod, roots)
+		if not matches:
+			print "Warning! Couldn't tell which object "+lod+" was made from, it's left where it was imported"
+			continue
+		if len(matches) > 1:
+			print "Warning! "+lod+" could have been made from any of "+", ".join(matches)+", it's left where it was imported"
+			continue
+		root = matches[0]
+		parent = getParentPath(root)
+		if parent and cmds.objExists(parent):
+			lod = (cmds.parent(lod, parent) or [lod])[0]
+			lod = (cmds.ls(lod, long=True) or [lod])[0]
+		attached.setdefault(root, []).append(lod)
+	return attached
@@ -0,0 +1,213 @@
+import os, time, threading
+import xml.etree.ElementTree as etree
+from collections import OrderedDict
+from IniModule import IniDocument, readIni
+from InstrumentationModule import tracer
+
+MAX_XML_ENTRIES = 8
+MAX_CONFIG_ENTRIES = 64
+# Environment variable that can be used to move the local cache folder
+CACHE_DIR_VARIABLE = "SIMPLYGON_BATCH_CACHE"
+
+"""
+@param subDir: the name of the folder in the cache
+@return: a folder in the local (per user) cache, created if it doesn't exist
+"""
+def getCacheDir(subDir):
+	base = os.environ.get(CACHE_DIR_VARIABLE)
+	if base == None:
+		base = os.path.join(os.path.expanduser("~"), ".simplygonBatchProcessor")
+	path = os.path.join(base, subDir).replace("\\", "/")
+	if not os.path.isdir(path):
+		try:
+			os.makedirs(path)
+		except OSError:
+			# Someone else might have created it in the meantime
+			if not os.path.isdir(path):
+				raise
+	return path
+
+"""
+Writes a file by writing to a temporary file next to it and renaming it, so that readers never see a half written file.
+@param path: the file to write
+@param data: the content of the file
+"""
+def writeFileAtomic(path, data):
+	tempPath = path+".%d.tmp" % os.getpid()
+	with open(tempPath, "wb") as outFile:
+		outFile.write(data)
+	tracer.count("bytes written", len(data))
+	try:
+		os.rename(tempPath, path)
+	except OSError:
+		# Windows can't rename onto an existing file
+		if os.path.isfile(path):
+			os.remove(path)
+		os.rename(tempPath, path)
+
+"""
+@param path: the file to stat
+@return: a (mtime, size) tuple that identifies the version of the file on disk, or None if the file doesn't exist
+"""
+def getFileStamp(path):
+	try:
+		stat = os.stat(path)
+	except OSError:
+		return None
+	return (stat.st_mtime, stat.st_size)
+
+"""
+Removes the least recently used files in a cache folder. Files are considered used when they were last modified, so
+readers should touch the files they use.
+@param folder: the cache folder
+@param extension: only files with this extension are considered
+@param maxSize: the maximum number of bytes to keep
+@param maxAge: the maximum time in seconds since a file was used, or None to only evict by size
+@param minAge: files that have been used more recently than this are never removed
+"""
+def evictFiles(folder, extension, maxSize, maxAge=None, minAge=0):
+	now = time.time()
+	files = []
+	totalSize = 0
+	for name in os.listdir(folder):
+		if not name.endswith(extension):
+			continue
+		path = folder+"/"+name
+		try:
+			stat = os.stat(path)
+		except OSError:
+			continue
+		files.append((stat.st_mtime, stat.st_size, path))
+		totalSize += stat.st_size
+	files.sort()
+	for mtime, size, path in files:
+		age = now - mtime
+		if age < minAge:
+			break
+		if (maxAge == None or age <= maxAge) and totalSize <= maxSize:
+			break
+		try:
+			os.remove(path)
+			totalSize -= size
+		except OSError:
+			pass
+
+"""
+A least recently used cache of files parsed from disk. Entries are keyed on the path and validated against the
+modification time and size of the file, so a file is only read again if it has actually changed. The cache is shared
+by the main thread and the threads of the batch queues, which merge the configs of their jobs, so it's locked.
+"""
+class FileCache:
+	"""
+	@param loader: the function that parses a file, called with the path
+	@param maxEntries: the maximum number of parsed files to keep
+	@param name: what the cached files are, used to name the counters and spans in traces
+	"""
+	def __init__(self, loader, maxEntries, name="file"):
+		self.loader = loader
+		self.maxEntries = maxEntries
+		self.name = name
+		self.entries = OrderedDict()
+		self.hits = 0
+		self.misses = 0
+		self.lock = threading.RLock()
+
+	"""
+	@param path: the file to fetch
+	@return: the parsed file, straight from the cache if the file hasn't changed since it was parsed
+	"""
+	def get(self, path):
+		key = os.path.normcase(os.path.abspath(path))
+		stamp = getFileStamp(path)
+		with self.lock:
+			entry = self.entries.pop(key, None)
+			if entry != None and stamp != None and entry[0] == stamp:
+				self.hits += 1
+				tracer.count(self.name+" cache hits")
+				self.entries[key] = entry
+				return entry[1]
+			self.misses += 1
+			tracer.count(self.name+" cache misses")
+			with tracer.span("Parse "+self.name, file=os.path.basename(path)):
+				value = self.loader(path)
+			# Files that don't exist are never cached, they should be picked up as soon as they show up
+			if stamp != None:
+				self.put(path, stamp, value)
+			return value
+
+	"""
+	Adds an already parsed file to the cache.
+	@param path: the file that was parsed
+	@param stamp: the (mtime, size) of the file when it was parsed
+	@param value: the parsed file
+	"""
+	def put(self, path, stamp, value):
+		key = os.path.normcase(os.path.abspath(path))
+		with self.lock:
+			self.entries.pop(key, None)
+			self.entries[key] = (stamp, value)
+			while len(self.entries) > self.maxEntries:
+				self.entries.popitem(last=False)
+
+	"""
+	Removes a file from the cache, or all files if no path is given.
+	@param path: the file to remove
+	"""
+	def invalidate(self, path=None):
+		with self.lock:
+			if path == None:
+				self.entries.clear()
+			else:
+				self.entries.pop(os.path.normcase(os.path.abspath(path)), None)
+
+	"""
+	@return: a dictionary with the number of hits, misses and cached entries
+	"""
+	def getStats(self):
+		return {"hits": self.hits, "misses": self.misses, "entries": len(self.entries)}
+
+"""
+Parses an .ini file. Missing files result in an empty config, the same way RawConfigParser.read handles them.
+@param path: the .ini file to load
+@return: an IniDocument containing the .ini data
+"""
+def parseConfig(path):
+	return readIni(path)
+
+"""
+@param config: the config to copy
+@return: a copy of the config that can be modified without affecting the cached config
+"""
+def copyConfig(config):
+	return config.copy()
+
+# The process wide caches. They outlive the settings managers so that browsing and reopening the window is cheap.
+# They are only created the first time the module is loaded so that they survive the reloads done by the shelf command.
+try:
+	xmlCache
+except NameError:
+	xmlCache = FileCache(etree.parse, MAX_XML_ENTRIES, "xml")
+	configCache = FileCache(parseConfig, MAX_CONFIG_ENTRIES, "ini")
+else:
+	# Configs parsed by an older version of the module may be of another type
+	configCache.invalidate()
+
+"""
+@param xmlFile: the settings XML to load
+@return: the parsed ElementTree of the XML. It's shared between all callers and must not be modified.
+"""
+def getXML(xmlFile):
+	return xmlCache.get(xmlFile)
+
+"""
+@param configFile: the .ini file to load
+@return: an IniDocument containing the .ini data, safe to modify
+"""
+def getConfig(configFile):
+	return copyConfig(configCache.get(configFile))
+
+"""
+@return: the hit/miss counters of the caches
+"""
+def getCacheStats():
+	return {"xml": xmlCache.getStats(), "config": configCache.getStats()}
@@ -0,0 +1,300 @@
+import hashlib, marshal, os
+from SettingsCacheModule import getXML, getCacheDir, getFileStamp, writeFileAtomic, configCache
+from IniModule import IniDocument, IniIndex
+from KeyModifierModule import KeyTable, internValue
+from SettingsSearchModule import SettingsSearchIndex, buildSearchIndex
+from InstrumentationModule import tracer
+
+# Bump this whenever the layout of the catalog changes, old catalogs are then rebuilt
+CATALOG_VERSION = 3
+CATALOG_DIR = "catalogs"
+# Bump this whenever the layout of the search index changes
+SEARCH_INDEX_VERSION = 1
+
+"""
+A precompiled form of a settings XML and the default values of the .ini files it references. The catalog is stored
+in the local cache as a marshalled blob that is loaded with a single read. It's validated against a hash of the XML and
+the modification time and size of every .ini file, and is rebuilt as soon as any of them changes.
+The keys of all settings are kept in one KeyTable and the sections of every setting as a compact layout of key ids,
+so the key modifiers only have to be created when a setting is selected.
+The search index of the settings is stored next to the catalog and only loaded, or built, the first time it's needed.
+A catalog that has been loaded can be checked for changes on disk with a stat of every file, see isCurrent.
+"""
+class SettingsCatalog:
+	def __init__(self, data):
+		self.xmlHash = data["xmlHash"]
+		# A list of (name, file, sectionLayouts) tuples in the order they are declared in the XML, see getSectionLayout
+		self.settings = data["settings"]
+		self.keyTable = KeyTable(data["keys"])
+		# A dictionary of file -> (mtime, size), None if the file is missing
+		self.iniStamps = data["iniStamps"]
+		# A dictionary of file -> (content, index data) of every .ini file, see IniModule.IniIndex.getData
+		self.defaults = data["defaults"]
+		# The file the catalog is stored in, the search index is stored next to it
+		self.path = None
+		self.searchIndex = None
+		# The settings XML and its (mtime, size) when the catalog was loaded
+		self.xmlFile = None
+		self.xmlStamp = None
+
+	"""
+	@return: the catalog as plain data that can be marshalled
+	"""
+	def getData(self):
+		return {"version": CATALOG_VERSION,
+			"xmlHash": self.xmlHash,
+			"settings": self.settings,
+			"keys": self.keyTable.getData(),
+			"iniStamps": self.iniStamps,
+			"defaults": self.defaults}
+
+	"""
+	@param xmlHash: the hash of the current content of the XML
+	@return: true if the catalog was built from the current XML and .ini files
+	"""
+	def isValid(self, xmlHash):
+		if xmlHash != self.xmlHash:
+			return False
+		for file, stamp in self.iniStamps.iteritems():
+			if getFileStamp(file) != stamp:
+				return False
+		return True
+
+	"""
+	@return: true if none of the files the catalog was loaded from has been modified since, only the files are stat'ed
+	"""
+	def isCurrent(self):
+		if getFileStamp(self.xmlFile) != self.xmlStamp:
+			return False
+		for file, stamp in self.iniStamps.iteritems():
+			if getFileStamp(file) != stamp:
+				return False
+		return True
+
+	"""
+	@return: a dictionary of file -> (mtime, size) of the XML and every .ini file, None for missing files
+	"""
+	def getFileStamps(self):
+		stamps = dict(self.iniStamps)
+		stamps[self.xmlFile] = self.xmlStamp
+		return stamps
+
+	"""
+	@param file: the .ini file
+	@return: true if the .ini file could be found when the catalog was built
+	"""
+	def settingsFileExists(self, file):
+		return self.iniStamps.get(file) != None
+
+	"""
+	@return: the SettingsSearchIndex of the catalog, the setting ids in it are positions in the settings list
+	"""
+	def getSearchIndex(self):
+		if self.searchIndex == None:
+			self.searchIndex = loadSearchIndex(self)
+		return self.searchIndex
+
+	"""
+	Puts the parsed .ini files into the config cache so that they don't have to be read from disk when selected.
+	"""
+	def primeConfigCache(self):
+		for file, (data, index) in self.defaults.iteritems():
+			stamp = self.iniStamps.get(file)
+			if stamp != None:
+				configCache.put(file, stamp, IniDocument(data, IniIndex.fromData(index)))
+
+"""
+@param xmlFile: the settings XML
+@return: the path of the catalog of the XML in the local cache
+"""
+def getCatalogPath(xmlFile):
+	key = hashlib.sha1(os.path.normcase(os.path.abspath(xmlFile))).hexdigest()
+	return getCacheDir(CATALOG_DIR)+"/"+key+".catalog"
+
+"""
+Converts a section of the settings XML into the compact form that is stored in the catalog. The keys are added to the
+key table and only their ids are kept.
+@param xmlElement: the Section element
+@param table: the KeyTable of the catalog
+@return: a (description, collapsed, children) tuple, where collapsed is None if the XML doesn't say, and children is a
+tuple of key ids and the layouts of the sub sections
+"""
+def getSectionLayout(xmlElement, table):
+	children = []
+	for child in xmlElement:
+		if child.tag == 'Key':
+			keyId = table.addKey(child)
+			if keyId != None:
+				children.append(keyId)
+		elif child.tag == 'Section':
+			children.append(getSectionLayout(child, table))
+	collapsed = xmlElement.get("collapsed")
+	if collapsed != None:
+		collapsed = collapsed.lower() == "true"
+	return (internValue(xmlElement.get("description")), collapsed, tuple(children))
+
+"""
+Parses the XML and all .ini files it references into a new catalog. When a previous catalog of the same XML is given,
+only what has changed since it was built is parsed: the XML if its content is different, and the .ini files that have
+been modified.
+@param xmlFile: the settings XML
+@param xmlHash: the hash of the content of the XML
+@param previous: an older SettingsCatalog of the XML, or None
+@return: the new SettingsCatalog
+"""
+def buildCatalog(xmlFile, xmlHash, previous=None):
+	if previous != None and previous.xmlHash == xmlHash:
+		settings = previous.settings
+		keys = previous.keyTable.getData()
+	else:
+		root = getXML(xmlFile).getroot()
+		basePath = os.path.dirname(xmlFile).replace("\\", "/")
+		settings = []
+		table = KeyTable()
+		for settingData in root.findall('Setting'):
+			file = settingData.get("file")
+			if not os.path.isabs(file):
+				file = basePath+"/"+file
+			sectionLayouts = tuple(getSectionLayout(section, table) for section in settingData.findall('Section'))
+			settings.append((settingData.get("name"), file, sectionLayouts))
+		keys = table.getData()
+	iniStamps = {}
+	defaults = {}
+	for name, file, sectionLayouts in settings:
+		if file in iniStamps:
+			continue
+		iniStamps[file] = getFileStamp(file)
+		if iniStamps[file] == None:
+			continue
+		if previous != None and previous.iniStamps.get(file) == iniStamps[file] and file in previous.defaults:
+			tracer.count("ini files reused")
+			defaults[file] = previous.defaults[file]
+		else:
+			config = configCache.get(file)
+			defaults[file] = (config.data, config.index.getData())
+	return SettingsCatalog({"xmlHash": xmlHash, "settings": settings, "keys": keys, "iniStamps": iniStamps, "defaults": defaults})
+
+"""
+Loads the catalog of a settings XML from the local cache, rebuilding and storing it if it's missing or out of date.
+@param xmlFile: the settings XML
+@param previous: the catalog that was loaded before, if any. The catalog is then rebuilt from it right away, which only
+parses the files that have changed since and is quicker than reading the stored catalog.
+@return: the SettingsCatalog
+"""
+def loadCatalog(xmlFile, previous=None):
+	# The stamp is taken before the XML is read, so a write while it's read is picked up by the next isCurrent
+	xmlStamp = getFileStamp(xmlFile)
+	if previous != None and previous.xmlStamp == xmlStamp:
+		xmlHash = previous.xmlHash
+	else:
+		with open(xmlFile, "rb") as inFile:
+			xmlHash = hashlib.sha1(inFile.read()).hexdigest()
+	catalogPath = getCatalogPath(xmlFile)
+	if previous == None:
+		try:
+			with open(catalogPath, "rb") as inFile:
+				data = marshal.loads(inFile.read())
+			if data.get("version") == CATALOG_VERSION:
+				catalog = SettingsCatalog(data)
+				if catalog.isValid(xmlHash):
+					catalog.path = catalogPath
+					catalog.xmlFile = xmlFile
+					catalog.xmlStamp = xmlStamp
+					catalog.primeConfigCache()
+					tracer.count("catalog cache hits")
+					return catalog
+		except (IOError, OSError, EOFError, ValueError, TypeError, KeyError, AttributeError):
+			pass
+		tracer.count("catalog cache misses")
+	with tracer.span("Build catalog", xml=os.path.basename(xmlFile)):
+		catalog = buildCatalog(xmlFile, xmlHash, previous)
+	catalog.path = catalogPath
+	catalog.xmlFile = xmlFile
+	catalog.xmlStamp = xmlStamp
+	try:
+		writeFileAtomic(catalogPath, marshal.dumps(catalog.getData()))
+	except (IOError, OSError) as e:
+		print "Warning: could not store the settings catalog "+catalogPath+": "+str(e)
+	return catalog
+
+"""
+@param sectionLayout: the layout of a section, see getSectionLayout
+@param signatures: the signatures of all keys in the key table of the layout, see KeyTable.getKeySignature
+@return: the layout with the key ids replaced by their signatures, which can be compared between catalogs
+"""
+def getResolvedLayout(sectionLayout, signatures):
+	description, collapsed, children = sectionLayout
+	resolved = []
+	for child in children:
+		if isinstance(child, tuple):
+			resolved.append(getResolvedLayout(child, signatures))
+		else:
+			resolved.append(signatures[child])
+	return (description, collapsed, tuple(resolved))
+
+"""
+Compares two catalogs of the same XML. A setting has changed if it was added or removed, if its file or sections are
+different, or if the content of its .ini file is different. Settings that are declared several times are compared by
+the last declaration, which is the one the settings manager uses.
+@param previous: the older SettingsCatalog
+@param catalog: the newer SettingsCatalog
+@return: a set of the names of the settings that have changed
+"""
+def getChangedSettings(previous, catalog):
+	sameXML = previous.xmlHash == catalog.xmlHash
+	settings = []
+	for source in (previous, catalog):
+		table = source.keyTable
+		signatures = None
+		if not sameXML:
+			signatures = [table.getKeySignature(keyId) for keyId in range(table.getKeyCount())]
+		layouts = {}
+		for name, file, sectionLayouts in source.settings:
+			if not sameXML:
+				sectionLayouts = tuple(getResolvedLayout(sectionLayout, signatures) for sectionLayout in sectionLayouts)
+			layouts[name] = (file, sectionLayouts)
+		settings.append(layouts)
+	previousSettings, currentSettings = settings
+	changed = set(previousSettings) ^ set(currentSettings)
+	for name, (file, sectionLayouts) in currentSettings.iteritems():
+		if name in changed:
+			continue
+		if previousSettings[name] != (file, sectionLayouts) or previous.defaults.get(file) != catalog.defaults.get(file):
+			changed.add(name)
+	return changed
+
+"""
+@param catalog: a SettingsCatalog
+@return: a value that changes whenever the XML or any of the .ini files of the catalog change
+"""
+def getCatalogStamp(catalog):
+	return (catalog.xmlHash, sorted(catalog.iniStamps.items()))
+
+"""
+Loads the search index of a catalog from the local cache, building and storing it if it's missing or was built for
+other versions of the files.
+@param catalog: the SettingsCatalog
+@return: the SettingsSearchIndex
+"""
+def loadSearchIndex(catalog):
+	path = None
+	if catalog.path != None:
+		path = os.path.splitext(catalog.path)[0]+".search"
+	stamp = getCatalogStamp(catalog)
+	try:
+		with open(path, "rb") as inFile:
+			data = marshal.loads(inFile.read())
+		if data.get("version") == SEARCH_INDEX_VERSION and data.get("stamp") == stamp:
+			tracer.count("search index cache hits")
+			return SettingsSearchIndex(data["index"])
+	except (IOError, OSError, EOFError, ValueError, TypeError, KeyError, AttributeError):
+		pass
+	tracer.count("search index cache misses")
+	with tracer.span("Build search index", settings=len(catalog.settings)):
+		index = buildSearchIndex(catalog.settings, catalog.keyTable, catalog.defaults)
+	if path != None:
+		try:
+			writeFileAtomic(path, marshal.dumps({"version": SEARCH_INDEX_VERSION, "stamp": stamp, "index": index.getData()}))
+		except (IOError, OSError) as e:
+			print "Warning: could not store the search index "+path+": "+str(e)
+	return index
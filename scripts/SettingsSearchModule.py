@@ -0,0 +1,199 @@
+import re
+from array import array
+from bisect import bisect_left, bisect_right
+
+# Separates the terms in the text substring queries are run against, words never contain it since they are split on whitespace
+TERM_SEPARATOR = "\n"
+# The number of word results that are remembered, the filter in the dock searches for the same words on every keystroke
+MAX_CACHED_WORDS = 256
+# Terms are also split into tokens for prefix queries, so "reduction" finds ".../ReductionRatio=50"
+TOKEN_PATTERN = re.compile("[a-z0-9]+")
+
+"""
+@param bits: a set of settings as an integer with one bit per setting
+@return: the ids of the settings in the set, in ascending order
+"""
+def getBitIds(bits):
+	return [settingId for settingId, bit in enumerate(bin(bits)[:1:-1]) if bit == "1"]
+
+"""
+An inverted index over a settings catalog. Every setting name, section description, key description, key name, .ini
+section path and default value is stored as a lower case term, and every term has the set of settings it appears in.
+The sets are integers with one bit per setting, so they take a few bytes each and queries combine them with a single
+and/or. Prefix queries are a binary search in the sorted terms and tokens. Substring queries search a text with all
+terms, which takes a fraction of the memory an n-gram index would, and stop as soon as every setting has matched.
+Values are indexed as "<ini section>/<key>=<value>", which also makes the key paths searchable, e.g.
+"bonereductionsection/reductionratio" or "cascadedlodchain=false".
+"""
+class SettingsSearchIndex(object):
+	__slots__ = ("settingCount", "terms", "postings", "vocabulary", "vocabularyPostings", "text", "termStarts", "wordCache")
+
+	"""
+	@param data: plain data as returned by getData
+	"""
+	def __init__(self, data):
+		self.settingCount = data["settingCount"]
+		# The distinct terms and the settings every term appears in
+		self.terms = data["terms"]
+		self.postings = data["postings"]
+		# The terms and the tokens in them, sorted for prefix queries, and the settings every entry appears in
+		self.vocabulary = data["vocabulary"]
+		self.vocabularyPostings = data["vocabularyPostings"]
+		# All terms in one text and the offset of every term in it, built the first time a substring query is made
+		self.text = None
+		self.termStarts = None
+		# (word, prefix) -> the set of settings that match the word
+		self.wordCache = {}
+
+	"""
+	@return: the index as plain data that can be marshalled
+	"""
+	def getData(self):
+		return {"settingCount": self.settingCount,
+			"terms": self.terms,
+			"postings": self.postings,
+			"vocabulary": self.vocabulary,
+			"vocabularyPostings": self.vocabularyPostings}
+
+	"""
+	Finds the settings that match a query. The query is split into words and a setting matches if it matches every word.
+	@param query: the words to search for, case insensitive
+	@param prefix: true to match the words against the start of the terms and tokens, false to find them anywhere in a term
+	@return: the ids of the matching settings in the order they are declared in the catalog, None if the query is empty
+	"""
+	def search(self, query, prefix=False):
+		words = query.lower().split()
+		if not words:
+			return None
+		result = None
+		for word in words:
+			bits = self.wordCache.get((word, prefix))
+			if bits == None:
+				if prefix:
+					bits = self.matchPrefix(word)
+				else:
+					bits = self.matchSubstring(word)
+				if len(self.wordCache) >= MAX_CACHED_WORDS:
+					self.wordCache.clear()
+				self.wordCache[(word, prefix)] = bits
+			result = bits if result == None else result & bits
+			if not result:
+				return []
+		return getBitIds(result)
+
+	"""
+	@param word: a lower case word
+	@return: the set of settings with a term or token that starts with the word
+	"""
+	def matchPrefix(self, word):
+		allBits = self.getAllBits()
+		bits = 0
+		position = bisect_left(self.vocabulary, word)
+		while position < len(self.vocabulary) and self.vocabulary[position].startswith(word) and bits != allBits:
+			bits |= self.vocabularyPostings[position]
+			position += 1
+		return bits
+
+	"""
+	@param word: a lower case word
+	@return: the set of settings with a term that contains the word
+	"""
+	def matchSubstring(self, word):
+		text, termStarts = self.getText()
+		allBits = self.getAllBits()
+		bits = 0
+		position = text.find(word)
+		while position != -1 and bits != allBits:
+			termId = bisect_right(termStarts, position) - 1
+			bits |= self.postings[termId]
+			# Continue with the next term, a term only has to match once
+			if termId + 1 >= len(termStarts):
+				break
+			position = text.find(word, termStarts[termId + 1])
+		return bits
+
+	"""
+	@return: the set of all settings
+	"""
+	def getAllBits(self):
+		return (1 << self.settingCount) - 1
+
+	"""
+	@return: a (text, termStarts) tuple with all terms in one text and the offset of every term in it
+	"""
+	def getText(self):
+		if self.text == None:
+			termStarts = array("i")
+			offset = 0
+			for term in self.terms:
+				termStarts.append(offset)
+				offset += len(term) + len(TERM_SEPARATOR)
+			self.text = TERM_SEPARATOR.join(self.terms)
+			self.termStarts = termStarts
+		return self.text, self.termStarts
+
+"""
+Collects the terms of one setting.
+@param terms: the set to add the terms to
+@param sectionLayouts: the sections of the setting, see SettingsCatalogModule.getSectionLayout
+@param table: the KeyTable of the catalog
+"""
+def addLayoutTerms(terms, sectionLayouts, table):
+	for description, collapsed, children in sectionLayouts:
+		if description != None:
+			terms.add(description.lower())
+		for child in children:
+			if isinstance(child, tuple):
+				addLayoutTerms(terms, [child], table)
+				continue
+			for value in (table.descriptions[child], table.names[child], table.sections[child]):
+				if value != None:
+					terms.add(value.lower())
+
+"""
+@param iniData: the content of an .ini file
+@param indexData: the index of the file, see IniModule.IniIndex.getData
+@return: a set of the section paths and the "<section>/<key>=<value>" terms of the file
+"""
+def getIniTerms(iniData, indexData):
+	terms = set()
+	sections, names, offsets = indexData
+	for section, keys, sectionOffsets in zip(sections, names, offsets):
+		terms.add(section.lower())
+		sectionOffsets = array("i", sectionOffsets)
+		for keyIndex, key in enumerate(keys):
+			value = iniData[sectionOffsets[2*keyIndex]:sectionOffsets[2*keyIndex+1]]
+			terms.add((section+"/"+key+"="+value).lower())
+	return terms
+
+"""
+Builds the search index of a catalog.
+@param settings: a list of (name, file, sectionLayouts) tuples, the position in the list is the id of the setting
+@param table: the KeyTable of the catalog
+@param defaults: a dictionary of file -> (content, index data) of the .ini files
+@return: the SettingsSearchIndex
+"""
+def buildSearchIndex(settings, table, defaults):
+	termBits = {}
+	iniTerms = {}
+	for settingId, (name, file, sectionLayouts) in enumerate(settings):
+		terms = set([name.lower()])
+		addLayoutTerms(terms, sectionLayouts, table)
+		if file in defaults:
+			if file not in iniTerms:
+				iniTerms[file] = getIniTerms(*defaults[file])
+			terms.update(iniTerms[file])
+		bit = 1 << settingId
+		for term in terms:
+			termBits[term] = termBits.get(term, 0) | bit
+	terms = sorted(termBits)
+	vocabularyBits = dict(termBits)
+	for term in terms:
+		for token in TOKEN_PATTERN.findall(term):
+			vocabularyBits[token] = vocabularyBits.get(token, 0) | termBits[term]
+	vocabulary = sorted(vocabularyBits)
+	return SettingsSearchIndex({"settingCount": len(settings),
+		"terms": terms,
+		"postings": [termBits[term] for term in terms],
+		"vocabulary": vocabulary,
+		"vocabularyPostings": [vocabularyBits[term] for term in vocabulary]})
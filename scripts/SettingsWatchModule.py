@@ -0,0 +1,76 @@
+import threading
+from SettingsCacheModule import getFileStamp
+
+# The number of seconds between two checks of the watched files
+POLL_INTERVAL = 2.0
+
+"""
+Watches the settings files for changes on a background thread. The files are polled with a stat of the modification
+time and size, which behaves the same on every platform and on network shares, where change notifications often don't
+arrive. A change is only reported once the files have stopped changing between two polls, so a version control update
+that writes many files is reported once, when it's done.
+The callback is called from the watcher thread, so anything that touches the user interface must be marshalled back to
+the main thread (for example with maya.utils.executeDeferred).
+"""
+class SettingsWatcher:
+	"""
+	@param onChanged: called with a sorted list of the changed files
+	@param interval: the number of seconds between two polls
+	"""
+	def __init__(self, onChanged, interval=POLL_INTERVAL):
+		self.onChanged = onChanged
+		self.interval = interval
+		# file -> the (mtime, size) the files had when they were loaded, None for missing files
+		self.stamps = {}
+		self.thread = None
+		self.stopEvent = None
+
+	"""
+	Starts watching a set of files, or replaces the files that are watched. Should be called again with the new stamps
+	after the files have been reloaded.
+	@param stamps: a dictionary of file -> (mtime, size) as returned by SettingsCacheModule.getFileStamp
+	"""
+	def watch(self, stamps):
+		self.stamps = dict(stamps)
+		if not self.isWatching():
+			self.stopEvent = threading.Event()
+			self.thread = threading.Thread(target=self.poll, args=(self.stopEvent,), name="SimplygonSettingsWatcher")
+			self.thread.daemon = True
+			self.thread.start()
+
+	"""
+	Stops watching, the thread ends after the current poll.
+	"""
+	def stop(self):
+		if self.stopEvent != None:
+			self.stopEvent.set()
+		self.thread = None
+
+	"""
+	@return: true if the files are being watched
+	"""
+	def isWatching(self):
+		return self.thread != None and self.thread.is_alive() and not self.stopEvent.is_set()
+
+	"""
+	The watcher thread. Reports the files that differ from the watched stamps once they are the same in two polls.
+	@param stopEvent: the event that stops this thread
+	"""
+	def poll(self, stopEvent):
+		pending = None
+		while not stopEvent.wait(self.interval):
+			stamps = self.stamps
+			current = dict((file, getFileStamp(file)) for file in stamps)
+			changed = sorted(file for file, stamp in stamps.iteritems() if current[file] != stamp)
+			if not changed:
+				pending = None
+			elif current != pending:
+				# Still being written, wait for the next poll
+				pending = current
+			else:
+				pending = None
+				# Don't report the same change again, a reload that fails is retried on the next change. The files may have
+				# been replaced by watch in the meantime.
+				if self.stamps is stamps:
+					self.stamps = current
+				self.onChanged(changed)
@@ -1,9 +1,43 @@
 import maya.cmds as cmds
 import maya.mel as mel
-import inspect, os
+import maya.utils
+import inspect, os, shutil, sys, tempfile
+import xml.etree.ElementTree as etree
 import OptimizationManagerModule
 reload(OptimizationManagerModule)
 from OptimizationManagerModule import *
+import BatchQueueModule
+reload(BatchQueueModule)
+from BatchQueueModule import *
+import MeshDataModule
+reload(MeshDataModule)
+import ResultCacheModule
+reload(ResultCacheModule)
+from ResultCacheModule import *
+import AutoTuneModule
+reload(AutoTuneModule)
+from AutoTuneModule import *
+import ColorSetAnalysisModule
+reload(ColorSetAnalysisModule)
+from ColorSetAnalysisModule import *
+import WeightRemapModule
+reload(WeightRemapModule)
+from WeightRemapModule import *
+import BulkExecutionModule
+reload(BulkExecutionModule)
+from BulkExecutionModule import *
+import InstrumentationModule
+reload(InstrumentationModule)
+from InstrumentationModule import *
+import SelectionPlannerModule
+reload(SelectionPlannerModule)
+from SelectionPlannerModule import *
+import LodFanOutModule
+reload(LodFanOutModule)
+from LodFanOutModule import *
+import SettingsWatchModule
+reload(SettingsWatchModule)
+from SettingsWatchModule import *
 
 __author__ = "Samuel Rantaeskola"
 __copyright__ = "Copyright 2014, Donya Labs AB"
@@ -15,7 +49,14 @@ __email__ = "samuel@simplygon.com"
 __status__ = "Prototype"
 
 SETTINGS_FILE_SETTING = "SimplygonSettingsFileXML"
-TEMP_SETTING_FILE = "__temp_processing.ini"
+BATCH_WORKERS_SETTING = "SimplygonBatchWorkers"
+BATCH_COMMAND_SETTING = "SimplygonBatchWorkerCommand"
+RESULT_CACHE_SETTING = "SimplygonResultCache"
+FILL_UNPAINTED_SETTING = "SimplygonFillUnpaintedWeights"
+BULK_EXECUTION_SETTING = "SimplygonBulkExecution"
+TRACE_SETTING = "SimplygonTrace"
+LOD_FAN_OUT_SETTING = "SimplygonLodFanOut"
+WATCH_SETTINGS_SETTING = "SimplygonWatchSettings"
 SIMPLYGON_LOGO = os.path.dirname(os.path.abspath(inspect.getfile(inspect.currentframe())))+"/simplygon_logo.png" #Replace this line to point out your logo
 
 """
@@ -27,6 +68,15 @@ class UserWeightsData:
 		self.colorSetListCtrl = None
 		self.wmSliderCtrl = None
 		self.wmText = None
+		self.checkButton = None
+		self.fillButton = None
+		self.remapCheckBoxCtrl = None
+		self.gammaCtrl = None
+		self.clampCtrl = None
+		self.blurCtrl = None
+		self.dilateCtrl = None
+		# The color sets currently in the drop list, color set -> menu item
+		self.colorSetItems = {}
 
 	"""
 	Creates the panel that contains the user weights settings
@@ -40,11 +90,24 @@ class UserWeightsData:
 		weightsLayout = cmds.rowLayout (parent= layout, numberOfColumns = 2)
 		self.userWeightCheckBoxCtrl = cmds.checkBox(l="Enable", w=150, parent= weightsLayout, onc=userWeightsChanged, ofc=userWeightsChanged)
 		self.colorSetListCtrl = cmds.optionMenu(parent= weightsLayout, w=350, en=False)
+		self.colorSetItems = {}
 		cmds.separator(parent= layout, height=1, style="none")
 		weightsMulLayout = cmds.rowLayout (parent= layout, numberOfColumns = 2)
 		cmds.text(parent= weightsMulLayout, l="Weights multiplier", align="right", w=150)
 		self.wmSliderCtrl = cmds.intSlider(min=1, max=8, value=1, step=1, parent= weightsMulLayout, w=350)
 		cmds.separator(parent= layout, height=1, style="none")	
+		buttonLayout = cmds.rowLayout (parent= layout, numberOfColumns = 3)
+		cmds.text(parent= buttonLayout, l="", w=150)
+		self.checkButton = cmds.button(parent= buttonLayout, label="Check weights", w=175, c=checkUserWeights, en=False)
+		self.fillButton = cmds.button(parent= buttonLayout, label="Fill unpainted", w=175, c=fillUserWeights, en=False)
+		cmds.separator(parent= layout, height=1, style="none")	
+		remapLayout = cmds.frameLayout(parent= layout, l="Remap weights", collapsable=True, collapse=True, li=10)
+		self.remapCheckBoxCtrl = cmds.checkBox(parent= remapLayout, l="Remap the weights before optimizing", w=500)
+		self.gammaCtrl = cmds.floatSliderGrp(parent= remapLayout, field=True, label="Gamma", minValue=0.2, maxValue=5.0, value=1.0)
+		self.clampCtrl = cmds.floatFieldGrp(parent= remapLayout, numberOfFields=2, label="Clamp", value1=0.0, value2=1.0)
+		self.blurCtrl = cmds.intSliderGrp(parent= remapLayout, field=True, label="Blur", minValue=0, maxValue=10, value=0)
+		self.dilateCtrl = cmds.intSliderGrp(parent= remapLayout, field=True, label="Dilate", minValue=-5, maxValue=5, value=0,
+			annotation="Grows the bright areas, negative values grow the dark areas")
 		return layout
 
 	"""
@@ -64,30 +127,64 @@ class UserWeightsData:
 	"""
 	def getColorSet(self):
 		return cmds.optionMenu(self.colorSetListCtrl, query=True, value=True)
+
+	"""
+	@return: the WeightRemap set up in the panel, None if the weights shouldn't be remapped
+	"""
+	def getWeightRemap(self):
+		if not cmds.checkBox(self.remapCheckBoxCtrl, query=True, value=True):
+			return None
+		if numpy == None:
+			print "Warning! Remapping user weights requires NumPy, the weights are used as they are painted."
+			return None
+		remap = WeightRemap(cmds.floatSliderGrp(self.gammaCtrl, query=True, value=True),
+			cmds.floatFieldGrp(self.clampCtrl, query=True, value1=True),
+			cmds.floatFieldGrp(self.clampCtrl, query=True, value2=True),
+			cmds.intSliderGrp(self.blurCtrl, query=True, value=True),
+			cmds.intSliderGrp(self.dilateCtrl, query=True, value=True))
+		if remap.isIdentity():
+			return None
+		return remap
+
+	"""
+	@return: the color set to use as user weights, None if user weights are disabled
+	"""
+	def getActiveColorSet(self):
+		if self.useUserWeights():
+			return self.getColorSet()
+		return None
 		
 
 	"""
-	Should be called every time the color set selector needs to be updated. Will remove the current
-	set of options and fetch the current possible sets and add them to the droplist
+	Should be called every time the color set selector needs to be updated. Fetches the current possible sets
+	and only removes/adds the options in the droplist that differ from them.
 	"""
 	def updateColorSets(self):
-		# Delete the current set of color sets
-		try:
-			menuItems = cmds.optionMenu(self.colorSetListCtrl, q=True, itemListLong=True)
-			if menuItems != None and menuItems != []:
-				cmds.deleteUI(menuItems)
-		except:
-			pass
-		colorSets = cmds.polyColorSet( query=True, allColorSets=True)
-		if colorSets :
-			for c in colorSets:
-				cmds.menuItem(parent=self.colorSetListCtrl, label=c)
+		colorSets = [c for c in cmds.polyColorSet( query=True, allColorSets=True) or [] if c != REMAPPED_COLOR_SET]
+		removed = [c for c in self.colorSetItems if c not in colorSets]
+		if removed:
+			try:
+				cmds.deleteUI([self.colorSetItems.pop(c) for c in removed])
+			except RuntimeError:
+				pass
+		for c in colorSets:
+			if c not in self.colorSetItems:
+				self.colorSetItems[c] = cmds.menuItem(parent=self.colorSetListCtrl, label=c)
 		if cmds.checkBox(self.userWeightCheckBoxCtrl, query = True, value=True):
 			cmds.optionMenu(self.colorSetListCtrl, edit=True, en=True)	
 			cmds.intSlider(self.wmSliderCtrl, edit=True, en=True)				
 		else: 
 			cmds.optionMenu(self.colorSetListCtrl, edit=True, en=False)	
 			cmds.intSlider(self.wmSliderCtrl, edit=True, en=False)	
+		self.enableButtons(cmds.checkBox(self.userWeightCheckBoxCtrl, query = True, value=True))
+
+	"""
+	Enables/disables the check and fill buttons.
+	@param enabled: true to enable the buttons
+	"""
+	def enableButtons(self, enabled):
+		cmds.button(self.checkButton, edit=True, en=enabled)
+		cmds.button(self.fillButton, edit=True, en=enabled)
 			
 		
 	"""
@@ -100,6 +197,7 @@ class UserWeightsData:
 		useUserWeights = cmds.checkBox(self.userWeightCheckBoxCtrl, query = True, value=True)
 		cmds.optionMenu(self.colorSetListCtrl, edit=True, en=enabled and useUserWeights)
 		cmds.intSlider(self.wmSliderCtrl, edit=True, en=enabled and useUserWeights)				
+		self.enableButtons(enabled and useUserWeights)
 
 """
 The main class for the Simplygon Batch processor. Handles a dock window and setting up all the components.
@@ -115,18 +213,59 @@ class SimplygonBatchProcessor:
 		#For clarity all of the controls are declared here.
 		self.settingsDirCtrl = None
 		self.settingsFileListCtrl = None
+		self.settingFilterCtrl = None
+		self.settingFilterCountCtrl = None
 		self.optimizeButton = None
 		self.mainLayout = None
 		self.optimizationContainer = None
 		self.simplygonButton = None
 		self.settingsManager = None
+		self.queueSelectionButton = None
+		self.queueStatusCtrl = None
+		self.backgroundButton = None
+		self.cancelButton = None
+		self.progressCtrl = None
+		self.progressTextCtrl = None
+		self.budgetCtrl = None
+		self.autoTuneButton = None
+		self.splitCtrl = None
+		self.queueSplitButton = None
 		#END controls
+		self.batchQueue = None
+		self.batchTempDir = None
+		# The jobs whose results have been imported. The status is read when the deferred call runs, so a job can be
+		# seen as done more than once.
+		self.importedJobs = set()
+		self.backgroundQueue = None
+		# The jobs of the running background optimization, one per LOD if the LODs are optimized separately
+		self.backgroundJobs = []
+		self.backgroundCallback = None
+		# The folder with the exported selection and the results of the running background optimization
+		self.backgroundTempDir = None
+		# The result cache is on unless it has been turned off through the option var
+		self.resultCache = None
+		if not cmds.optionVar(exists= RESULT_CACHE_SETTING) or cmds.optionVar(q=RESULT_CACHE_SETTING):
+			self.resultCache = ResultCache()
+		self.setupTracing()
 		
 		# Fetch the settings file folder from the environment.
 		if cmds.optionVar(exists= SETTINGS_FILE_SETTING):
 			self.settingsXML = cmds.optionVar(q=SETTINGS_FILE_SETTING)
 			self.settingsManager = OptimizationSettingsManager(self.settingsXML)
 
+	"""
+	Turns tracing on or off according to the option var, unless it has been turned on through the environment variable.
+	The Maya commands issued by the modules of the tool are counted while tracing is on.
+	"""
+	def setupTracing(self):
+		if cmds.optionVar(exists= TRACE_SETTING) and os.environ.get(TRACE_VARIABLE) in [None, "", "0"]:
+			if cmds.optionVar(q=TRACE_SETTING):
+				tracer.enable()
+			else:
+				tracer.disable()
+		tracer.instrumentCommands([sys.modules[__name__], OptimizationManagerModule, KeyModifierModule, ResultCacheModule,
+			ColorSetAnalysisModule, WeightRemapModule, BulkExecutionModule])
+
 	"""
 	Opens up a browser window that allows the user to specify where you can find the XML that describes the setting files to use
 	"""	
@@ -135,11 +274,60 @@ class SimplygonBatchProcessor:
 		cmds.optionVar( sv=(SETTINGS_FILE_SETTING, self.settingsXML) )
 		cmds.textField(self.settingsDirCtrl, edit=True, text=self.settingsXML)
 		# Set up a new settings manager with the new XML.
+		if self.settingsManager != None:
+			self.settingsManager.clearPanels()
 		self.settingsManager = OptimizationSettingsManager(self.settingsXML)
 		self.updateSettingFileList()
+		self.watchSettings()
+
+	"""
+	Starts watching the settings XML and the .ini files it references for changes, unless it has been turned off through
+	the option var. Called again after every reload, so the files the reloaded settings reference are watched.
+	"""
+	def watchSettings(self):
+		global settingsWatcher
+		if settingsWatcher == None:
+			settingsWatcher = SettingsWatcher(settingsFilesChanged)
+		if self.settingsManager == None or (cmds.optionVar(exists= WATCH_SETTINGS_SETTING) and not cmds.optionVar(q=WATCH_SETTINGS_SETTING)):
+			settingsWatcher.stop()
+			return
+		settingsWatcher.watch(self.settingsManager.getWatchedFiles())
+
+	"""
+	Called when the settings XML or the .ini files have changed on disk. Only the settings that have changed are reloaded,
+	and if the selected setting is one of them its panel is rebuilt with the values the user had changed put back.
+	Stops watching the files if the window has been closed.
+	"""
+	def settingsFilesChanged(self):
+		if self.settingsManager == None or not cmds.dockControl(self.DOCK_NAME, exists=True):
+			if settingsWatcher != None:
+				settingsWatcher.stop()
+			return
+		try:
+			changed = self.settingsManager.reloadSettings()
+		except (IOError, OSError, etree.ParseError) as e:
+			# Most likely a file that is still being written, it's reloaded again when it changes
+			print "Warning! The settings could not be reloaded: "+str(e)
+			return
+		self.watchSettings()
+		if not changed:
+			return
+		print "Reloaded the settings: "+", ".join(sorted(changed))
+		settingNames = self.updateSettingFileList()
+		currentSetting = self.settingsManager.currentSetting
+		if currentSetting in settingNames:
+			cmds.optionMenu(self.settingsFileListCtrl, edit=True, value=currentSetting)
+		elif settingNames:
+			cmds.optionMenu(self.settingsFileListCtrl, edit=True, value=settingNames[0])
+		else:
+			return
+		if currentSetting in changed or currentSetting not in settingNames:
+			self.settingChanged()
 			
 	"""
-	Refreshes the settings drop list based of the current settings in the settings manager.
+	Refreshes the settings drop list based of the current settings in the settings manager. If there's text in the
+	filter only the matching settings are listed.
+	@return: the names of the listed settings
 	"""	
 	def updateSettingFileList(self):
 		# Delete the current set of settings
@@ -150,14 +338,110 @@ class SimplygonBatchProcessor:
 		except:
 			pass
 		settingNames = self.settingsManager.getSettingNames()
+		query = ""
+		if self.settingFilterCtrl != None:
+			query = cmds.textField(self.settingFilterCtrl, query=True, text=True) or ""
+		if query.strip():
+			settingNames = self.settingsManager.searchSettings(query)
 		for settingName in settingNames:
 			cmds.menuItem(parent=self.settingsFileListCtrl, label=settingName)
+		if self.settingFilterCountCtrl != None:
+			cmds.text(self.settingFilterCountCtrl, edit=True, label="%d of %d" % (len(settingNames), len(self.settingsManager.getSettingNames())))
+		return settingNames
+
+	"""
+	Called when the text in the settings filter has changed. Only the settings that match the filter are listed, if the
+	selected setting is filtered out the first matching setting is selected instead.
+	"""
+	def settingFilterChanged(self):
+		if self.settingsManager == None:
+			return
+		settingNames = self.updateSettingFileList()
+		if not settingNames:
+			return
+		if self.settingsManager.currentSetting in settingNames:
+			cmds.optionMenu(self.settingsFileListCtrl, edit=True, value=self.settingsManager.currentSetting)
+		else:
+			cmds.optionMenu(self.settingsFileListCtrl, edit=True, value=settingNames[0])
+			self.settingChanged()
 	"""
 	Starts a Simplygon optimization in batch mode with the currently selected settings.
 	"""	
 	def onOptimize(self, _):
 		self.startSimplygon(True)
 
+	"""
+	Searches the ReductionRatio of every LOD for the value that hits the triangle budgets entered by the user, and sets
+	the winning values in the panel.
+	"""	
+	def onAutoTune(self, _):
+		targets = {}
+		try:
+			for lodIndex, budget in enumerate(cmds.textField(self.budgetCtrl, query=True, text=True).split(",")):
+				if len(budget.strip()) > 0:
+					targets[lodIndex] = int(budget)
+		except ValueError:
+			print "Warning! The triangle budgets should be a comma separated list of integers, one for each LOD"
+			return
+		self.autoTune(targets)
+
+	"""
+	Searches the ReductionRatio of a number of LODs for the values that hit triangle budgets. Every measurement is a
+	batch optimization of the selection, which means that results that are already in the result cache are reused.
+	@param targets: a dictionary of LOD index -> triangle budget
+	@return: the number of optimization runs it took, 0 if nothing was tuned
+	"""
+	def autoTune(self, targets):
+		selection = cmds.ls(sl=True, long=True)
+		if not selection:
+			print "Warning! Select the meshes to tune the reduction for"
+			return 0
+		targets = dict(targets)
+		keys = {}
+		for key in self.settingsManager.getSettingData(self.settingsManager.currentSetting).getKeys():
+			lodIndex = getLodSectionIndex(key.getKeySection())
+			if key.getKeyName() == REDUCTION_KEY and lodIndex in targets and isinstance(key, (IntRangeData, FloatRangeData)):
+				keys[lodIndex] = key
+		for lodIndex in sorted(targets):
+			if lodIndex not in keys:
+				print "Warning! The "+REDUCTION_KEY+" of LOD%d isn't exposed as a range in the setting, it can't be tuned" % lodIndex
+				del targets[lodIndex]
+
+		def measure(overrides):
+			lods = self.startSimplygon(True, overrides)
+			try:
+				return [getPolyCount(group)[0] for group in groupLodNodes(lods)]
+			finally:
+				if lods:
+					cmds.delete(lods)
+				cmds.select(selection, replace=True)
+
+		tuner = ReductionTuner(measure)
+		try:
+			with self.getBulkExecution("Auto-tune", suspendEvaluation=True):
+				overrides = tuner.tune(keys, targets, self.settingsManager.getOverrides())
+		except ValueError as e:
+			print "Warning! Auto-tune stopped after %d optimization runs: %s" % (tuner.runs, e)
+			return 0
+		for lodIndex in targets:
+			key = keys[lodIndex]
+			self.settingsManager.setOverride(key.getKeySection(), key.getKeyName(), overrides[(key.getKeySection(), key.getKeyName())])
+		print "Auto-tune finished after %d optimization runs" % tuner.runs
+		return tuner.runs
+
+	"""
+	Starts a Simplygon optimization of the selected objects in a background process, keeping Maya responsive.
+	"""	
+	def onOptimizeInBackground(self, _):
+		self.startSimplygonAsync()
+
+	"""
+	Cancels the running background optimization.
+	"""	
+	def onCancelBackground(self, _):
+		if self.backgroundQueue != None:
+			self.backgroundQueue.cancel()
+
 	"""
 	Starts the Simplygon GUI with the currently selected settings and selected objects.
 	"""	
@@ -165,29 +449,414 @@ class SimplygonBatchProcessor:
 		self.startSimplygon(False)
 	
 	"""
-	Starts a new Simplygon process. Will generate a temporary settings file to use during this optimization.
+	Starts a new Simplygon process. Will generate a temporary settings file in the local cache to use during this optimization.
+	In batch mode the produced LODs are stored in the result cache, and if the selected meshes have already been optimized
+	with the same settings and user weights the stored LODs are imported instead.
 	@param batch: true if the process should be run in batch mode
+	@param overrides: a dictionary of (section, key) -> value to use instead of the values in the panel
+	@return: in batch mode, the top level nodes of the LODs
 	"""	
-	def startSimplygon(self, batch):
-		tempPath = os.path.dirname(os.path.realpath(self.settingsXML))
-		tempFile = tempPath+"/"+TEMP_SETTING_FILE
-		tempFile = tempFile.replace("\\", "/")
-		# Write out a temporary settings file with the overriden settings included
-		with open(tempFile, 'wb') as outFile:
-			self.settingsManager.writeTempConfig(outFile)
-		melCmd = "Simplygon -sf \""+tempFile+"\""
-		if batch:
-			melCmd += " -b"
-		#Check if the user weights are enabled, in that case send that along to Simplygon.
-		uwEnabled = self.userWeightData.useUserWeights();
-		if uwEnabled:
-			colorSet = self.userWeightData.getColorSet()
-			if colorSet != None:
-				melCmd += " -caw \""+colorSet+"\" -wm "+ str(self.userWeightData.getWeightMultiplier())
-		print melCmd
-		lods = mel.eval(melCmd)
-		#Remove the temporary processing file
-		os.remove(tempFile)
+	def startSimplygon(self, batch, overrides=None):
+		try:
+			with tracer.span("Optimize", batch=batch):
+				# Write out a temporary settings file with the overriden settings included
+				if overrides != None:
+					settingsData = self.settingsManager.getMergedConfig(self.settingsManager.currentSetting, overrides).getText()
+				else:
+					settingsData = self.settingsManager.getCurrentMergedConfig().getText()
+				tempFile = getTempSettingsFile(settingsData)
+				melCmd = "Simplygon -sf \""+tempFile+"\""
+				if batch:
+					melCmd += " -b"
+				#Check if the user weights are enabled, in that case send that along to Simplygon.
+				colorSet = self.prepareUserWeights()
+				if colorSet != None:
+					melCmd += " -caw \""+colorSet+"\" -wm "+ str(self.userWeightData.getWeightMultiplier())
+				if not batch:
+					# The Simplygon window reads the user weights while it's open, so the remapped weights are left on the meshes
+					print melCmd
+					with tracer.span("mel.eval"):
+						return mel.eval(melCmd)
+
+				selection = cmds.ls(sl=True, long=True)
+				lods = None
+				try:
+					with self.getBulkExecution("Optimize"):
+						resultKey = None
+						if self.resultCache != None:
+							resultKey = getResultKey(selection, settingsData, colorSet, self.userWeightData.getWeightMultiplier())
+							lods = self.resultCache.load(resultKey)
+							if lods != None:
+								print "Imported the cached LODs for the selection ("+resultKey+")"
+								return lods
+						transforms = getTransforms()
+						print melCmd
+						with tracer.span("mel.eval"):
+							mel.eval(melCmd)
+						lods = getNewTransforms(transforms)
+						if resultKey != None:
+							self.resultCache.store(resultKey, lods)
+						return lods
+				finally:
+					self.removeUserWeightsCopy(selection + (lods or []), colorSet)
+		finally:
+			# The trace is written after every optimization, so it's there even if Maya crashes
+			tracer.save()
+
+	"""
+	Creates a bulk block for a run that edits the scene, see BulkExecution. The block times itself and can be turned off
+	through the option var to compare the timing with.
+	@param name: the name of the undo chunk and the timing report
+	@param suspendEvaluation: true to also switch off the evaluation manager, for runs over many assets
+	@return: the BulkExecution
+	"""
+	def getBulkExecution(self, name, suspendEvaluation=False):
+		enabled = True
+		if cmds.optionVar(exists= BULK_EXECUTION_SETTING):
+			enabled = cmds.optionVar(q=BULK_EXECUTION_SETTING) != 0
+		return BulkExecution(name, suspendEvaluation=suspendEvaluation, report=True, enabled=enabled)
+
+	"""
+	Checks the coverage of the user weights color set on the selection before it's passed to Simplygon, since
+	unpainted vertices are read as black. The unpainted vertices are filled with neutral grey if that has been turned
+	on through the option var, otherwise a warning with the coverage report is printed.
+	@param colorSet: the color set used as user weights
+	@return: the ColorSetReport of the selection
+	"""
+	def preflightUserWeights(self, colorSet):
+		selection = cmds.ls(sl=True, long=True)
+		report = analyzeColorSet(selection, colorSet, self.userWeightData.getWeightMultiplier())
+		if report.hasProblems():
+			if cmds.optionVar(exists= FILL_UNPAINTED_SETTING) and cmds.optionVar(q=FILL_UNPAINTED_SETTING):
+				print "Filled %d unpainted vertices in %s with neutral grey" % (fillUnpainted(selection, colorSet), colorSet)
+			else:
+				print "Warning! Not all vertices have a user weight, unpainted vertices are read as black."
+				print report.getText()
+		return report
+
+	"""
+	Gets the user weights of the selection ready to be passed to Simplygon: checks the coverage of the color set and
+	writes the remapped weights to the temporary color set if remapping is turned on.
+	@return: the color set to pass to Simplygon, None if user weights are disabled
+	"""
+	def prepareUserWeights(self):
+		colorSet = self.userWeightData.getActiveColorSet()
+		if colorSet == None:
+			return None
+		self.preflightUserWeights(colorSet)
+		remap = self.userWeightData.getWeightRemap()
+		if remap != None:
+			colorSet = remap.apply(cmds.ls(sl=True, long=True), colorSet)
+		return colorSet
+
+	"""
+	Removes the temporary color set written by prepareUserWeights once Simplygon has read it or it has been exported.
+	@param nodes: the nodes the user weights were prepared on, or LODs made from them
+	@param colorSet: the color set returned by prepareUserWeights
+	"""
+	def removeUserWeightsCopy(self, nodes, colorSet):
+		if colorSet == REMAPPED_COLOR_SET and nodes:
+			removeRemappedColorSet(nodes)
+
+	"""
+	Prints the coverage and distribution of the user weights color set on the selection.
+	"""
+	def onCheckUserWeights(self):
+		colorSet = self.userWeightData.getColorSet()
+		if colorSet != None:
+			print analyzeColorSet(cmds.ls(sl=True, long=True), colorSet, self.userWeightData.getWeightMultiplier()).getText()
+
+	"""
+	Fills the unpainted vertices of the user weights color set on the selection with neutral grey, in one undo chunk.
+	"""
+	def onFillUserWeights(self):
+		colorSet = self.userWeightData.getColorSet()
+		if colorSet != None:
+			with self.getBulkExecution("Fill user weights"):
+				filled = fillUnpainted(cmds.ls(sl=True, long=True), colorSet)
+			print "Filled %d unpainted vertices in %s with neutral grey" % (filled, colorSet)
+			self.updateColorSets()
+
+	"""
+	@return: a (workers, command) tuple with the size of the worker pool and the worker command from the optionVars, None
+	for the defaults
+	"""
+	def getWorkerSettings(self):
+		workers = None
+		if cmds.optionVar(exists= BATCH_WORKERS_SETTING):
+			workers = cmds.optionVar(q=BATCH_WORKERS_SETTING)
+		command = None
+		if cmds.optionVar(exists= BATCH_COMMAND_SETTING):
+			command = splitCommand(cmds.optionVar(q=BATCH_COMMAND_SETTING))
+		return (workers, command)
+
+	"""
+	@return: the batch queue, created with the worker settings from the environment the first time it's requested
+	"""
+	def getBatchQueue(self):
+		if self.batchQueue == None:
+			workers, command = self.getWorkerSettings()
+			self.batchTempDir = tempfile.mkdtemp(prefix="SimplygonBatch").replace("\\", "/")
+			self.batchQueue = BatchQueue(self.settingsManager, workers, command)
+		return self.batchQueue
+
+	"""
+	Exports the current selection and adds it to the batch queue with the currently selected setting and overrides.
+	"""
+	def onQueueSelection(self, _):
+		queue = self.getBatchQueue()
+		jobName = "Selection %d" % (len(queue.jobs)+1)
+		scene = self.batchTempDir+"/selection%d.mb" % (len(queue.jobs)+1)
+		colorSet = self.prepareUserWeights()
+		cmds.file(scene, force=True, exportSelected=True, type="mayaBinary")
+		self.removeUserWeightsCopy(cmds.ls(sl=True, long=True), colorSet)
+		queue.addJob(BatchJob(jobName, scene, self.settingsManager.currentSetting, self.settingsManager.getOverrides(),
+			colorSet=colorSet, weightMultiplier=self.userWeightData.getWeightMultiplier(), importResult=True))
+		self.updateQueueStatus()
+
+	"""
+	Splits the selection into objects or hierarchies, groups them by setting and color set and adds them to the batch
+	queue in chunks that are balanced by triangle count over the workers. Objects can ask for another setting than the
+	selected one through the simplygonSetting attribute; the overrides set in the panel only apply to the selected setting.
+	When a chunk is done its LODs are imported and moved next to the objects they were made from.
+	"""
+	def onQueueSplitSelection(self, _):
+		selection = cmds.ls(sl=True, long=True)
+		queue = self.getBatchQueue()
+		colorSet = self.prepareUserWeights()
+		currentSetting = self.settingsManager.currentSetting
+		split = cmds.optionMenu(self.splitCtrl, query=True, value=True)
+		units = getWorkUnits(selection, split, currentSetting, self.settingsManager.getSettingNames(), colorSet)
+		chunks = planChunks(units, queue.workers)
+		try:
+			for chunk in chunks:
+				index = len(queue.jobs)+1
+				scene = self.batchTempDir+"/chunk%d.mb" % index
+				cmds.select(chunk.getRoots(), replace=True)
+				cmds.file(scene, force=True, exportSelected=True, type="mayaBinary")
+				overrides = {}
+				if chunk.settingName == currentSetting:
+					overrides = self.settingsManager.getOverrides()
+				queue.addJob(BatchJob("Chunk %d" % index, scene, chunk.settingName, overrides, objects=chunk.getRoots(),
+					colorSet=chunk.colorSet, weightMultiplier=self.userWeightData.getWeightMultiplier(), importResult=True,
+					statsFile=self.batchTempDir+"/chunk%d.json" % index, units=chunk.getRoots()))
+		finally:
+			cmds.select(selection, replace=True)
+			self.removeUserWeightsCopy(selection, colorSet)
+		print "Queued %d objects in %d chunks" % (len(units), len(chunks))
+		self.updateQueueStatus()
+
+	"""
+	Called from the batch queue thread when a job has changed status. A chunk that failed is queued again with one job
+	per object, so a single broken mesh doesn't take the rest of the chunk down with it. The exported scene of the chunk
+	is reused. This runs on the queue thread so the new jobs are picked up before the queue runs dry.
+	@param job: the job that changed
+	"""
+	def requeueFailedUnits(self, job):
+		if job.status != JOB_FAILED or len(job.units) < 2 or self.batchQueue == None:
+			return
+		base = os.path.splitext(job.output)[0]
+		for index, root in enumerate(job.units):
+			self.batchQueue.addJob(BatchJob("%s object %d" % (job.name, index+1), job.scene, job.settingName, job.overrides,
+				objects=[root], colorSet=job.colorSet, weightMultiplier=job.weightMultiplier, output=base+"_%d.mb" % (index+1),
+				importResult=job.importResult, statsFile=base+"_%d.json" % (index+1), units=[root]))
+
+	"""
+	Lets the user pick a number of scenes and adds them to the batch queue with the currently selected setting and overrides.
+	"""
+	def onQueueScenes(self, _):
+		scenes = cmds.fileDialog2(fm=4, fileFilter="Maya Scenes (*.ma *.mb)", okc="Add")
+		if scenes == None:
+			return
+		queue = self.getBatchQueue()
+		for scene in scenes:
+			queue.addJob(BatchJob(os.path.basename(scene), scene, self.settingsManager.currentSetting, self.settingsManager.getOverrides()))
+		self.updateQueueStatus()
+
+	"""
+	Starts processing the batch queue in the background.
+	"""
+	def onRunQueue(self, _):
+		self.getBatchQueue().start(onJobChanged=batchJobChanged, onFinished=batchQueueFinished)
+
+	"""
+	Cancels the pending and running jobs in the batch queue.
+	"""
+	def onCancelQueue(self, _):
+		if self.batchQueue != None:
+			self.batchQueue.cancel()
+
+	"""
+	Called on the main thread when a job in the batch queue has changed status. Imports the result of finished selection jobs.
+	@param job: the job that changed
+	"""
+	def batchJobChanged(self, job):
+		if job.status == JOB_DONE and job.importResult and job not in self.importedJobs and os.path.isfile(job.output):
+			self.importedJobs.add(job)
+			with self.getBulkExecution("Import "+job.name):
+				if job.units and job.stats and job.stats.get("lods"):
+					self.importLods(job)
+				else:
+					self.importJobLods(job)
+		self.updateQueueStatus()
+
+	"""
+	Imports the LODs of a job that optimized a part of the selection and moves them next to the objects they were made
+	from.
+	@param job: the finished job, with the LODs listed in its stats
+	"""
+	def importLods(self, job):
+		reattachLods(self.importJobLods(job), job.units)
+
+	"""
+	Imports the result of a job into a namespace named after the job. If the LODs are listed in the stats of the job,
+	everything else in the result is thrown away, results written by other worker commands may hold more than the LODs.
+	@param job: the finished job
+	@return: the full paths of the imported top level LOD nodes
+	"""
+	def importJobLods(self, job):
+		newNodes = cmds.file(job.output, i=True, namespace=job.name.replace(" ", "_"), returnNewNodes=True) or []
+		if not job.stats or not job.stats.get("lods"):
+			lods = cmds.ls(newNodes, assemblies=True, long=True) or []
+			self.removeUserWeightsCopy(lods, job.colorSet)
+			return lods
+		lodPaths = set(removeNamespaces(path) for path in job.stats["lods"])
+		lods = [node for node in cmds.ls(newNodes, type="transform", long=True) or [] if removeNamespaces(node) in lodPaths]
+		others = [node for node in cmds.ls(newNodes, assemblies=True, long=True) or []
+			if node not in lods and not any(lod.startswith(node+"|") for lod in lods)]
+		if others:
+			cmds.delete(others)
+		self.removeUserWeightsCopy(lods, job.colorSet)
+		return lods
+
+	"""
+	Refreshes the status field of the batch queue.
+	"""
+	def updateQueueStatus(self):
+		if self.batchQueue != None:
+			cmds.scrollField(self.queueStatusCtrl, edit=True, text=self.batchQueue.getSummary())
+
+	"""
+	Starts an optimization of the selected objects in a headless worker process. The selection is exported to a temporary
+	scene and the worker reports its progress to the window. When the worker is done the LODs are imported on the main
+	thread and passed on to the completion callback.
+	If the LODs of the setting don't depend on each other (the LOD chain isn't cascaded) every LOD is optimized by its own
+	worker at the same time, and the LODs are merged into one LOD group per selected object when all workers are done.
+	@param onComplete: called with the job and the list of imported LOD nodes when the optimization is done. The list is
+	empty if the optimization failed or was cancelled. When the LODs are optimized separately the job is the first one
+	that failed, or the job of the first LOD, and the list holds the LOD groups.
+	@return: the job that was started, the job of the first LOD when the LODs are optimized separately, or None if nothing
+	was started
+	"""	
+	def startSimplygonAsync(self, onComplete=None):
+		if self.backgroundJobs:
+			print "Warning! A background optimization is already running."
+			return None
+		roots = cmds.ls(sl=True, long=True) or []
+		if not roots:
+			print "Warning! Select the meshes to optimize"
+			return None
+		weightMultiplier = self.userWeightData.getWeightMultiplier()
+		settingName = self.settingsManager.currentSetting
+		overrides = self.settingsManager.getOverrides()
+		configs = self.getFanOutConfigs()
+		tempDir = tempfile.mkdtemp(prefix="SimplygonBackground").replace("\\", "/")
+		scene = tempDir+"/selection.mb"
+		colorSet = None
+		exported = False
+		try:
+			colorSet = self.prepareUserWeights()
+			cmds.file(scene, force=True, exportSelected=True, type="mayaBinary")
+			exported = True
+		finally:
+			self.removeUserWeightsCopy(roots, colorSet)
+			if not exported:
+				shutil.rmtree(tempDir, ignore_errors=True)
+		if configs == None:
+			jobs = [BatchJob("Background", scene, settingName, overrides, colorSet=colorSet, weightMultiplier=weightMultiplier, importResult=True)]
+		else:
+			jobs = [BatchJob("Background LOD%d" % lodIndex, scene, settingName, overrides, colorSet=colorSet, weightMultiplier=weightMultiplier,
+				output=tempDir+"/lod%d.mb" % lodIndex, importResult=True, statsFile=tempDir+"/lod%d.json" % lodIndex, units=roots,
+				settingsFile=getTempSettingsFile(config.getText())) for lodIndex, config in enumerate(configs)]
+		self.backgroundCallback = onComplete
+		self.backgroundTempDir = tempDir
+		workers, command = self.getWorkerSettings()
+		self.backgroundQueue = BatchQueue(self.settingsManager, min(len(jobs), workers or getProcessorCount()), command)
+		for job in jobs:
+			self.backgroundQueue.addJob(job)
+		self.backgroundJobs = jobs
+		self.showProgress(True)
+		self.enable(somethingSelected())
+		self.backgroundQueue.start(onJobChanged=backgroundJobChanged, onOutput=backgroundJobOutput)
+		return jobs[0]
+
+	"""
+	Splits the current setting into one config per LOD if the LODs can be optimized separately. Can be turned off with
+	an optionVar.
+	@return: a list with a single LOD config for every LOD, or None if the LODs have to be optimized in one run
+	"""
+	def getFanOutConfigs(self):
+		if cmds.optionVar(exists= LOD_FAN_OUT_SETTING) and not cmds.optionVar(q=LOD_FAN_OUT_SETTING):
+			return None
+		return getFanOutConfigs(self.settingsManager.getCurrentMergedConfig())
+
+	"""
+	Called on the main thread when a background job has made progress. The progress bar shows the average of all jobs.
+	@param job: the background job
+	"""
+	def backgroundJobProgress(self, job):
+		if job not in self.backgroundJobs:
+			return
+		progress = sum(backgroundJob.progress for backgroundJob in self.backgroundJobs) / len(self.backgroundJobs)
+		message = job.progressMessage
+		if len(self.backgroundJobs) > 1:
+			message = job.name+": "+message
+		cmds.progressBar(self.progressCtrl, edit=True, progress=progress)
+		cmds.text(self.progressTextCtrl, edit=True, label=message)
+
+	"""
+	Called on the main thread when a background job has changed status. Imports the LODs when all jobs are done and
+	calls the completion callback. If the LODs were optimized separately nothing is imported unless every LOD succeeded.
+	@param job: the background job
+	"""
+	def backgroundJobChanged(self, job):
+		if job not in self.backgroundJobs:
+			return
+		if any(backgroundJob.status == JOB_RUNNING or backgroundJob.status == JOB_PENDING for backgroundJob in self.backgroundJobs):
+			return
+		jobs = self.backgroundJobs
+		self.backgroundJobs = []
+		lods = []
+		failed = [backgroundJob for backgroundJob in jobs if backgroundJob.status != JOB_DONE or not os.path.isfile(backgroundJob.output)]
+		for backgroundJob in failed:
+			print backgroundJob.name+" optimization "+backgroundJob.status+":\n"+"\n".join(backgroundJob.log)
+		if not failed:
+			with self.getBulkExecution("Import "+jobs[0].name):
+				if len(jobs) == 1:
+					lods = self.importJobLods(jobs[0])
+				elif jobs[0].units:
+					lodNodes = [self.importJobLods(backgroundJob) for backgroundJob in jobs]
+					lods = [mergeLods(nodes, getShortName(root)+"_LODGroup") for root, nodes in splitLodsByRoot(lodNodes, jobs[0].units)]
+				else:
+					lods = [mergeLods([self.importJobLods(backgroundJob) for backgroundJob in jobs], "Simplygon_LODGroup")]
+		if self.backgroundTempDir != None:
+			shutil.rmtree(self.backgroundTempDir, ignore_errors=True)
+			self.backgroundTempDir = None
+		self.showProgress(False)
+		self.enable(somethingSelected())
+		callback = self.backgroundCallback
+		self.backgroundCallback = None
+		if callback != None:
+			callback(failed[0] if failed else jobs[0], lods)
+
+	"""
+	Shows/hides the progress components of the background optimization.
+	@param visible: true if a background optimization is running
+	"""
+	def showProgress(self, visible):
+		cmds.progressBar(self.progressCtrl, edit=True, progress=0, visible=visible)
+		cmds.text(self.progressTextCtrl, edit=True, label="", visible=visible)
+		cmds.button(self.cancelButton, edit=True, visible=visible)
 
 	"""
 	Will update the settings components whenever the selected setting has been changed.
@@ -204,6 +873,10 @@ class SimplygonBatchProcessor:
 	def enable(self, enabled):
 		cmds.button(self.optimizeButton, edit=True, en=enabled)
 		cmds.button(self.simplygonButton, edit=True, en=enabled)
+		cmds.button(self.queueSelectionButton, edit=True, en=enabled)
+		cmds.button(self.queueSplitButton, edit=True, en=enabled)
+		cmds.button(self.autoTuneButton, edit=True, en=enabled)
+		cmds.button(self.backgroundButton, edit=True, en=enabled and not self.backgroundJobs)
 		if self.userWeightData != None:
 			self.userWeightData.enable(enabled)
 		if self.settingsManager != None:
@@ -234,12 +907,37 @@ class SimplygonBatchProcessor:
 		cmds.text(parent= layout, l="Optimization settings", align="center", font="boldLabelFont")
 		cmds.separator(parent= layout, height=20, style="doubleDash")
 
+		# Add the filter, which searches the setting names, key names, .ini paths and default values
+		filterLayout = cmds.rowLayout(parent= layout, numberOfColumns = 3, adjustableColumn=2)
+		cmds.text(parent= filterLayout, l="Filter", align="right", w=50)
+		self.settingFilterCtrl = cmds.textField(parent= filterLayout, textChangedCommand=settingFilterChanged,
+			annotation="Words to search for in the setting names, descriptions, key names, .ini section paths and default values, e.g. BoneReductionSection/ReductionRatio")
+		self.settingFilterCountCtrl = cmds.text(parent= filterLayout, l="", align="left", w=80)
+
 		#Add the settings browser component
 		self.settingsFileListCtrl = cmds.optionMenu(parent= layout, cc=settingChanged)
 		if len(self.settingsXML) > 0:
 			self.updateSettingFileList()
 		cmds.separator(parent= layout, height=20, style="none")
 		
+	"""
+	Creates the panel containing the batch queue controls and add it to the main layout.
+	"""
+	def createBatchQueuePanel(self):
+		layout = cmds.frameLayout(parent= self.mainLayout, l="Batch queue", collapsable=True)
+		buttonLayout = cmds.rowLayout (parent= layout, numberOfColumns = 4)
+		self.queueSelectionButton = cmds.button(parent= buttonLayout, label="Add selection", c=self.onQueueSelection)
+		cmds.button(parent= buttonLayout, label="Add scenes", c=self.onQueueScenes)
+		cmds.button(parent= buttonLayout, label="Run queue", c=self.onRunQueue)
+		cmds.button(parent= buttonLayout, label="Cancel", c=self.onCancelQueue)
+		splitLayout = cmds.rowLayout (parent= layout, numberOfColumns = 3)
+		cmds.text(parent= splitLayout, l="Split selection by")
+		self.splitCtrl = cmds.optionMenu(parent= splitLayout)
+		for split in [SPLIT_OBJECTS, SPLIT_HIERARCHIES]:
+			cmds.menuItem(parent= self.splitCtrl, label=split)
+		self.queueSplitButton = cmds.button(parent= splitLayout, label="Add split selection", c=self.onQueueSplitSelection)
+		self.queueStatusCtrl = cmds.scrollField(parent= layout, editable=False, wordWrap=False, height=100)
+
 	"""
 	Creates the main window
 	"""		
@@ -270,14 +968,30 @@ class SimplygonBatchProcessor:
 		cmds.separator(parent= endLayout, height=20, style="none")
 		self.optimizeButton = cmds.button(parent= endLayout, label="Optimize", c=self.onOptimize)		
 
+		cmds.separator(parent= endLayout, height=5, style="none")
+		budgetLayout = cmds.rowLayout(parent= endLayout, numberOfColumns = 3, adjustableColumn=2)
+		cmds.text(parent= budgetLayout, l="Triangle budgets", align="right", w=150)
+		self.budgetCtrl = cmds.textField(parent= budgetLayout, annotation="Comma separated triangle budgets, one for each LOD")
+		self.autoTuneButton = cmds.button(parent= budgetLayout, label="Auto-tune", c=self.onAutoTune)
+
+		cmds.separator(parent= endLayout, height=5, style="none")
+		self.backgroundButton = cmds.button(parent= endLayout, label="Optimize in background", c=self.onOptimizeInBackground)
+		self.progressCtrl = cmds.progressBar(parent= endLayout, maxValue=100, visible=False)
+		self.progressTextCtrl = cmds.text(parent= endLayout, l="", align="left", visible=False)
+		self.cancelButton = cmds.button(parent= endLayout, label="Cancel", c=self.onCancelBackground, visible=False)
+
 		cmds.separator(parent= endLayout, height=20, style="none")
 		self.simplygonButton = cmds.button(parent= endLayout, label="Send to Simplygon", c=self.onSimplygon)		
 
+		cmds.separator(parent= endLayout, height=20, style="none")
+		self.createBatchQueuePanel()
+
 		#Force an update of the color set selector
 		self.updateColorSets()
 		# Force an update of the setting selector
 		if self.settingsManager != None:
 			self.settingChanged()
+			self.watchSettings()
 		else:
 			self.enable(False)
 		
@@ -285,6 +999,12 @@ class SimplygonBatchProcessor:
 
 # This is ugly as hell, but since Maya seems to randomly crash when events are triggered on member functions we pipe them outside.
 batchProcessor = ""
+# The watcher of the settings files. It's only created the first time the module is loaded, so that reopening the window
+# doesn't start another watcher thread.
+try:
+	settingsWatcher
+except NameError:
+	settingsWatcher = None
 	
 """
 Called when there is a change in selection in the settings drop list
@@ -292,26 +1012,93 @@ Called when there is a change in selection in the settings drop list
 def settingChanged(_):
 	batchProcessor.settingChanged()
 
+"""
+Called when the text in the settings filter has changed
+"""	
+def settingFilterChanged(_):
+	batchProcessor.settingFilterChanged()
+
 """
 Called when the user enables/disables the user weight check box.
 """	
 def userWeightsChanged(_):
 	batchProcessor.updateColorSets()
 
+"""
+Called when the user presses the check weights button.
+"""	
+def checkUserWeights(_):
+	batchProcessor.onCheckUserWeights()
+
+"""
+Called when the user presses the fill unpainted button.
+"""	
+def fillUserWeights(_):
+	batchProcessor.onFillUserWeights()
+
+"""
+Called from the watcher thread when the settings files have changed. Pipes the change on to the main thread.
+"""
+def settingsFilesChanged(files):
+	maya.utils.executeDeferred(batchProcessor.settingsFilesChanged)
+
+"""
+Called from the batch queue thread when a job has changed status. Pipes the change on to the main thread.
+"""
+def batchJobChanged(job):
+	batchProcessor.requeueFailedUnits(job)
+	maya.utils.executeDeferred(batchProcessor.batchJobChanged, job)
+
+"""
+Called from the batch queue thread when all jobs have been processed.
+"""
+def batchQueueFinished(queue):
+	maya.utils.executeDeferred(batchProcessor.updateQueueStatus)
+
+"""
+Called from the background thread when the background optimization has changed status.
+"""
+def backgroundJobChanged(job):
+	maya.utils.executeDeferred(batchProcessor.backgroundJobChanged, job)
+
+"""
+Called from the background thread when the background optimization prints something.
+"""
+def backgroundJobOutput(job, line):
+	if parseProgress(line) != None:
+		maya.utils.executeDeferred(batchProcessor.backgroundJobProgress, job)
+
 """
 @return: true if something is currently selected.
 """	
 def somethingSelected():
-	selection = cmds.ls(sl=1)
+	# Only ask for the first selected item, there's no need to list the whole selection
+	selection = cmds.ls(sl=1, head=1)
 	if selection == None or selection==[]:
 		return False 
 	else:
 		return True
+
+# True while an update for a selection change is waiting to be run
+selectionUpdatePending = False
 		
 """
-Called when something is selected in the main viewport. Forces an update of the color selector and enabling/disabling controls
+Called when something is selected in the main viewport. A drag select fires a whole burst of these, so the update is
+deferred until Maya is idle and only done once for the whole burst.
 """	
 def selectionChanged():
+	global selectionUpdatePending
+	if selectionUpdatePending:
+		return
+	selectionUpdatePending = True
+	cmds.evalDeferred(updateSelection, lowestPriority=True)
+
+"""
+Forces an update of the color selector and enabling/disabling controls after the selection has changed.
+"""	
+def updateSelection():
+	global selectionUpdatePending
+	selectionUpdatePending = False
 	batchProcessor.updateColorSets()
 	batchProcessor.enable(somethingSelected())
 		
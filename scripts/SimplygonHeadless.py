@@ -0,0 +1,186 @@
+"""
+Command line entry point that processes scenes without the dock window, for build machines and continuous integration.
+Runs under mayapy or plain Python; the scenes are optimized by a worker command, SimplygonWorker.py in mayapy by default.
+Usage:
+  python SimplygonHeadless.py <xml> list
+  python SimplygonHeadless.py <xml> write <setting> <outFile> [--set Section/Path/Key=value ...]
+  python SimplygonHeadless.py <xml> process <setting> <scene> [<scene> ...] [--set ...] [--outputDir dir] [--workers n] [--command cmd]
+  python SimplygonHeadless.py <xml> sweep <setting> <scene> <spec> <outputDir> [--workers n] [--command cmd]
+  python SimplygonHeadless.py <xml> submit <spool> <setting> <scene> [<scene> ...] [--set ...] [--outputDir dir]
+  python SimplygonHeadless.py <xml> work <spool> [--watch] [--workers n] [--command cmd]
+  python SimplygonHeadless.py <xml> status <spool>
+"""
+import sys, os, argparse
+from OptimizationManagerModule import OptimizationSettingsManager
+from BatchQueueModule import BatchQueue, BatchJob, JOB_DONE, splitCommand
+from ParameterSweepModule import ParameterSweep, loadSweepSpec
+from IniModule import parseKeyPath
+from JobSpoolModule import JobSpool, SpoolWorker
+
+"""
+Parses overrides written as Section/Path/Key=value.
+@param assignments: a list of override strings
+@return: a dictionary of (section, key) -> value
+"""
+def parseOverrides(assignments):
+	overrides = {}
+	for assignment in assignments or []:
+		keyPath, separator, value = assignment.partition("=")
+		if len(separator) == 0:
+			raise ValueError("Overrides should be written as Section/Path/Key=value: "+assignment)
+		overrides[parseKeyPath(keyPath.strip())] = value.strip()
+	return overrides
+
+"""
+Writes the config of a setting with overrides merged in.
+@param settingsManager: the OptimizationSettingsManager that holds the setting
+@param settingName: the name of the setting
+@param overrides: a dictionary of (section, key) -> value
+@param path: the file to write
+"""
+def writeMergedConfig(settingsManager, settingName, overrides, path):
+	with open(path, "wb") as outFile:
+		settingsManager.writeConfig(settingName, overrides, outFile)
+
+"""
+Optimizes a number of scenes with a setting through the batch queue and waits until they are done.
+@param settingsManager: the OptimizationSettingsManager that holds the setting
+@param settingName: the name of the setting
+@param scenes: the scenes to optimize
+@param overrides: a dictionary of (section, key) -> value to merge into the config
+@param outputDir: the folder to save the optimized scenes to, next to the originals with an _LOD suffix if None
+@param workers: the maximum number of scenes to optimize at the same time
+@param command: the worker command, see BatchQueue
+@param verbose: true if the status of every job should be printed as it changes
+@return: the processed BatchQueue
+"""
+def processScenes(settingsManager, settingName, scenes, overrides=None, outputDir=None, workers=None, command=None, verbose=True):
+	settingsManager.getSettingData(settingName)
+	if outputDir != None and not os.path.isdir(outputDir):
+		os.makedirs(outputDir)
+	queue = BatchQueue(settingsManager, workers, command)
+	for scene in scenes:
+		queue.addJob(BatchJob(os.path.basename(scene), scene, settingName, overrides, output=getOutputPath(scene, outputDir)))
+	onJobChanged = None
+	if verbose:
+		onJobChanged = printJobStatus
+	queue.start(onJobChanged=onJobChanged)
+	queue.wait()
+	return queue
+
+"""
+Prints the status of a job, used as the job listener when running from the command line.
+"""
+def printJobStatus(job):
+	print job.getStatusLine()
+	sys.stdout.flush()
+
+"""
+@param scene: a scene
+@param outputDir: the folder to save the optimized scene to, or None
+@return: where to save the optimized scene, None to save it next to the original with an _LOD suffix
+"""
+def getOutputPath(scene, outputDir):
+	if outputDir == None:
+		return None
+	base, ext = os.path.splitext(os.path.basename(scene))
+	return os.path.join(outputDir, base+"_LOD"+(ext or ".mb")).replace("\\", "/")
+
+"""
+@return: the parsed command line arguments
+"""
+def parseArguments(argv):
+	parser = argparse.ArgumentParser(description="Loads a Simplygon settings XML and writes configs or optimizes scenes without the Maya user interface.")
+	parser.add_argument("xml", help="the settings XML")
+	commands = parser.add_subparsers(dest="action")
+
+	commands.add_parser("list", help="lists the settings in the XML")
+
+	write = commands.add_parser("write", help="writes the config of a setting with overrides merged in")
+	write.add_argument("setting", help="the name of the setting")
+	write.add_argument("outFile", help="the .ini file to write")
+
+	process = commands.add_parser("process", help="optimizes scenes with a setting")
+	process.add_argument("setting", help="the name of the setting")
+	process.add_argument("scenes", nargs="+", help="the scenes to optimize")
+	process.add_argument("--outputDir", default=None, help="where to save the optimized scenes, next to the originals if not given")
+
+	sweep = commands.add_parser("sweep", help="optimizes a scene with variations of a setting and writes a table of the results")
+	sweep.add_argument("setting", help="the name of the setting")
+	sweep.add_argument("scene", help="the scene to optimize")
+	sweep.add_argument("spec", help="a JSON file describing the sweep, see ParameterSweepModule.loadSweepSpec")
+	sweep.add_argument("outputDir", help="where to save the LODs and the results")
+
+	submit = commands.add_parser("submit", help="adds scenes to a job spool in a shared folder")
+	submit.add_argument("spool", help="the spool folder")
+	submit.add_argument("setting", help="the name of the setting")
+	submit.add_argument("scenes", nargs="+", help="the scenes to optimize, reachable under the same path from all machines")
+	submit.add_argument("--outputDir", default=None, help="where to save the optimized scenes, next to the originals if not given")
+
+	work = commands.add_parser("work", help="processes the jobs in a job spool")
+	work.add_argument("spool", help="the spool folder")
+	work.add_argument("--watch", action="store_true", help="keep waiting for new jobs instead of stopping when the spool is empty")
+
+	status = commands.add_parser("status", help="prints the number of jobs in every folder of a job spool")
+	status.add_argument("spool", help="the spool folder")
+
+	for subParser in [write, process, submit]:
+		subParser.add_argument("--set", action="append", default=[], metavar="Section/Path/Key=value", help="overrides a key in the config, can be repeated")
+	for subParser in [process, sweep, work]:
+		subParser.add_argument("--workers", type=int, default=None, help="the maximum number of workers to run at the same time, one per processor by default")
+		subParser.add_argument("--command", default=None, help="the worker command, with {scene} {settingsFile} {output} {objects} {colorSet} {weightMultiplier} {stats} fields")
+	return parser.parse_args(argv)
+
+"""
+Main function of the command line interface.
+@param argv: the command line arguments
+@return: the exit code of the process
+"""
+def main(argv):
+	args = parseArguments(argv)
+	settingsManager = OptimizationSettingsManager(args.xml)
+	try:
+		if args.action == "list":
+			for name, file, sectionLayouts in settingsManager.catalog.settings:
+				print name
+			return 0
+		if args.action == "status":
+			for state, count in sorted(JobSpool(args.spool).getStatus().iteritems()):
+				print "%s: %d" % (state, count)
+			return 0
+		if args.action == "work":
+			processed = SpoolWorker(JobSpool(args.spool), settingsManager, args.workers, splitCommand(args.command)).run(args.watch, onJobChanged=printJobStatus)
+			print "%d jobs processed" % processed
+			return 0
+		if args.setting not in settingsManager.getSettingNames():
+			print "Error! There is no setting called "+args.setting+" in "+args.xml
+			return 2
+		if args.action == "write":
+			writeMergedConfig(settingsManager, args.setting, parseOverrides(args.set), args.outFile)
+			return 0
+		if args.action == "process":
+			queue = processScenes(settingsManager, args.setting, args.scenes, parseOverrides(args.set), args.outputDir, args.workers, splitCommand(args.command))
+			failed = len(queue.jobs) - len(queue.getJobs(JOB_DONE))
+			print "%d of %d scenes optimized" % (len(queue.jobs) - failed, len(queue.jobs))
+			return 1 if failed > 0 else 0
+		if args.action == "submit":
+			spool = JobSpool(args.spool)
+			overrides = parseOverrides(args.set)
+			for scene in args.scenes:
+				print spool.submit(os.path.abspath(scene), args.setting, overrides, getOutputPath(os.path.abspath(scene), args.outputDir))
+			return 0
+		if args.action == "sweep":
+			parameterSweep = ParameterSweep(settingsManager, args.setting)
+			variants = parameterSweep.getVariants(loadSweepSpec(args.spec))
+			parameterSweep.start(variants, args.scene, args.outputDir, workers=args.workers, command=splitCommand(args.command), onJobChanged=printJobStatus)
+			parameterSweep.wait()
+			parameterSweep.writeCSV(os.path.join(args.outputDir, "results.csv"))
+			parameterSweep.writeJSON(os.path.join(args.outputDir, "results.json"))
+			return 0
+	except (ValueError, KeyError, IOError, OSError) as e:
+		print "Error! "+str(e)
+		return 2
+	return 0
+
+if __name__ == "__main__":
+	sys.exit(main(sys.argv[1:]))
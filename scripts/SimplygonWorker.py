@@ -0,0 +1,143 @@
+"""
+Headless worker used by the batch queue. Opens a scene in mayapy, optimizes it with a settings file and exports the LODs.
+Usage: mayapy SimplygonWorker.py <scene> <settingsFile> <output> [--objects a,b] [--colorSet set] [--weightMultiplier n] [--stats file]
+"""
+import sys, time, argparse, json
+
+SIMPLYGON_PLUGIN = "Simplygon"
+
+"""
+@return: the parsed command line arguments
+"""
+def parseArguments(argv):
+	parser = argparse.ArgumentParser(description="Optimizes a scene with Simplygon in a headless Maya session.")
+	parser.add_argument("scene", help="the scene to optimize")
+	parser.add_argument("settingsFile", help="the Simplygon .ini file to use")
+	parser.add_argument("output", help="where to export the LODs to")
+	parser.add_argument("--objects", default="", help="comma separated list of the objects to optimize, all meshes if empty")
+	parser.add_argument("--colorSet", default="", help="the color set to use as user weights")
+	parser.add_argument("--weightMultiplier", default="1", help="the user weight multiplier")
+	parser.add_argument("--stats", default="", help="a JSON file to write the size of the LODs and the time and memory used to")
+	return parser.parse_args(argv)
+
+"""
+Builds the Simplygon mel command for the arguments.
+@return: the mel command
+"""
+def getSimplygonCommand(args):
+	melCmd = "Simplygon -sf \""+args.settingsFile+"\" -b"
+	if len(args.colorSet) > 0:
+		melCmd += " -caw \""+args.colorSet+"\" -wm "+args.weightMultiplier
+	return melCmd
+
+"""
+Prints a progress line and flushes it straight away so that the batch queue can follow the progress.
+@param percentage: how far the optimization has come
+@param message: a short description of the current step
+"""
+def report(percentage, message):
+	print "PROGRESS %d %s" % (percentage, message)
+	sys.stdout.flush()
+
+"""
+@return: the peak memory use of this process in bytes, or None if it can't be determined on this platform
+"""
+def getPeakMemory():
+	try:
+		import resource
+		peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+		# Reported in bytes on OS X and in kilobytes everywhere else
+		if sys.platform == "darwin":
+			return peak
+		return peak*1024
+	except ImportError:
+		pass
+	try:
+		import ctypes, ctypes.wintypes
+		class ProcessMemoryCounters(ctypes.Structure):
+			_fields_ = [("cb", ctypes.wintypes.DWORD),
+				("PageFaultCount", ctypes.wintypes.DWORD),
+				("PeakWorkingSetSize", ctypes.c_size_t),
+				("WorkingSetSize", ctypes.c_size_t),
+				("QuotaPeakPagedPoolUsage", ctypes.c_size_t),
+				("QuotaPagedPoolUsage", ctypes.c_size_t),
+				("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+				("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+				("PagefileUsage", ctypes.c_size_t),
+				("PeakPagefileUsage", ctypes.c_size_t)]
+		counters = ProcessMemoryCounters()
+		counters.cb = ctypes.sizeof(counters)
+		process = ctypes.windll.kernel32.GetCurrentProcess()
+		if ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+			return counters.PeakWorkingSetSize
+	except (ImportError, AttributeError, OSError):
+		pass
+	return None
+
+
+"""
+Main function of the worker.
+@param argv: the command line arguments
+@return: the exit code of the process
+"""
+def main(argv):
+	args = parseArguments(argv)
+	startTime = time.time()
+	report(0, "Initializing Maya")
+	import maya.standalone
+	maya.standalone.initialize(name="python")
+	import maya.cmds as cmds
+	import maya.mel as mel
+	try:
+		if not cmds.pluginInfo(SIMPLYGON_PLUGIN, query=True, loaded=True):
+			cmds.loadPlugin(SIMPLYGON_PLUGIN, quiet=True)
+	except RuntimeError:
+		print "Warning: could not load the "+SIMPLYGON_PLUGIN+" plugin"
+
+	report(20, "Opening "+args.scene)
+	cmds.file(args.scene, open=True, force=True)
+	if len(args.objects) > 0:
+		cmds.select(args.objects.split(","), replace=True)
+	else:
+		meshes = cmds.listRelatives(cmds.ls(type="mesh", noIntermediate=True), parent=True, fullPath=True)
+		if not meshes:
+			print "Error: "+args.scene+" doesn't contain any meshes to optimize"
+			return 1
+		cmds.select(meshes, replace=True)
+
+	from ResultCacheModule import getTransforms, getNewTransforms, getPolyCount
+	before = getTransforms()
+	melCmd = getSimplygonCommand(args)
+	print "Running "+melCmd
+	report(30, "Running Simplygon, no progress is shown until it's done")
+	optimizeStart = time.time()
+	mel.eval(melCmd)
+	optimizeTime = time.time() - optimizeStart
+
+	# Only the LODs are exported, the original objects are already in the scene the job was queued from
+	lods = getNewTransforms(before)
+	if not lods:
+		print "Error: Simplygon didn't create any LODs with "+args.settingsFile
+		return 1
+	report(90, "Exporting the LODs to "+args.output)
+	cmds.select(lods, replace=True)
+	if args.output.lower().endswith(".ma"):
+		cmds.file(args.output, force=True, exportSelected=True, type="mayaAscii")
+	else:
+		cmds.file(args.output, force=True, exportSelected=True, type="mayaBinary")
+
+	if len(args.stats) > 0:
+		triangles, vertices = getPolyCount(lods)
+		stats = {"lods": lods,
+			"triangles": triangles,
+			"vertices": vertices,
+			"optimizeTime": optimizeTime,
+			"wallTime": time.time() - startTime,
+			"peakMemory": getPeakMemory()}
+		with open(args.stats, "w") as outFile:
+			json.dump(stats, outFile, indent=1)
+	report(100, "Done in %.1fs" % (time.time() - startTime))
+	return 0
+
+if __name__ == "__main__":
+	sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,36 @@
+import hashlib, os
+from SettingsCacheModule import getCacheDir, writeFileAtomic, evictFiles
+from InstrumentationModule import tracer
+
+TEMP_SETTINGS_DIR = "settings"
+# The temporary settings files are evicted, oldest first, when they take up more space than this
+MAX_TEMP_SETTINGS_SIZE = 64*1024*1024
+# Files that haven't been used for this long are always evicted
+MAX_TEMP_SETTINGS_AGE = 7*24*60*60
+# Files that have been used this recently are never evicted, another process might be about to read them
+MIN_TEMP_SETTINGS_AGE = 60*60
+
+"""
+Stores a merged config in the local cache under a name derived from its content. If an identical config has been
+stored before the existing file is reused. Since the name depends on the content, concurrent optimizations never
+overwrite each other's files, and the files don't have to be removed after the optimization.
+@param data: the content of the config
+@return: the path of the config file
+"""
+def getTempSettingsFile(data):
+	folder = getCacheDir(TEMP_SETTINGS_DIR)
+	path = folder+"/"+hashlib.sha1(data).hexdigest()+".ini"
+	if os.path.isfile(path):
+		# Touch the file to mark it as recently used
+		try:
+			os.utime(path, None)
+			tracer.count("settings file cache hits")
+			return path
+		except OSError:
+			# It was evicted by someone else in the meantime
+			pass
+	tracer.count("settings file cache misses")
+	with tracer.span("Write settings file"):
+		writeFileAtomic(path, data)
+		evictFiles(folder, ".ini", MAX_TEMP_SETTINGS_SIZE, MAX_TEMP_SETTINGS_AGE, MIN_TEMP_SETTINGS_AGE)
+	return path
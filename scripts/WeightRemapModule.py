@@ -0,0 +1,125 @@
+import maya.cmds as cmds
+from ColorSetAnalysisModule import getMeshFn, readVertexColors, numpy
+from MeshDataModule import getMeshFn1, getTopologyBytes, setVertexColorList
+
+# The temporary color set the remapped weights are written to and passed to Simplygon
+REMAPPED_COLOR_SET = "SimplygonRemappedWeights"
+
+"""
+Builds the edges of a mesh from its face vertex lists, as returned by MFnMesh.getVertices.
+@param counts: the number of vertices of every face
+@param connects: the vertices of all faces, face after face
+@return: a (from, to) tuple of vertex index arrays, with every edge in both directions and no duplicates
+"""
+def getEdges(counts, connects):
+	counts = numpy.asarray(counts, dtype=numpy.int64)
+	connects = numpy.asarray(connects, dtype=numpy.int64)
+	if len(connects) == 0:
+		return (connects, connects)
+	# Pair every face vertex with the next one in the same face, wrapping around at the end of the face
+	faceStarts = numpy.repeat(numpy.cumsum(counts) - counts, counts)
+	positions = numpy.arange(len(connects)) - faceStarts
+	following = connects[faceStarts + (positions + 1) % numpy.repeat(counts, counts)]
+	low = numpy.minimum(connects, following)
+	high = numpy.maximum(connects, following)
+	# Edges shared by two faces appear twice
+	size = max(int(connects.max()) + 1, 1)
+	unique = numpy.unique(low * size + high)
+	low = unique // size
+	high = unique % size
+	return (numpy.concatenate([low, high]), numpy.concatenate([high, low]))
+
+"""
+A remapping of user weights, applied to the intensities of a color set before they are passed to Simplygon. The
+neighborhood operations run first, then the curve and last the clamp. All of it is computed with NumPy over the
+whole mesh at once.
+"""
+class WeightRemap:
+	"""
+	@param gamma: the exponent of the curve applied to the intensities, 1 leaves them as they are
+	@param clampMin: the lowest intensity to keep
+	@param clampMax: the highest intensity to keep
+	@param blur: the number of times every vertex is averaged with its neighbors
+	@param dilate: the number of times every vertex takes the highest intensity of its neighbors, negative values take the
+	lowest instead
+	"""
+	def __init__(self, gamma=1.0, clampMin=0.0, clampMax=1.0, blur=0, dilate=0):
+		self.gamma = gamma
+		self.clampMin = clampMin
+		self.clampMax = clampMax
+		self.blur = blur
+		self.dilate = dilate
+
+	"""
+	@return: true if the remap doesn't change any weight
+	"""
+	def isIdentity(self):
+		return self.gamma == 1.0 and self.clampMin <= 0.0 and self.clampMax >= 1.0 and self.blur == 0 and self.dilate == 0
+
+	"""
+	@param intensities: a numpy array with the intensity of every vertex
+	@param edges: the edges of the mesh as returned by getEdges, only needed for blur and dilate
+	@return: the remapped intensities
+	"""
+	def remap(self, intensities, edges=None):
+		values = numpy.array(intensities, dtype=numpy.float64)
+		if edges != None and len(edges[0]) > 0:
+			source, target = edges
+			for _ in range(abs(self.dilate)):
+				grown = values.copy()
+				if self.dilate > 0:
+					numpy.maximum.at(grown, target, values[source])
+				else:
+					numpy.minimum.at(grown, target, values[source])
+				values = grown
+			if self.blur > 0:
+				degrees = numpy.bincount(target, minlength=len(values)) + 1.0
+				for _ in range(self.blur):
+					values = (values + numpy.bincount(target, weights=values[source], minlength=len(values))) / degrees
+		if self.gamma != 1.0:
+			values = numpy.power(numpy.clip(values, 0.0, 1.0), 1.0 / self.gamma)
+		return numpy.clip(values, self.clampMin, self.clampMax)
+
+	"""
+	Remaps a color set on a number of meshes into the temporary color set, with one read and one write per mesh.
+	Unpainted vertices are remapped as black, since that is how Simplygon reads them. The temporary color set should be
+	removed with removeRemappedColorSet once it has been passed on.
+	@param nodes: the nodes to remap, all meshes in or below them are included
+	@param colorSet: the color set with the painted weights
+	@param target: the color set to write the remapped weights to, created where it doesn't exist
+	@return: the name of the target color set
+	"""
+	def apply(self, nodes, colorSet, target=REMAPPED_COLOR_SET):
+		for shape in sorted(set(cmds.ls(nodes, dag=True, type="mesh", noIntermediate=True, long=True) or [])):
+			mesh = getMeshFn(shape)
+			colorSets = mesh.getColorSetNames() or []
+			if colorSet in colorSets:
+				colors = readVertexColors(shape, colorSet)
+				intensities = numpy.clip(colors[:, :3].mean(axis=1), 0.0, 1.0)
+				# Unpainted vertices read as -1
+				intensities[(colors == -1.0).all(axis=1)] = 0.0
+			else:
+				intensities = numpy.zeros(mesh.numVertices)
+			meshData = getMeshFn1(shape)
+			edges = None
+			if self.blur > 0 or self.dilate != 0:
+				counts, connects = getTopologyBytes(meshData)
+				edges = getEdges(numpy.frombuffer(counts, numpy.int32), numpy.frombuffer(connects, numpy.int32))
+			values = self.remap(intensities, edges)
+			if target not in colorSets:
+				mesh.createColorSet(target, False)
+			colors = numpy.ones((len(values), 4), dtype=numpy.float32)
+			colors[:, :3] = values[:, numpy.newaxis]
+			setVertexColorList(meshData, target, colors.ravel())
+		return target
+
+"""
+Removes the temporary color set from a number of meshes, and from the LODs made from them if they have copied it.
+@param nodes: the nodes to clean up, all meshes in or below them are included
+@param colorSet: the temporary color set
+"""
+def removeRemappedColorSet(nodes, colorSet=REMAPPED_COLOR_SET):
+	for shape in sorted(set(cmds.ls(nodes, dag=True, type="mesh", noIntermediate=True, long=True) or [])):
+		mesh = getMeshFn(shape)
+		if colorSet in (mesh.getColorSetNames() or []):
+			mesh.deleteColorSet(colorSet)
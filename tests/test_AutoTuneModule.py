@@ -0,0 +1,99 @@
+"""
+Runs the ReductionTuner of AutoTuneModule against made up triangle curves instead of Simplygon.
+"""
+import sys, os, unittest
+import xml.etree.ElementTree as etree
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(TESTS_DIR), "scripts"))
+from KeyModifierModule import KeyTable
+from AutoTuneModule import *
+
+"""
+@return: the key modifier of a ReductionRatio key, with its default value loaded
+"""
+def createRatioKey(table, section, type="IntRange", minimum="1", maximum="100", value="50"):
+	keyId = table.addKey(etree.Element("Key", {"name": REDUCTION_KEY, "section": section, "type": type, "min": minimum, "max": maximum}))
+	modifier = table.createModifier(keyId)
+	modifier.value = modifier.defaultValue = modifier.normalizeValue(value)
+	return modifier
+
+"""
+A stand-in for an optimization run. Every LOD gets its triangle count from a curve of its own ratio.
+"""
+class FakeOptimizer:
+	def __init__(self, modifiers, curves):
+		self.keys = [(modifier.getKeySection(), modifier.getKeyName(), modifier.defaultValue) for modifier in modifiers]
+		self.curves = curves
+		self.runs = []
+
+	def __call__(self, overrides):
+		self.runs.append(dict(overrides))
+		return [curve(float(overrides.get((section, name), default))) for (section, name, default), curve in zip(self.keys, self.curves)]
+
+class ReductionTunerTest(unittest.TestCase):
+	def setUp(self):
+		self.table = KeyTable()
+
+	def testProportionalCurveIsHitAtOnce(self):
+		key = createRatioKey(self.table, "Root/LOD1Section")
+		optimizer = FakeOptimizer([key], [lambda ratio: int(ratio*100)])
+		tuner = ReductionTuner(optimizer)
+		self.assertEqual(tuner.search(key, 0, 2500, {}), ("25", 2500))
+		self.assertEqual(tuner.runs, 2)
+		self.assertEqual(len(optimizer.runs), tuner.runs)
+
+	def testCurvedResponseStaysWithinBudget(self):
+		key = createRatioKey(self.table, "Root/LOD1Section")
+		optimizer = FakeOptimizer([key], [lambda ratio: int(200 + ratio*ratio*3)])
+		tuner = ReductionTuner(optimizer)
+		value, triangles = tuner.search(key, 0, 10000, {})
+		self.assertTrue(triangles <= 10000*(1 + tuner.tolerance))
+		self.assertTrue(triangles >= 10000*(1 - tuner.tolerance))
+		self.assertTrue(tuner.runs <= DEFAULT_MAX_RUNS)
+		# The largest ratio within the budget wins
+		self.assertTrue(200 + (int(value) + 1)**2*3 > 10000*(1 + tuner.tolerance))
+
+	def testBudgetOutOfReach(self):
+		key = createRatioKey(self.table, "Root/LOD1Section")
+		optimizer = FakeOptimizer([key], [lambda ratio: int(1000 + ratio*100)])
+		tuner = ReductionTuner(optimizer)
+		# Even the smallest ratio produces too many triangles, the closest count is returned
+		self.assertEqual(tuner.search(key, 0, 500, {}), ("1", 1100))
+		self.assertTrue(tuner.runs <= 3)
+		tuner = ReductionTuner(optimizer)
+		self.assertEqual(tuner.search(key, 0, 50000, {}), ("100", 11000))
+
+	def testFloatRange(self):
+		key = createRatioKey(self.table, "Root/LOD1Section", "FloatRange", "0.0", "1.0", "0.5")
+		optimizer = FakeOptimizer([key], [lambda ratio: int(ratio*ratio*8000)])
+		tuner = ReductionTuner(optimizer)
+		value, triangles = tuner.search(key, 0, 2000, {})
+		self.assertTrue(abs(triangles - 2000) <= 2000*tuner.tolerance)
+		self.assertAlmostEqual(float(value), 0.5, 2)
+
+	def testTuneNeverRepeatsARun(self):
+		keys = [createRatioKey(self.table, "Root/LOD1Section"), createRatioKey(self.table, "Root/LOD2Section")]
+		optimizer = FakeOptimizer(keys, [lambda ratio: int(ratio*100), lambda ratio: int(ratio*20)])
+		tuner = ReductionTuner(optimizer)
+		overrides = tuner.tune({0: keys[0], 1: keys[1]}, {0: 5000, 1: 500}, {("Root/Other", "Key"): "1"})
+		self.assertEqual(overrides, {("Root/Other", "Key"): "1", ("Root/LOD1Section", REDUCTION_KEY): "50",
+			("Root/LOD2Section", REDUCTION_KEY): "25"})
+		# No set of overrides is optimized twice
+		self.assertEqual(len(optimizer.runs), tuner.runs)
+		self.assertEqual(len(set(frozenset(run.iteritems()) for run in optimizer.runs)), tuner.runs)
+		self.assertTrue(tuner.runs <= 2*DEFAULT_MAX_RUNS)
+
+	def testTooFewLods(self):
+		key = createRatioKey(self.table, "Root/LOD2Section")
+		tuner = ReductionTuner(lambda overrides: [100])
+		self.assertRaises(ValueError, tuner.search, key, 1, 50, {})
+
+	def testLodGrouping(self):
+		self.assertEqual(getLodSectionIndex("Root/LOD2Section"), 2)
+		self.assertEqual(getLodSectionIndex("Root/AutoLODSection"), None)
+		self.assertEqual(groupLodNodes(["|a_LOD1", "|b_LOD2", "|b_LOD1"]), [["|a_LOD1", "|b_LOD1"], ["|b_LOD2"]])
+		self.assertEqual(groupLodNodes(["|a_LOD1", "|b"]), [["|a_LOD1", "|b"]])
+
+if __name__ == "__main__":
+	unittest.main()
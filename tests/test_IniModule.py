@@ -0,0 +1,94 @@
+"""
+Round trips the shipped settings through IniModule and compares what it reads with ConfigParser.RawConfigParser, which
+the tool used before it had its own .ini model.
+"""
+import sys, os, glob, unittest, ConfigParser, StringIO
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(TESTS_DIR), "scripts"))
+from IniModule import IniDocument, readIni
+
+SETTINGS_DIR = os.path.join(os.path.dirname(TESTS_DIR), "settings")
+
+"""
+@param data: the content of an .ini file
+@return: a RawConfigParser that has read the content
+"""
+def parseRaw(data):
+	parser = ConfigParser.RawConfigParser()
+	parser.optionxform = str
+	parser.readfp(StringIO.StringIO(data))
+	return parser
+
+class IniModuleTest(unittest.TestCase):
+	def setUp(self):
+		self.paths = sorted(glob.glob(os.path.join(SETTINGS_DIR, "*.ini")))
+		self.assertTrue(self.paths, "No presets found in "+SETTINGS_DIR)
+
+	def assertSameContent(self, document, parser, path):
+		self.assertEqual(document.sections(), parser.sections(), path)
+		for section in parser.sections():
+			self.assertTrue(document.has_section(section), path)
+			self.assertEqual(document.items(section), parser.items(section), path+" ["+section+"]")
+			for key, value in parser.items(section):
+				self.assertTrue(document.has_option(section, key), path)
+				self.assertEqual(document.get(section, key), value, path+" ["+section+"] "+key)
+				# Keys are looked up without case, like RawConfigParser does with its default optionxform
+				self.assertEqual(document.get(section, key.lower()), value)
+
+	def testPresetsMatchRawConfigParser(self):
+		for path in self.paths:
+			with open(path, "rb") as inFile:
+				data = inFile.read()
+			self.assertSameContent(readIni(path), parseRaw(data), path)
+
+	def testUnchangedPresetsRoundTripUnchanged(self):
+		for path in self.paths:
+			with open(path, "rb") as inFile:
+				data = inFile.read()
+			document = IniDocument(data)
+			self.assertFalse(document.isModified())
+			self.assertEqual(document.getText(), data, path)
+			# Setting a key to its current value isn't a change
+			section = document.sections()[-1]
+			key, value = document.items(section)[0]
+			document.set(section, key, value)
+			self.assertFalse(document.isModified())
+			self.assertEqual(document.getText(), data, path)
+
+	def testChangedPresetsReparse(self):
+		for path in self.paths:
+			document = readIni(path)
+			expected = parseRaw(document.getText())
+			for index, section in enumerate(document.sections()):
+				for key, value in document.items(section)[::3]:
+					newValue = "%s%d" % (value, index) if value else "changed"
+					document.set(section, key, newValue)
+					expected.set(section, key, newValue)
+			self.assertTrue(document.isModified())
+			text = document.getText()
+			self.assertSameContent(IniDocument(text), expected, path)
+			self.assertSameContent(document, parseRaw(text), path)
+			output = StringIO.StringIO()
+			document.write(output)
+			self.assertEqual(output.getvalue(), text)
+
+	def testCopyIsIndependent(self):
+		document = readIni(self.paths[0])
+		section = document.sections()[-1]
+		key, value = document.items(section)[0]
+		copy = document.copy()
+		copy.set(section, key, value+"1")
+		self.assertEqual(document.get(section, key), value)
+		self.assertEqual(copy.get(section, key), value+"1")
+
+	def testMissingEntriesRaiseConfigParserErrors(self):
+		document = readIni(self.paths[0])
+		section = document.sections()[0]
+		self.assertRaises(ConfigParser.NoSectionError, document.get, "NoSuchSection", "Key")
+		self.assertRaises(ConfigParser.NoOptionError, document.get, section, "NoSuchKey")
+		self.assertRaises(ConfigParser.NoSectionError, document.items, "NoSuchSection")
+		self.assertEqual(readIni(os.path.join(SETTINGS_DIR, "NoSuchFile.ini")).sections(), [])
+
+if __name__ == "__main__":
+	unittest.main()
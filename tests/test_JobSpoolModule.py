@@ -0,0 +1,169 @@
+"""
+Runs the claim, finish and recovery state machine of JobSpoolModule against a spool in a temporary folder, and a spool
+worker that fills its slots with a stand-in worker command.
+"""
+import sys, os, time, shutil, tempfile, unittest
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(TESTS_DIR), "scripts"))
+from JobSpoolModule import *
+
+class JobSpoolTest(unittest.TestCase):
+	def setUp(self):
+		self.folder = tempfile.mkdtemp(prefix="SimplygonSpoolTest")
+		self.spool = JobSpool(self.folder)
+
+	def tearDown(self):
+		shutil.rmtree(self.folder, True)
+
+	def submit(self, count):
+		jobIds = []
+		for i in range(count):
+			jobIds.append(self.spool.submit("/scenes/scene%d.mb" % i, "Setting", {("LOD1", "ReductionRatio"): "50"}))
+			# The ids start with the time in milliseconds, make sure they sort in submission order
+			time.sleep(0.002)
+		return jobIds
+
+	"""
+	Makes a claim look like its worker stopped touching it an hour ago.
+	"""
+	def ageClaim(self, jobId):
+		stale = self.spool.getTime() - 3600
+		os.utime(self.spool.getPath(SPOOL_CLAIMED, jobId), (stale, stale))
+
+	def assertStatus(self, pending=0, claimed=0, done=0, failed=0):
+		self.assertEqual(self.spool.getStatus(), {SPOOL_PENDING: pending, SPOOL_CLAIMED: claimed, SPOOL_DONE: done, SPOOL_FAILED: failed})
+
+	def testSubmitAndClaimInOrder(self):
+		jobIds = self.submit(3)
+		self.assertStatus(pending=3)
+		job = self.spool.readJob(SPOOL_PENDING, jobIds[0])
+		self.assertEqual(job["overrides"], {"LOD1/ReductionRatio": "50"})
+		self.assertEqual(job["attempts"], 0)
+		self.assertEqual([self.spool.claim() for i in range(4)], jobIds+[None])
+		self.assertStatus(claimed=3)
+
+	def testClaimIsFresh(self):
+		jobId = self.submit(1)[0]
+		old = time.time() - 3600
+		os.utime(self.spool.getPath(SPOOL_PENDING, jobId), (old, old))
+		self.spool.claim()
+		# A job that waited long in pending must not be recovered as soon as it is claimed
+		self.assertEqual(self.spool.recoverStaleClaims(60), [])
+		self.assertStatus(claimed=1)
+
+	def testFinishSucceeded(self):
+		jobId = self.submit(1)[0]
+		self.spool.claim()
+		self.assertTrue(self.spool.heartbeat(jobId))
+		job = self.spool.readJob(SPOOL_CLAIMED, jobId)
+		self.assertEqual(self.spool.finish(jobId, job, True, {"status": "done"}), SPOOL_DONE)
+		self.assertStatus(done=1)
+		job = self.spool.readJob(SPOOL_DONE, jobId)
+		self.assertEqual(job["attempts"], 1)
+		self.assertEqual(job["history"], [{"status": "done"}])
+		self.assertEqual(os.listdir(self.spool.getPath(SPOOL_CLAIMED)), [])
+
+	def testFailedJobsAreRetriedUntilTheyRunOutOfAttempts(self):
+		jobId = self.submit(1)[0]
+		for attempt in range(1, MAX_ATTEMPTS + 1):
+			self.assertEqual(self.spool.claim(), jobId)
+			job = self.spool.readJob(SPOOL_CLAIMED, jobId)
+			state = self.spool.finish(jobId, job, False, {"status": "failed"})
+			self.assertEqual(state, SPOOL_FAILED if attempt == MAX_ATTEMPTS else SPOOL_PENDING)
+		self.assertStatus(failed=1)
+		self.assertEqual(self.spool.readJob(SPOOL_FAILED, jobId)["attempts"], MAX_ATTEMPTS)
+
+	def testStaleClaimsAreRecovered(self):
+		jobIds = self.submit(2)
+		self.spool.claim()
+		self.spool.claim()
+		self.ageClaim(jobIds[0])
+		self.assertEqual(self.spool.recoverStaleClaims(60), [jobIds[0]])
+		self.assertStatus(pending=1, claimed=1)
+		job = self.spool.readJob(SPOOL_PENDING, jobIds[0])
+		self.assertEqual(job["attempts"], 1)
+		self.assertEqual(job["history"][-1]["status"], "stale")
+		# Nothing is left behind by the recovery
+		self.assertEqual(sorted(os.listdir(self.spool.getPath(SPOOL_CLAIMED))), [jobIds[1]+JOB_EXTENSION])
+
+	def testStaleClaimsRunOutOfAttempts(self):
+		jobId = self.submit(1)[0]
+		for attempt in range(MAX_ATTEMPTS):
+			self.assertEqual(self.spool.claim(), jobId)
+			self.ageClaim(jobId)
+			self.assertEqual(self.spool.recoverStaleClaims(60), [jobId])
+		self.assertStatus(failed=1)
+
+	def testUnreadableClaimsFail(self):
+		jobId = self.submit(1)[0]
+		self.spool.claim()
+		with open(self.spool.getPath(SPOOL_CLAIMED, jobId), "wb") as outFile:
+			outFile.write("{")
+		self.ageClaim(jobId)
+		self.assertEqual(self.spool.recoverStaleClaims(60), [])
+		self.assertStatus(failed=1)
+
+	def testLostClaimDropsTheResult(self):
+		jobId = self.submit(1)[0]
+		self.spool.claim()
+		job = self.spool.readJob(SPOOL_CLAIMED, jobId)
+		# Another worker considers the claim stale while this one is still busy with it
+		self.ageClaim(jobId)
+		self.assertEqual(self.spool.recoverStaleClaims(60), [jobId])
+		self.assertFalse(self.spool.heartbeat(jobId))
+		self.assertEqual(self.spool.finish(jobId, job, True, {"status": "done"}), None)
+		self.assertStatus(pending=1)
+		self.assertEqual(self.spool.readJob(SPOOL_PENDING, jobId)["history"][-1]["status"], "stale")
+		# The job is processed again by the worker that claims it next
+		self.assertEqual(self.spool.claim(), jobId)
+		job = self.spool.readJob(SPOOL_CLAIMED, jobId)
+		self.assertEqual(self.spool.finish(jobId, job, True, {"status": "done"}), SPOOL_DONE)
+		self.assertEqual(self.spool.readJob(SPOOL_DONE, jobId)["attempts"], 2)
+		self.assertStatus(done=1)
+
+"""
+Writes a settings file for every job, the config itself is never read by the stand-in worker command.
+"""
+class FakeSettingsManager:
+	def __init__(self, folder):
+		self.folder = folder
+
+	def writeSettingsFile(self, settingName, overrides=None):
+		path = os.path.join(self.folder, settingName+".ini")
+		with open(path, "wb") as outFile:
+			outFile.write("[Root]\n")
+		return path
+
+class SpoolWorkerTest(unittest.TestCase):
+	def setUp(self):
+		self.folder = tempfile.mkdtemp(prefix="SimplygonSpoolTest")
+		self.spool = JobSpool(self.folder)
+
+	def tearDown(self):
+		shutil.rmtree(self.folder, True)
+
+	"""
+	@return: a worker process that sleeps for the time in the name of the scene
+	"""
+	def getCommand(self, job):
+		return [sys.executable, "-c", "import time; time.sleep(%s)" % os.path.splitext(job.name)[0]]
+
+	def testFreeSlotsAreFilledWhileASlowJobRuns(self):
+		slowId = self.spool.submit("/scenes/1.5.mb", "Setting", output=self.folder+"/slow_LOD.mb")
+		fastIds = []
+		for i in range(4):
+			time.sleep(0.002)
+			fastIds.append(self.spool.submit("/scenes/0.1.mb", "Setting", output=self.folder+"/fast%d_LOD.mb" % i))
+		worker = SpoolWorker(self.spool, FakeSettingsManager(self.folder), 2, self.getCommand)
+		self.assertEqual(worker.run(pollInterval=0.1), 5)
+		self.assertEqual(self.spool.getStatus(), {SPOOL_PENDING: 0, SPOOL_CLAIMED: 0, SPOOL_DONE: 5, SPOOL_FAILED: 0})
+		slowEnd = self.spool.readJob(SPOOL_DONE, slowId)["history"][-1]["endTime"]
+		# The fast jobs ran one after the other in the second slot, none of them waited for the slow job
+		for jobId in fastIds:
+			manifest = self.spool.readJob(SPOOL_DONE, jobId)["history"][-1]
+			self.assertEqual(manifest["status"], "done")
+			self.assertLess(manifest["endTime"], slowEnd)
+
+if __name__ == "__main__":
+	unittest.main()
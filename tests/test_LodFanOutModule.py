@@ -0,0 +1,110 @@
+"""
+Splits a config whose LODs don't depend on each other into one config per LOD with LodFanOutModule. The shipped presets
+all cascade their LODs, so the split is checked against a small config made up here.
+"""
+import sys, os, glob, types, unittest
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(TESTS_DIR), "scripts"))
+# Only the functions that don't touch the scene are tested, they just need maya.cmds to import
+if "maya.cmds" not in sys.modules:
+	sys.modules["maya"] = types.ModuleType("maya")
+	sys.modules["maya.cmds"] = sys.modules["maya"].cmds = types.ModuleType("maya.cmds")
+from IniModule import IniDocument, readIni
+from LodFanOutModule import *
+
+SETTINGS_DIR = os.path.join(os.path.dirname(TESTS_DIR), "settings")
+
+INDEPENDENT_LODS = """[Root/AutoLODSection]
+
+;If set, LODs are based on previous LODs in the chain and not on the original mesh.
+CascadedLODChain = false
+
+
+[Root/LODCollectionSection]
+
+LODCount = 3
+
+
+[Root/LODCollectionSection/LOD0Section]
+
+ProcessingType = MeshLOD
+ReductionRatio = 50.000000
+
+
+[Root/LODCollectionSection/LOD0Section/FeaturePreservationSection]
+
+GeometricImportance = Normal
+UVImportance = Normal
+
+
+[Root/LODCollectionSection/LOD1Section]
+
+ProcessingType = MeshLOD
+ReductionRatio = 25.000000
+
+
+[Root/LODCollectionSection/LOD1Section/FeaturePreservationSection]
+
+GeometricImportance = High
+UVImportance = Low
+
+
+[Root/LODCollectionSection/LOD2Section]
+
+ProcessingType = ProxyLOD
+ReductionRatio = 10.000000
+"""
+
+class LodFanOutTest(unittest.TestCase):
+	def setUp(self):
+		self.config = IniDocument(INDEPENDENT_LODS)
+
+	def testShippedPresetsAreNotSplit(self):
+		for path in glob.glob(os.path.join(SETTINGS_DIR, "*.ini")):
+			config = readIni(path)
+			self.assertTrue(isCascaded(config), path)
+			self.assertEqual(getFanOutConfigs(config), None, path)
+
+	def testCascadedAndSingleLodConfigsAreNotSplit(self):
+		self.assertFalse(isCascaded(self.config))
+		self.config.set(AUTO_LOD_SECTION, CASCADED_KEY, "True")
+		self.assertTrue(isCascaded(self.config))
+		self.assertEqual(getFanOutConfigs(self.config), None)
+		config = IniDocument(INDEPENDENT_LODS)
+		config.set(LOD_COLLECTION_SECTION, LOD_COUNT_KEY, "1")
+		self.assertEqual(getFanOutConfigs(config), None)
+		# Without the key the LODs are cascaded, which is what Simplygon does
+		self.assertTrue(isCascaded(IniDocument("[Root/LODCollectionSection]\nLODCount = 2\n")))
+
+	def testSplit(self):
+		configs = getFanOutConfigs(self.config)
+		self.assertEqual(len(configs), 3)
+		lod0 = getLodSection(0)
+		expected = [("MeshLOD", "50.000000", "Normal", "Normal"), ("MeshLOD", "25.000000", "High", "Low"), ("ProxyLOD", "10.000000", "Normal", "Normal")]
+		for config, (processingType, ratio, geometric, uv) in zip(configs, expected):
+			self.assertEqual(getLodCount(config), 1)
+			self.assertEqual(config.get(lod0, "ProcessingType"), processingType)
+			self.assertEqual(config.get(lod0, "ReductionRatio"), ratio)
+			# The sub sections of the LOD are copied as well, the ones the LOD doesn't have keep the values of LOD0
+			self.assertEqual(config.get(lod0+"/FeaturePreservationSection", "GeometricImportance"), geometric)
+			self.assertEqual(config.get(lod0+"/FeaturePreservationSection", "UVImportance"), uv)
+			# Every config is still a complete file
+			self.assertEqual(IniDocument(config.getText()).items(lod0), config.items(lod0))
+		# The merged config isn't changed
+		self.assertEqual(self.config.getText(), INDEPENDENT_LODS)
+
+	def testKeysMissingFromTheFirstLodAreNotSplit(self):
+		config = IniDocument(INDEPENDENT_LODS+"OnScreenSize = 300\n")
+		self.assertRaises(KeyError, getSingleLodConfig, config, 2)
+		self.assertEqual(len(getSingleLodConfig(config, 1).sections()), len(config.sections()))
+		self.assertEqual(getFanOutConfigs(config), None)
+
+	def testSplitLodsByRoot(self):
+		roots = ["|left|door", "|right|door", "|hero"]
+		lods = [["|left|door_LOD1", "|right|door_LOD1", "|hero_LOD1"], ["|hero_LOD2"]]
+		self.assertEqual(splitLodsByRoot(lods, roots), [("|left|door", [["|left|door_LOD1"], []]),
+			("|right|door", [["|right|door_LOD1"], []]), ("|hero", [["|hero_LOD1"], ["|hero_LOD2"]])])
+
+if __name__ == "__main__":
+	unittest.main()
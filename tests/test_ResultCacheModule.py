@@ -0,0 +1,96 @@
+"""
+Stores and loads LODs with the ResultCache of ResultCacheModule against a minimal stand-in for the scene in maya.cmds.
+"""
+import sys, os, json, types, shutil, tempfile, unittest
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(TESTS_DIR), "scripts"))
+
+"""
+A scene of transforms, kept as full paths, with the few commands the result cache uses. Exported files hold the full
+paths of the exported nodes and their children.
+"""
+class FakeScene:
+	def __init__(self):
+		self.transforms = set()
+		self.selection = []
+
+	def create(self, *paths):
+		self.transforms.update(paths)
+
+	def delete(self, *paths):
+		self.transforms = set(node for node in self.transforms if not any(node == path or node.startswith(path+"|") for path in paths))
+
+	def ls(self, *args, **flags):
+		if flags.get("sl"):
+			return list(self.selection)
+		nodes = sorted(self.transforms) if not args else [node for node in args[0] if node in self.transforms]
+		if flags.get("assemblies"):
+			nodes = [node for node in nodes if node.count("|") == 1]
+		if not flags.get("long"):
+			nodes = [node.rsplit("|", 1)[-1] for node in nodes]
+		return nodes
+
+	def select(self, nodes=None, replace=False, clear=False):
+		self.selection = [] if clear else list(nodes)
+
+	def file(self, path, i=False, returnNewNodes=False, exportSelected=False, **flags):
+		if exportSelected:
+			nodes = [node for node in self.transforms if any(node == root or node.startswith(root+"|") for root in self.selection)]
+			with open(path, "wb") as outFile:
+				json.dump(sorted(nodes), outFile)
+			return path
+		with open(path, "rb") as inFile:
+			nodes = json.load(inFile)
+		self.create(*nodes)
+		return nodes
+
+# The other tests may have put a maya.cmds in place already, the commands of the scene are added to it
+if "maya.cmds" not in sys.modules:
+	sys.modules["maya"] = types.ModuleType("maya")
+	sys.modules["maya.cmds"] = sys.modules["maya"].cmds = types.ModuleType("maya.cmds")
+scene = FakeScene()
+for name in ["ls", "select", "file"]:
+	setattr(sys.modules["maya.cmds"], name, getattr(scene, name))
+
+import SettingsCacheModule
+from ResultCacheModule import *
+
+class ResultCacheTest(unittest.TestCase):
+	def setUp(self):
+		self.folder = tempfile.mkdtemp(prefix="SimplygonResultCacheTest")
+		self.previousFolder = os.environ.get(SettingsCacheModule.CACHE_DIR_VARIABLE)
+		os.environ[SettingsCacheModule.CACHE_DIR_VARIABLE] = self.folder
+		scene.__init__()
+		scene.create("|pSphere1", "|pCube1")
+
+	def tearDown(self):
+		if self.previousFolder == None:
+			del os.environ[SettingsCacheModule.CACHE_DIR_VARIABLE]
+		else:
+			os.environ[SettingsCacheModule.CACHE_DIR_VARIABLE] = self.previousFolder
+		shutil.rmtree(self.folder, True)
+
+	def testMiss(self):
+		cache = ResultCache()
+		self.assertEqual(cache.load("0"*40), None)
+		self.assertEqual(cache.getStats(), {"hits": 0, "misses": 1})
+
+	def testHitReturnsTheNamesOfAFreshRun(self):
+		cache = ResultCache()
+		# A fresh run, the LODs are found by comparing the transforms before and after
+		before = getTransforms()
+		scene.create("|pSphere1_LOD1", "|pSphere1_LOD1|pSphere1_LOD1Part", "|pCube1_LOD1")
+		fresh = getNewTransforms(before)
+		self.assertEqual(fresh, ["|pCube1_LOD1", "|pSphere1_LOD1"])
+		scene.select(["|pSphere1"])
+		cache.store("1"*40, fresh)
+		# The selection is restored after the export
+		self.assertEqual(scene.selection, ["|pSphere1"])
+		scene.delete(*fresh)
+		self.assertEqual(cache.load("1"*40), fresh)
+		self.assertTrue("|pSphere1_LOD1|pSphere1_LOD1Part" in getTransforms())
+		self.assertEqual(cache.getStats(), {"hits": 1, "misses": 0})
+
+if __name__ == "__main__":
+	unittest.main()
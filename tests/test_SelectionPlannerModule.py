@@ -0,0 +1,67 @@
+"""
+Plans the chunks of a large selection and matches LODs back to the objects they were made from with
+SelectionPlannerModule.
+"""
+import sys, os, types, unittest
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(TESTS_DIR), "scripts"))
+# Only the functions that don't touch the scene are tested, they just need maya.cmds to import
+if "maya.cmds" not in sys.modules:
+	sys.modules["maya"] = types.ModuleType("maya")
+	sys.modules["maya.cmds"] = sys.modules["maya"].cmds = types.ModuleType("maya.cmds")
+from SelectionPlannerModule import *
+
+class PlanChunksTest(unittest.TestCase):
+	def testChunksAreBalanced(self):
+		units = [WorkUnit("|mesh%d" % i, "Setting", None, triangles) for i, triangles in enumerate([900, 700, 600, 500, 400, 300, 300, 200, 100, 100])]
+		chunks = planChunks(units, 3)
+		self.assertEqual(len(chunks), 3)
+		self.assertEqual(sorted(root for chunk in chunks for root in chunk.getRoots()), sorted(unit.root for unit in units))
+		self.assertEqual([chunk.triangles for chunk in chunks], [1400, 1400, 1300])
+		self.assertEqual([chunk.triangles for chunk in chunks], [sum(unit.triangles for unit in chunk.units) for chunk in chunks])
+
+	def testWorkersAreSharedBySettingAndColorSet(self):
+		units = [WorkUnit("|big%d" % i, "Big", None, 1000) for i in range(6)]
+		units += [WorkUnit("|small%d" % i, "Small", "weights", 100) for i in range(6)]
+		chunks = planChunks(units, 4)
+		# The workers are shared by triangles, but every group gets at least one chunk
+		self.assertEqual([(chunk.settingName, chunk.colorSet, len(chunk.units)) for chunk in chunks],
+			[("Big", None, 2), ("Big", None, 2), ("Big", None, 1), ("Big", None, 1), ("Small", "weights", 6)])
+
+	def testNoMoreChunksThanUnits(self):
+		chunks = planChunks([WorkUnit("|a", "Setting", None, 10), WorkUnit("|b", "Setting", None, 0)], 8)
+		self.assertEqual(len(chunks), 2)
+		self.assertEqual(planChunks([], 8), [])
+
+	def testTopNodes(self):
+		self.assertEqual(getTopNodes(["|a|b", "|a", "|c|d", "|ab", "|c|d|e"]), ["|a", "|c|d", "|ab"])
+
+class MatchLodRootsTest(unittest.TestCase):
+	def testRepeatedNamesAreMatchedByPath(self):
+		roots = ["|left|door", "|right|door", "|door"]
+		self.assertEqual(matchLodRoots("|left|door_LOD1", roots), ["|left|door"])
+		self.assertEqual(matchLodRoots("|right|door_LOD1", roots), ["|right|door"])
+		self.assertEqual(matchLodRoots("|door_LOD1", roots), ["|door"])
+		# The import adds a namespace to every node
+		self.assertEqual(matchLodRoots("|Result:right|Result:door_LOD1", roots), ["|right|door"])
+
+	def testLodsCreatedInsideAUnit(self):
+		roots = ["|car", "|car|wheel"]
+		self.assertEqual(matchLodRoots("|car|wheel|wheel_LOD1", roots), ["|car|wheel"])
+		self.assertEqual(matchLodRoots("|car|car_LOD1", roots), ["|car"])
+
+	def testLongestNameWins(self):
+		roots = ["|door", "|doorFrame"]
+		self.assertEqual(matchLodRoots("|doorFrame_LOD1", roots), ["|doorFrame"])
+		self.assertEqual(matchLodRoots("|door_LOD1", roots), ["|door"])
+
+	def testAmbiguousAndUnmatched(self):
+		roots = ["|left|door", "|right|door"]
+		self.assertEqual(sorted(matchLodRoots("|door_LOD1", roots)), roots)
+		self.assertEqual(matchLodRoots("|window_LOD1", roots), [])
+		# A single unit takes every LOD
+		self.assertEqual(matchLodRoots("|window_LOD1", ["|left|door"]), ["|left|door"])
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,113 @@
+"""
+Searches the settings of a small catalog with the index of SettingsSearchModule, and checks that the index follows the
+changes of the files it was built from.
+"""
+import sys, os, shutil, tempfile, unittest
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(TESTS_DIR), "scripts"))
+import SettingsCacheModule
+from SettingsCatalogModule import loadCatalog
+from SettingsSearchModule import *
+
+SETTINGS_XML = """<Settings>
+	<Setting file="Props.ini" name="Props Mesh LOD">
+		<Section description="LOD Settings">
+			<Key name="ReductionRatio" section="Root/LODCollectionSection/LOD0Section" type="IntRange" description="Percentage reduction" min="25" max="75"/>
+		</Section>
+	</Setting>
+	<Setting file="Characters.ini" name="Characters">
+		<Section description="Bones">
+			<Key name="BoneCount" section="Root/BoneReductionSection" type="IntRange" description="Maximum bones" min="1" max="100"/>
+		</Section>
+	</Setting>
+	<Setting file="Props.ini" name="Props Proxy">
+		<Section description="Reduction Quality">
+			<Key name="AllowVertexRepositioning" section="Root/LODCollectionSection/LOD0Section" type="Checkbox" description="Reposition vertices"/>
+		</Section>
+	</Setting>
+</Settings>
+"""
+
+INI_FILES = {
+	"Props.ini": "[Root/LODCollectionSection/LOD0Section]\nReductionRatio = 50\nAllowVertexRepositioning = true\n",
+	"Characters.ini": "[Root/BoneReductionSection]\nBoneCount = 30\n\n[Root/LODCollectionSection/LOD0Section]\nReductionRatio = 40\n"}
+
+class SettingsSearchTest(unittest.TestCase):
+	def setUp(self):
+		self.folder = tempfile.mkdtemp(prefix="SimplygonSearchTest")
+		self.previousFolder = os.environ.get(SettingsCacheModule.CACHE_DIR_VARIABLE)
+		os.environ[SettingsCacheModule.CACHE_DIR_VARIABLE] = self.folder+"/cache"
+		self.xmlFile = self.folder+"/Settings.xml"
+		self.writeFile(self.xmlFile, SETTINGS_XML)
+		for name, data in INI_FILES.iteritems():
+			self.writeFile(self.folder+"/"+name, data)
+		self.catalog = loadCatalog(self.xmlFile)
+		self.index = self.catalog.getSearchIndex()
+
+	def tearDown(self):
+		if self.previousFolder == None:
+			del os.environ[SettingsCacheModule.CACHE_DIR_VARIABLE]
+		else:
+			os.environ[SettingsCacheModule.CACHE_DIR_VARIABLE] = self.previousFolder
+		shutil.rmtree(self.folder, True)
+
+	"""
+	Writes a file and moves its modification time on, so the change is noticed even within the resolution of the clock.
+	"""
+	def writeFile(self, path, data, age=0):
+		with open(path, "wb") as outFile:
+			outFile.write(data)
+		if age:
+			stamp = os.path.getmtime(path) + age
+			os.utime(path, (stamp, stamp))
+
+	def testEmptyQueries(self):
+		self.assertEqual(self.index.search(""), None)
+		self.assertEqual(self.index.search("  ", True), None)
+		self.assertEqual(self.index.search("nothing like it"), [])
+
+	def testPrefix(self):
+		self.assertEqual(self.index.search("prox", True), [2])
+		# Terms are split into tokens, so the key names inside the value terms are found
+		self.assertEqual(self.index.search("reduc", True), [0, 1, 2])
+		self.assertEqual(self.index.search("bonecount", True), [1])
+		self.assertEqual(self.index.search("ount", True), [])
+		self.assertEqual(self.index.search("CHARACTERS", True), [1])
+
+	def testSubstring(self):
+		self.assertEqual(self.index.search("ount=3"), [1])
+		self.assertEqual(self.index.search("ratio=50"), [0, 2])
+		self.assertEqual(self.index.search("bonereductionsection/bonecount"), [1])
+		self.assertEqual(self.index.search("xy"), [2])
+
+	def testMultipleTerms(self):
+		self.assertEqual(self.index.search("props reduction", True), [0, 2])
+		self.assertEqual(self.index.search("percentage props"), [0])
+		self.assertEqual(self.index.search("bones percentage"), [])
+		# Asking again is answered from the word cache and gives the same result
+		self.assertEqual(self.index.search("percentage props"), [0])
+
+	def testStoredIndexIsReused(self):
+		index = loadCatalog(self.xmlFile).getSearchIndex()
+		self.assertFalse(index is self.index)
+		self.assertEqual(index.getData(), self.index.getData())
+
+	def testIndexIsRebuiltWhenTheFilesChange(self):
+		self.writeFile(self.folder+"/Characters.ini", INI_FILES["Characters.ini"].replace("BoneCount = 30", "BoneCount = 45"), 10)
+		self.assertFalse(self.catalog.isCurrent())
+		for catalog in [loadCatalog(self.xmlFile, self.catalog), loadCatalog(self.xmlFile)]:
+			index = catalog.getSearchIndex()
+			self.assertEqual(index.search("bonecount=45"), [1])
+			self.assertEqual(index.search("bonecount=30"), [])
+		self.writeFile(self.xmlFile, SETTINGS_XML.replace("Props Proxy", "Scenery Proxy"), 10)
+		index = loadCatalog(self.xmlFile).getSearchIndex()
+		self.assertEqual(index.search("scenery", True), [2])
+		self.assertEqual(index.search("props", True), [0])
+
+	def testBitIds(self):
+		self.assertEqual(getBitIds(0), [])
+		self.assertEqual(getBitIds(0b101001), [0, 3, 5])
+
+if __name__ == "__main__":
+	unittest.main()